@@ -9,8 +9,19 @@ from typing import Dict, List, Any, Optional
 from collections import defaultdict
 import logging
 
+import numpy as np
+
+from columnar import ColumnarEvents, decode_events
+from conditional import ResponseMemo, canonical_digest, conditional_response
+from sketches import KLLSketch, HyperLogLog
+from rollups import rollup_store, rollup_to_analytics, resolve_date_range, EPOCH_ORDINAL, RANGE_PERIODS, WEEKDAYS
+
 logger = logging.getLogger(__name__)
 
+# ذاكرة النتائج للردود المشروطة
+analytics_memo = ResponseMemo()
+insights_memo = ResponseMemo()
+
 
 # ============================================
 # Types
@@ -25,6 +36,121 @@ VALID_EVENT_TYPES = [
     "session_end"
 ]
 
+TASK_EVENT_TYPES = VALID_EVENT_TYPES[:4]
+
+DURATION_PERCENTILES = [0.5, 0.9, 0.99]
+
+
+# ============================================
+# Analytics Accumulator
+# ============================================
+
+class AnalyticsAccumulator:
+    """
+    مجمّع تحليلات قابل للدمج
+    يُستخدم لمعالجة أحداث مستخدم واحد ولدمج النتائج الجزئية بين الأجزاء
+    """
+    
+    def __init__(self):
+        self.counts = {event_type: 0 for event_type in TASK_EVENT_TYPES}
+        self.completed_by_hour: Dict[int, int] = defaultdict(int)
+        self.failed_by_hour: Dict[int, int] = defaultdict(int)
+        self.completed_by_day: Dict[str, int] = defaultdict(int)
+        # خريطة الإنجاز (يوم الأسبوع × الساعة) للتحليلات الجماعية
+        self.completed_heatmap = [[0] * 24 for _ in WEEKDAYS]
+        
+        # ملخصات تدفقية بذاكرة محدودة بدلاً من جمع كل المدد
+        self.duration_sum = 0.0
+        self.duration_count = 0
+        self.duration_sketch = KLLSketch()
+        self.task_sketch = HyperLogLog()
+        self.day_sketch = HyperLogLog()
+        self.events = 0
+    
+    def add_event(self, event: Dict[str, Any]) -> None:
+        """
+        إضافة حدث واحد
+        
+        Raises:
+            ValueError: عند عدم صلاحية الطابع الزمني
+        """
+        event_date = datetime.fromisoformat(event.get("timestamp", "").replace("Z", "+00:00"))
+        hour = event_date.hour
+        weekday = event_date.weekday()
+        event_type = event.get("type", "")
+        metadata = event.get("metadata", {})
+        self.events += 1
+        
+        if event_type in TASK_EVENT_TYPES:
+            self.counts[event_type] += 1
+            self.day_sketch.add(event_date.date().toordinal() - EPOCH_ORDINAL)
+            if metadata.get("taskId"):
+                self.task_sketch.add(str(metadata["taskId"]))
+        
+        if event_type == "task_completed":
+            self.completed_by_hour[hour] += 1
+            self.completed_by_day[WEEKDAYS[weekday]] += 1
+            self.completed_heatmap[weekday][hour] += 1
+            
+            if metadata.get("duration") and isinstance(metadata["duration"], (int, float)):
+                self.duration_sum += metadata["duration"]
+                self.duration_count += 1
+                self.duration_sketch.update(metadata["duration"])
+        
+        elif event_type == "task_failed":
+            self.failed_by_hour[hour] += 1
+    
+    def merge(self, other: "AnalyticsAccumulator") -> "AnalyticsAccumulator":
+        """دمج مجمّع آخر (من جزء أو فترة زمنية أخرى)"""
+        for event_type, count in other.counts.items():
+            self.counts[event_type] += count
+        for hour, count in other.completed_by_hour.items():
+            self.completed_by_hour[hour] += count
+        for hour, count in other.failed_by_hour.items():
+            self.failed_by_hour[hour] += count
+        for day, count in other.completed_by_day.items():
+            self.completed_by_day[day] += count
+        for weekday in range(len(WEEKDAYS)):
+            for hour in range(24):
+                self.completed_heatmap[weekday][hour] += other.completed_heatmap[weekday][hour]
+        
+        self.duration_sum += other.duration_sum
+        self.duration_count += other.duration_count
+        self.duration_sketch.merge(other.duration_sketch)
+        self.task_sketch.merge(other.task_sketch)
+        self.day_sketch.merge(other.day_sketch)
+        self.events += other.events
+        return self
+    
+    def to_analytics(self) -> Dict[str, Any]:
+        """تحويل المجمّع إلى مخرجات process_events"""
+        total_tasks = self.counts["task_created"]
+        completed_tasks = self.counts["task_completed"]
+        
+        analytics = {
+            "totalTasks": total_tasks,
+            "completedTasks": completed_tasks,
+            "failedTasks": self.counts["task_failed"],
+            "rescheduledTasks": self.counts["task_rescheduled"],
+            "completionRate": completed_tasks / total_tasks if total_tasks > 0 else 0,
+            "avgTaskDuration": self.duration_sum / self.duration_count if self.duration_count else 0,
+            "taskPatterns": {
+                "completedByHour": dict(self.completed_by_hour),
+                "failedByHour": dict(self.failed_by_hour),
+                "completedByDay": dict(self.completed_by_day)
+            }
+        }
+        
+        analytics.update(AnalyticsEngine.sketch_summary(
+            self.duration_sketch,
+            self.task_sketch,
+            self.day_sketch
+        ))
+        
+        analytics["lastAnalyzed"] = datetime.utcnow().isoformat()
+        
+        return analytics
+
 
 # ============================================
 # Analytics Engine
@@ -44,69 +170,125 @@ class AnalyticsEngine:
         Returns:
             Dict: التحليلات المعالجة
         """
-        analytics = {
-            "totalTasks": 0,
-            "completedTasks": 0,
-            "failedTasks": 0,
-            "rescheduledTasks": 0,
-            "completionRate": 0,
-            "avgTaskDuration": 0,
-            "taskPatterns": {
-                "completedByHour": defaultdict(int),
-                "failedByHour": defaultdict(int),
-                "completedByDay": defaultdict(int)
-            }
-        }
-        
-        durations = []
+        accumulator = AnalyticsAccumulator()
         
         for event in events:
             try:
-                event_date = datetime.fromisoformat(event.get("timestamp", "").replace("Z", "+00:00"))
-                hour = event_date.hour
-                day = event_date.strftime("%A").lower()
-                event_type = event.get("type", "")
-                metadata = event.get("metadata", {})
-                
-                if event_type == "task_created":
-                    analytics["totalTasks"] += 1
-                    
-                elif event_type == "task_completed":
-                    analytics["completedTasks"] += 1
-                    analytics["taskPatterns"]["completedByHour"][hour] += 1
-                    analytics["taskPatterns"]["completedByDay"][day] += 1
-                    
-                    if metadata.get("duration") and isinstance(metadata["duration"], (int, float)):
-                        durations.append(metadata["duration"])
-                        
-                elif event_type == "task_failed":
-                    analytics["failedTasks"] += 1
-                    analytics["taskPatterns"]["failedByHour"][hour] += 1
-                    
-                elif event_type == "task_rescheduled":
-                    analytics["rescheduledTasks"] += 1
-                    
+                accumulator.add_event(event)
             except Exception as e:
                 logger.warning(f"Error processing event: {e}")
                 continue
         
-        # حساب معدل الإنجاز
-        if analytics["totalTasks"] > 0:
-            analytics["completionRate"] = analytics["completedTasks"] / analytics["totalTasks"]
+        return accumulator.to_analytics()
+    
+    @staticmethod
+    def process_columns(columns: ColumnarEvents) -> Dict[str, Any]:
+        """
+        معالجة الأحداث العمودية بعمليات مصفوفات (نفس مخرجات process_events)
+        
+        Args:
+            columns: أعمدة الأحداث بعد فك الترميز
+        
+        Returns:
+            Dict: التحليلات المعالجة
+        """
+        codes = columns.types
+        timestamps = columns.timestamps.astype(np.int64)
+        hours = (timestamps % 86400) // 3600
+        # 1970-01-01 كان يوم خميس (الاثنين = 0)
+        weekdays = (timestamps // 86400 + 3) % 7
         
-        # حساب متوسط مدة المهمة
-        if durations:
-            analytics["avgTaskDuration"] = sum(durations) / len(durations)
+        counts = np.bincount(codes, minlength=len(VALID_EVENT_TYPES))
+        completed = codes == VALID_EVENT_TYPES.index("task_completed")
+        failed = codes == VALID_EVENT_TYPES.index("task_failed")
         
-        # تحويل defaultdict إلى dict عادي
-        analytics["taskPatterns"]["completedByHour"] = dict(analytics["taskPatterns"]["completedByHour"])
-        analytics["taskPatterns"]["failedByHour"] = dict(analytics["taskPatterns"]["failedByHour"])
-        analytics["taskPatterns"]["completedByDay"] = dict(analytics["taskPatterns"]["completedByDay"])
+        completed_by_hour = np.bincount(hours[completed], minlength=24)
+        failed_by_hour = np.bincount(hours[failed], minlength=24)
+        completed_by_day = np.bincount(weekdays[completed], minlength=7)
         
-        analytics["lastAnalyzed"] = datetime.utcnow().isoformat()
+        durations = columns.durations[completed]
+        durations = durations[np.isfinite(durations) & (durations != 0)]
+        
+        duration_sketch = KLLSketch()
+        duration_sketch.update_many(durations)
+        
+        task_events = codes < len(TASK_EVENT_TYPES)
+        day_sketch = HyperLogLog()
+        day_sketch.add_keys(timestamps[task_events] // 86400)
+        
+        task_sketch = HyperLogLog()
+        if columns.task_ids is not None:
+            task_ids = columns.task_ids[task_events]
+            task_sketch.add_keys(task_ids[task_ids != 0])
+        
+        total_tasks = int(counts[VALID_EVENT_TYPES.index("task_created")])
+        completed_tasks = int(counts[VALID_EVENT_TYPES.index("task_completed")])
+        
+        analytics = {
+            "totalTasks": total_tasks,
+            "completedTasks": completed_tasks,
+            "failedTasks": int(counts[VALID_EVENT_TYPES.index("task_failed")]),
+            "rescheduledTasks": int(counts[VALID_EVENT_TYPES.index("task_rescheduled")]),
+            "completionRate": completed_tasks / total_tasks if total_tasks > 0 else 0,
+            "avgTaskDuration": float(durations.mean(dtype=np.float64)) if durations.size else 0,
+            "taskPatterns": {
+                "completedByHour": {int(h): int(c) for h, c in enumerate(completed_by_hour) if c},
+                "failedByHour": {int(h): int(c) for h, c in enumerate(failed_by_hour) if c},
+                "completedByDay": {WEEKDAYS[d]: int(c) for d, c in enumerate(completed_by_day) if c}
+            },
+            "lastAnalyzed": datetime.utcnow().isoformat()
+        }
+        
+        analytics.update(AnalyticsEngine.sketch_summary(duration_sketch, task_sketch, day_sketch))
         
         return analytics
     
+    @staticmethod
+    def sketch_summary(
+        duration_sketch: KLLSketch,
+        task_sketch: HyperLogLog,
+        day_sketch: HyperLogLog
+    ) -> Dict[str, Any]:
+        """
+        تحويل الملخصات التدفقية إلى حقول التحليلات
+        
+        Args:
+            duration_sketch: ملخص KLL لمدد المهام
+            task_sketch: عداد المهام المميزة
+            day_sketch: عداد الأيام النشطة
+        
+        Returns:
+            Dict: durationPercentiles, distinctTasks, activeDays
+        """
+        p50, p90, p99 = duration_sketch.quantiles(DURATION_PERCENTILES)
+        
+        return {
+            "durationPercentiles": {"p50": p50, "p90": p90, "p99": p99},
+            "distinctTasks": task_sketch.count(),
+            "activeDays": day_sketch.count()
+        }
+    
+    @staticmethod
+    def calculate_streak_columns(columns: ColumnarEvents) -> Dict[str, int]:
+        """
+        حساب أيام الالتزام من الأحداث العمودية
+        
+        Args:
+            columns: أعمدة الأحداث بعد فك الترميز
+        
+        Returns:
+            Dict: current و best streak
+        """
+        completed = columns.types == VALID_EVENT_TYPES.index("task_completed")
+        days = np.unique(columns.timestamps[completed].astype(np.int64) // 86400)
+        
+        completed_days = {
+            datetime.utcfromtimestamp(int(day) * 86400).strftime("%Y-%m-%d")
+            for day in days
+        }
+        
+        return AnalyticsEngine.streak_from_days(completed_days)
+    
     @staticmethod
     def calculate_streak(events: List[Dict]) -> Dict[str, int]:
         """
@@ -128,6 +310,19 @@ class AnalyticsEngine:
                 except Exception:
                     continue
         
+        return AnalyticsEngine.streak_from_days(completed_days)
+    
+    @staticmethod
+    def streak_from_days(completed_days: set) -> Dict[str, int]:
+        """
+        حساب أيام الالتزام من مجموعة أيام الإنجاز
+        
+        Args:
+            completed_days: الأيام بصيغة YYYY-MM-DD
+        
+        Returns:
+            Dict: current و best streak
+        """
         if not completed_days:
             return {"current": 0, "best": 0}
         
@@ -193,6 +388,46 @@ class AnalyticsEngine:
         
         return [int(hour) for hour, _ in sorted_hours[:3]]
     
+    @staticmethod
+    def build_analytics(
+        user_id: str,
+        base_analytics: Dict[str, Any],
+        streak_data: Dict[str, int]
+    ) -> Dict[str, Any]:
+        """
+        تجميع مخرجات getAnalytics من التحليلات الأساسية
+        
+        Args:
+            user_id: معرف المستخدم
+            base_analytics: مخرجات process_events أو التجميعات اليومية
+            streak_data: current و best streak
+        
+        Returns:
+            Dict: التحليلات الكاملة
+        """
+        # إيجاد أكثر الساعات إنتاجية
+        productive_hours = AnalyticsEngine.find_productive_hours(
+            base_analytics.get("taskPatterns", {}).get("completedByHour", {})
+        )
+        
+        return {
+            "userId": user_id,
+            "totalTasks": base_analytics.get("totalTasks", 0),
+            "completedTasks": base_analytics.get("completedTasks", 0),
+            "failedTasks": base_analytics.get("failedTasks", 0),
+            "rescheduledTasks": base_analytics.get("rescheduledTasks", 0),
+            "completionRate": base_analytics.get("completionRate", 0),
+            "avgTaskDuration": base_analytics.get("avgTaskDuration", 0),
+            "durationPercentiles": base_analytics.get("durationPercentiles", {}),
+            "distinctTasks": base_analytics.get("distinctTasks"),
+            "activeDays": base_analytics.get("activeDays"),
+            "streak": streak_data["current"],
+            "bestStreak": streak_data["best"],
+            "productiveHours": productive_hours,
+            "taskPatterns": base_analytics.get("taskPatterns", {}),
+            "lastAnalyzed": datetime.utcnow().isoformat()
+        }
+    
     @staticmethod
     def generate_insights(analytics: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -347,6 +582,9 @@ def trackBehavior(req: https_fn.CallableRequest) -> dict:
             "metadata": metadata
         }
         
+        # تحديث التجميعات اليومية (تُحفظ في الخلفية)
+        rollup_store.record_event(req.auth.uid, event)
+        
         logger.info(f"Behavior tracked: {event_type}", extra={
             "userId": req.auth.uid,
             "event": event
@@ -380,6 +618,17 @@ def getAnalytics(req: https_fn.CallableRequest) -> dict:
     
     المعاملات:
         events (list): قائمة الأحداث
+        columnar (dict): الأحداث بالصيغة العمودية المضغوطة (بديل لـ events)
+        period (str): فترة من التجميعات اليومية (اختياري)
+            today, last_7_days, last_30_days, this_week, this_month
+        startDate (str): بداية النطاق YYYY-MM-DD (اختياري)
+        endDate (str): نهاية النطاق YYYY-MM-DD (اختياري)
+        ifNoneMatch (str): آخر digest لدى العميل (اختياري)
+    
+    عند تحديد فترة أو نطاق بدون أحداث تُحسب التحليلات من التجميعات
+    اليومية المسجلة عبر trackBehavior دون إعادة معالجة الأحداث. التجميعات
+    تُحفظ في مخزن اللقطات المشترك فتبقى عبر النسخ والتشغيل البارد (انظر
+    DailyRollupStore)، والأحداث الجديدة تظهر بعد الحفظ التالي
     """
     if not req.auth:
         raise https_fn.HttpsError(
@@ -389,39 +638,76 @@ def getAnalytics(req: https_fn.CallableRequest) -> dict:
     
     data = req.data
     events = data.get("events", [])
+    columnar = data.get("columnar")
+    period = data.get("period")
+    start_date = data.get("startDate")
+    end_date = data.get("endDate")
+    use_rollups = not events and not columnar and bool(period or start_date or end_date)
+    
+    columns = None
+    if columnar:
+        try:
+            columns = decode_events(columnar, len(VALID_EVENT_TYPES))
+        except ValueError as e:
+            raise https_fn.HttpsError(
+                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+                message=f"صيغة الأحداث العمودية غير صالحة: {str(e)}"
+            )
     
-    if not events or not isinstance(events, list):
+    if not use_rollups and columns is None and (not events or not isinstance(events, list)):
         raise https_fn.HttpsError(
             code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
             message="الأحداث مطلوبة"
         )
     
-    try:
-        # معالجة الأحداث
-        base_analytics = AnalyticsEngine.process_events(events)
-        
-        # حساب أيام الالتزام
-        streak_data = AnalyticsEngine.calculate_streak(events)
-        
-        # إيجاد أكثر الساعات إنتاجية
-        productive_hours = AnalyticsEngine.find_productive_hours(
-            base_analytics.get("taskPatterns", {}).get("completedByHour", {})
+    if period and period not in RANGE_PERIODS:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            message="الفترة غير صالحة"
+        )
+    
+    if use_rollups:
+        try:
+            start, end = resolve_date_range(period, start_date, end_date)
+        except ValueError:
+            raise https_fn.HttpsError(
+                code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+                message="النطاق الزمني غير صالح"
+            )
+        
+        # النطاق المحسوم وإصدار التجميعات العام يدخلان في البصمة، والحساب يستخدم
+        # نفس التجميعات التي أُخذ إصدارها
+        rollup_version, rollup = rollup_store.snapshot(req.auth.uid)
+        digest = canonical_digest(
+            "getAnalytics", req.auth.uid, start.isoformat(), end.isoformat(), rollup_version
         )
+    else:
+        # السلسلة الحالية و lastAnalyzed تعتمد على تاريخ اليوم، فنفس الأحداث في يوم آخر نتيجة أخرى
+        digest = canonical_digest(
+            "getAnalytics", req.auth.uid, datetime.utcnow().date().isoformat(), columnar or events
+        )
+    
+    def compute() -> dict:
+        if use_rollups:
+            # الاستعلام من التجميعات اليومية
+            base_analytics = rollup_to_analytics(rollup.query(start, end))
+            streak_data = rollup.streak(start, end)
+            base_analytics.update(AnalyticsEngine.sketch_summary(*rollup.sketches(start, end)))
+        elif columns is not None:
+            # معالجة الأعمدة مباشرة بدون كائنات لكل حدث
+            base_analytics = AnalyticsEngine.process_columns(columns)
+            streak_data = AnalyticsEngine.calculate_streak_columns(columns)
+        else:
+            # معالجة الأحداث
+            base_analytics = AnalyticsEngine.process_events(events)
+            
+            # حساب أيام الالتزام
+            streak_data = AnalyticsEngine.calculate_streak(events)
         
-        analytics = {
-            "userId": req.auth.uid,
-            "totalTasks": base_analytics.get("totalTasks", 0),
-            "completedTasks": base_analytics.get("completedTasks", 0),
-            "failedTasks": base_analytics.get("failedTasks", 0),
-            "rescheduledTasks": base_analytics.get("rescheduledTasks", 0),
-            "completionRate": base_analytics.get("completionRate", 0),
-            "avgTaskDuration": base_analytics.get("avgTaskDuration", 0),
-            "streak": streak_data["current"],
-            "bestStreak": streak_data["best"],
-            "productiveHours": productive_hours,
-            "taskPatterns": base_analytics.get("taskPatterns", {}),
-            "lastAnalyzed": datetime.utcnow().isoformat()
-        }
+        analytics = AnalyticsEngine.build_analytics(req.auth.uid, base_analytics, streak_data)
+        
+        if use_rollups:
+            analytics["range"] = {"start": start.isoformat(), "end": end.isoformat()}
         
         # إنشاء الرؤى
         insights = AnalyticsEngine.generate_insights(analytics)
@@ -431,10 +717,14 @@ def getAnalytics(req: https_fn.CallableRequest) -> dict:
         return {
             "success": True,
             "analytics": analytics,
-            "insights": insights,
-            "timestamp": datetime.utcnow().isoformat()
+            "insights": insights
         }
+    
+    try:
+        return conditional_response(analytics_memo, digest, data.get("ifNoneMatch"), compute)
         
+    except https_fn.HttpsError:
+        raise
     except Exception as e:
         logger.error(f"Analytics error: {e}")
         raise https_fn.HttpsError(
@@ -457,6 +747,7 @@ def getInsights(req: https_fn.CallableRequest) -> dict:
     
     المعاملات:
         analytics (dict): بيانات التحليلات
+        ifNoneMatch (str): آخر digest لدى العميل (اختياري)
     """
     if not req.auth:
         raise https_fn.HttpsError(
@@ -473,15 +764,19 @@ def getInsights(req: https_fn.CallableRequest) -> dict:
             message="البيانات التحليلية مطلوبة"
         )
     
-    try:
+    digest = canonical_digest("getInsights", req.auth.uid, analytics)
+    
+    def compute() -> dict:
         analytics["userId"] = req.auth.uid
         insights = AnalyticsEngine.generate_insights(analytics)
         
         return {
             "success": True,
-            "insights": insights,
-            "timestamp": datetime.utcnow().isoformat()
+            "insights": insights
         }
+    
+    try:
+        return conditional_response(insights_memo, digest, data.get("ifNoneMatch"), compute)
         
     except Exception as e:
         logger.error(f"Insights error: {e}")
@@ -0,0 +1,7 @@
+"""
+Benchmarks
+سكربتات قياس الأداء (لا تُنشر مع الدوال)
+
+التشغيل من مجلد functions:
+    python -m benchmarks.<name>
+"""
@@ -0,0 +1,253 @@
+"""
+Concurrency Stress Benchmark
+اختبار ضغط لحالة rl_agent و personalizer المشتركة بين الطلبات المتزامنة
+
+يقيس:
+- التحديثات المفقودة في ربط مكافآت personalizer (مع القفل ومقارنةً بتحديث بدون قفل)
+- سلامة جدول Q: قراء بلا أقفال أثناء التعلم والتوسيع، ومجموع الزيارات = التجارب
+- إنتاجية الطلبات مع زيادة عدد الخيوط (طلب = انتظار I/O + حساب)
+
+التشغيل من مجلد functions:
+    python -m benchmarks.concurrency_benchmark --threads 1,2,4,8,16
+"""
+
+import argparse
+import sys
+import threading
+import time
+from typing import Any, Callable, Dict, List
+
+import numpy as np
+
+from personalizer import SCHEDULING_STRATEGIES, PersonalizerClient
+from rl_agent import (
+    ACTIONS, STATE_FEATURES, ExperienceQueue, Learner, QLearningAgent,
+    UserPolicyPool, dequantize_states
+)
+
+
+# ============================================
+# Helpers
+# ============================================
+
+def run_threads(count: int, target: Callable[[int], None]) -> float:
+    """تشغيل count خيطاً وإرجاع الزمن المستغرق بالثواني"""
+    threads = [threading.Thread(target=target, args=(index,)) for index in range(count)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - started
+
+
+def random_states(rng: np.random.Generator, count: int, distinct: int) -> np.ndarray:
+    """حالات مضغوطة uint8 من مجموعة محدودة (حتى تتكرر الحالات كما في الواقع)"""
+    pool = rng.integers(0, 256, (distinct, len(STATE_FEATURES)), dtype=np.uint8)
+    return pool[rng.integers(0, distinct, count)]
+
+
+# ============================================
+# Personalizer Rewards
+# ============================================
+
+def bench_personalizer(threads: int, per_thread: int, events: int) -> Dict[str, Any]:
+    """مكافآت متزامنة على نفس الأحداث: المجموع يجب أن يساوي عدد الاستدعاءات"""
+    client = PersonalizerClient()
+    unsafe: Dict[str, float] = {}
+    context = {"timeOfDay": "morning", "dayOfWeek": "monday", "userProductivity": "high", "taskType": "routine"}
+    event_ids = [client.rank(context, SCHEDULING_STRATEGIES)["eventId"] for _ in range(events)]
+
+    def locked(index: int) -> None:
+        for step in range(per_thread):
+            client.reward(event_ids[(index + step) % events], 1.0)
+
+    def unlocked(index: int) -> None:
+        for step in range(per_thread):
+            event_id = event_ids[(index + step) % events]
+            current = unsafe.get(event_id, 0)
+            unsafe[event_id] = current + 1.0
+
+    expected = threads * per_thread
+    seconds = run_threads(threads, locked)
+    run_threads(threads, unlocked)
+    # تسليم الأحداث للمتعلم: مجموع مكافآت الإجراءات = كل المكافآت المربوطة
+    client.pending.flush(force=True)
+
+    return {
+        "expected": expected,
+        "recorded": int(sum(total for _, total in client.action_rewards.values())),
+        "lostWithoutLock": expected - int(sum(unsafe.values())),
+        "rewardsPerSec": expected / seconds
+    }
+
+
+# ============================================
+# RL Agent
+# ============================================
+
+def bench_agent(readers: int, writers: int, experiences: int, seed: int = 0) -> Dict[str, Any]:
+    """
+    كتّاب يضيفون تجارب للطابور، ومتعلم يدربها، وقراء يتنبؤون بلا أقفال
+
+    التدريب من الذاكرة معطل (replay_batches=0) حتى تساوي الزيارات عدد التجارب
+    """
+    rng = np.random.default_rng(seed)
+    agent = QLearningAgent(prioritized=False)
+    queue = ExperienceQueue(capacity=experiences)
+    pool = UserPolicyPool(len(ACTIONS), max_bytes=64 * 1024)
+    learner = Learner(agent, queue, user_policies=pool, micro_batch=64, replay_batches=0)
+
+    # حالات متنوعة بما يكفي لتوسيع الجدول عدة مرات أثناء القراءة
+    states = dequantize_states(random_states(rng, experiences, experiences // 2)).tolist()
+    actions = rng.integers(0, len(ACTIONS), experiences).tolist()
+    probes = random_states(rng, 4096, experiences // 2)
+
+    done = threading.Event()
+    errors: List[str] = []
+    predictions = [0] * readers
+
+    def write(index: int) -> None:
+        for position in range(index, experiences, writers):
+            queue.put(states[position], actions[position], 1.0, states[position], False, f"user_{position % 500}")
+
+    def read(index: int) -> None:
+        local = np.random.default_rng(index)
+        while not done.is_set():
+            try:
+                batch = probes[local.integers(0, len(probes), 32)]
+                q_values = pool.predict_quantized(agent, f"user_{local.integers(500)}", batch)
+                agent.select_actions(q_values)
+                predictions[index] += len(batch)
+            except Exception as e:
+                errors.append(repr(e))
+                return
+
+    def learn() -> None:
+        while not done.is_set() or len(queue):
+            learner.step()
+
+    reader_threads = [threading.Thread(target=read, args=(index,)) for index in range(readers)]
+    learner_thread = threading.Thread(target=learn)
+    for thread in reader_threads:
+        thread.start()
+    learner_thread.start()
+
+    seconds = run_threads(writers, write)
+    done.set()
+    learner_thread.join()
+    for thread in reader_threads:
+        thread.join()
+
+    table = agent.q_table
+    user_visits = sum(int(entry["table"].visits.sum()) for entry in pool.entries.values())
+    return {
+        "experiences": experiences,
+        "received": queue.received,
+        "ingested": learner.ingested,
+        "globalVisits": int(table.visits[:len(table)].sum()),
+        "tableSize": len(table),
+        "userVisitsInMemory": user_visits,
+        "readerErrors": errors[:3],
+        "predictions": sum(predictions),
+        "feedbackPerSec": experiences / seconds
+    }
+
+
+# ============================================
+# Throughput Scaling
+# ============================================
+
+def bench_throughput(thread_counts: List[int], requests: int, io_ms: float) -> List[Dict[str, Any]]:
+    """
+    طلبات تنبؤ دفعي (20 حالة) يسبقها انتظار I/O ثابت (قراءة المستخدم/الشبكة)
+    بينما يتعلم خيط خلفي باستمرار
+    """
+    rng = np.random.default_rng(1)
+    agent = QLearningAgent(prioritized=False)
+    queue = ExperienceQueue()
+    learner = Learner(agent, queue, micro_batch=256, replay_batches=1)
+    probes = random_states(rng, 8192, 2048)
+    background = dequantize_states(random_states(rng, 4096, 2048)).tolist()
+
+    results = []
+    for count in thread_counts:
+        done = threading.Event()
+
+        def learn() -> None:
+            step = 0
+            while not done.is_set():
+                for position in range(256):
+                    state = background[(step + position) % len(background)]
+                    queue.put(state, position % len(ACTIONS), 0.5, state, False)
+                learner.step()
+                step += 256
+                time.sleep(0.005)
+
+        def handle(index: int) -> None:
+            local = np.random.default_rng(index)
+            for _ in range(requests // count):
+                time.sleep(io_ms / 1000)
+                batch = probes[local.integers(0, len(probes), 20)]
+                agent.select_actions(agent.predict_quantized(batch))
+
+        learner_thread = threading.Thread(target=learn)
+        learner_thread.start()
+        seconds = run_threads(count, handle)
+        done.set()
+        learner_thread.join()
+
+        served = (requests // count) * count
+        results.append({"threads": count, "requestsPerSec": served / seconds})
+
+    return results
+
+
+# ============================================
+# Main
+# ============================================
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--threads", default="1,2,4,8,16", help="أعداد الخيوط لاختبار الإنتاجية")
+    parser.add_argument("--requests", type=int, default=2000, help="عدد الطلبات لكل قياس")
+    parser.add_argument("--io-ms", type=float, default=2.0, help="زمن انتظار I/O لكل طلب")
+    parser.add_argument("--experiences", type=int, default=50000, help="عدد التجارب في اختبار الوكيل")
+    args = parser.parse_args(argv)
+
+    # تبديل الخيوط بكثرة يكشف السباقات التي تختفي مع الفاصل الافتراضي
+    sys.setswitchinterval(1e-5)
+
+    personalizer_result = bench_personalizer(threads=8, per_thread=20000, events=16)
+    print("Personalizer rewards")
+    print(f"  expected={personalizer_result['expected']} recorded={personalizer_result['recorded']}"
+          f" lostWithoutLock={personalizer_result['lostWithoutLock']}"
+          f" ({personalizer_result['rewardsPerSec']:,.0f}/s)")
+
+    agent_result = bench_agent(readers=4, writers=8, experiences=args.experiences)
+    print("RL agent (8 writers, 4 lock-free readers, 1 learner)")
+    print(f"  received={agent_result['received']} ingested={agent_result['ingested']}"
+          f" globalVisits={agent_result['globalVisits']} tableSize={agent_result['tableSize']}")
+    print(f"  predictions={agent_result['predictions']} readerErrors={agent_result['readerErrors']}"
+          f" ({agent_result['feedbackPerSec']:,.0f} feedback/s)")
+
+    sys.setswitchinterval(0.005)
+
+    print(f"Throughput ({args.io_ms} ms I/O + 20-state prediction per request, learner running)")
+    thread_counts = [int(value) for value in args.threads.split(",")]
+    for row in bench_throughput(thread_counts, args.requests, args.io_ms):
+        print(f"  threads={row['threads']:>3}  {row['requestsPerSec']:>8,.0f} req/s")
+
+    ok = (
+        personalizer_result["recorded"] == personalizer_result["expected"]
+        and agent_result["received"] == agent_result["experiences"]
+        and agent_result["ingested"] == agent_result["experiences"]
+        and agent_result["globalVisits"] == agent_result["experiences"]
+        and not agent_result["readerErrors"]
+    )
+    print("OK" if ok else "FAILED: lost updates or reader errors")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,318 @@
+"""
+Personalizer Replay Benchmark
+مقارنة محركات PersonalizerClient (الاستدلال الثابت و LinUCB) على نفس سجل السياقات
+
+بيئة اصطناعية: احتمال نجاح كل استراتيجية = نقاط الاستدلال + تفضيلات مخفية حسب
+الإنتاجية ونوع المهمة وفترة اليوم (فالاستدلال صحيح جزئياً فقط). السجل يثبّت
+السياقات وقرعة المكافأة لكل إجراء، فكل محرك يرى نفس العالم بالضبط.
+
+يقيس:
+- زمن rank لكل طلب (p50/p99)، وزمن rank_many لدفعة مهام مقارنةً بطلبات منفردة
+- منحنى التعلم: متوسط المكافأة والندم لكل شريحة من السجل
+- أثر لقطات الحالة: زمن rank + reward مع حفظ خلفي متكرر مقابل بدونه، وزمن
+  أول rank في نسخة جديدة (التحميل الكسول)
+- الربط المشترك: نسخة rank ونسخة sendReward ومتعلمان متزامنان على نفس المخزن؛
+  اللقطة المنشورة يجب أن تحوي كل قرار مرة واحدة وكل مكافأة مرسلة
+
+التشغيل من مجلد functions:
+    python -m benchmarks.personalizer_benchmark --events 20000
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Any
+
+import numpy as np
+
+from personalizer import (
+    DAYS_OF_WEEK, PRODUCTIVITY_LEVELS, SCHEDULING_STRATEGIES, TIMES_OF_DAY,
+    PersonalizerClient, StrategyScoreTable
+)
+from snapshots import LocalSnapshotStore
+
+TASK_TYPES = ["complex", "routine", "simple"]
+
+
+# ============================================
+# Replay Log
+# ============================================
+
+def build_log(events: int, seed: int) -> Dict[str, Any]:
+    """سياقات عشوائية واحتمال النجاح الحقيقي وقرعة المكافأة لكل إجراء"""
+    rng = np.random.default_rng(seed)
+    table = StrategyScoreTable(SCHEDULING_STRATEGIES)
+    n_actions = len(SCHEDULING_STRATEGIES)
+
+    # تفضيلات مخفية لكل (قيمة سياق، إجراء)
+    preferences = {
+        value: rng.normal(0, 0.15, n_actions)
+        for value in TIMES_OF_DAY + PRODUCTIVITY_LEVELS + TASK_TYPES
+    }
+
+    contexts = []
+    probabilities = np.zeros((events, n_actions))
+    for index in range(events):
+        context = {
+            "timeOfDay": TIMES_OF_DAY[rng.integers(len(TIMES_OF_DAY))],
+            "dayOfWeek": DAYS_OF_WEEK[rng.integers(len(DAYS_OF_WEEK))],
+            "userProductivity": PRODUCTIVITY_LEVELS[rng.integers(len(PRODUCTIVITY_LEVELS))],
+            "taskType": TASK_TYPES[rng.integers(len(TASK_TYPES))],
+        }
+        contexts.append(context)
+        hidden = sum(preferences[context[key]] for key in ("timeOfDay", "userProductivity", "taskType"))
+        probabilities[index] = np.clip(np.array(table.lookup(context)) - 0.3 + hidden, 0.02, 0.98)
+
+    return {"contexts": contexts, "probabilities": probabilities, "coins": rng.random((events, n_actions))}
+
+
+# ============================================
+# Runner
+# ============================================
+
+def replay(engine: str, log: Dict[str, Any], epsilon: float, alpha: float, chunks: int) -> Dict[str, Any]:
+    """
+    تشغيل محرك على السجل: rank ثم المكافأة ثم تسليم الحدث للمتعلم مباشرة
+
+    Returns:
+        Dict: زمن rank ومنحنى التعلم
+    """
+    client = PersonalizerClient(epsilon=epsilon, engine=engine, alpha=alpha)
+    ids = [strategy["id"] for strategy in SCHEDULING_STRATEGIES]
+    probabilities = log["probabilities"]
+    events = len(log["contexts"])
+
+    latencies = np.zeros(events)
+    rewards = np.zeros(events)
+    regret = np.zeros(events)
+    for index, context in enumerate(log["contexts"]):
+        started = time.perf_counter()
+        response = client.rank(context, SCHEDULING_STRATEGIES)
+        latencies[index] = time.perf_counter() - started
+
+        action_index = ids.index(response["rewardActionId"])
+        reward = float(log["coins"][index, action_index] < probabilities[index, action_index])
+        client.reward(response["eventId"], reward)
+        # بدون انتظار مهلة المكافأة: الحدث يُسلَّم للمتعلم فوراً
+        client.pending.flush(force=True)
+
+        rewards[index] = reward
+        regret[index] = probabilities[index].max() - probabilities[index, action_index]
+
+    return {
+        "engine": engine,
+        "rankP50us": float(np.percentile(latencies, 50) * 1e6),
+        "rankP99us": float(np.percentile(latencies, 99) * 1e6),
+        "meanReward": float(rewards.mean()),
+        "rewardCurve": [float(part.mean()) for part in np.array_split(rewards, chunks)],
+        "regretCurve": [float(part.mean()) for part in np.array_split(regret, chunks)],
+    }
+
+
+def batch_latency(engine: str, log: Dict[str, Any], size: int, repeats: int = 200) -> Dict[str, float]:
+    """زمن ترتيب size مهمة بطلب rank_many واحد مقابل size طلب rank"""
+    client = PersonalizerClient(engine=engine, max_pending=size * repeats * 2)
+    contexts = log["contexts"][:size]
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        for context in contexts:
+            client.rank(context, SCHEDULING_STRATEGIES)
+    singles = (time.perf_counter() - started) / repeats
+
+    started = time.perf_counter()
+    for _ in range(repeats):
+        client.rank_many(contexts, SCHEDULING_STRATEGIES)
+    batch = (time.perf_counter() - started) / repeats
+
+    return {"singlesUs": singles * 1e6, "batchUs": batch * 1e6}
+
+
+def snapshot_latency(log: Dict[str, Any], interval_sec: float) -> Dict[str, Any]:
+    """
+    زمن rank + reward (مع تسليم الحدث للمتعلم) بدون لقطات ومع حفظ خلفي كل
+    interval_sec، ثم زمن أول rank لنسخة جديدة تحمّل آخر لقطة
+    """
+    ids = [strategy["id"] for strategy in SCHEDULING_STRATEGIES]
+    results: Dict[str, Any] = {}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for mode in ("none", "snapshots"):
+            client = PersonalizerClient(engine="linucb")
+            if mode == "snapshots":
+                client.enable_snapshots(LocalSnapshotStore(directory), interval_sec=interval_sec)
+
+            latencies = np.zeros(len(log["contexts"]))
+            for index, context in enumerate(log["contexts"]):
+                started = time.perf_counter()
+                response = client.rank(context, SCHEDULING_STRATEGIES)
+                action_index = ids.index(response["rewardActionId"])
+                client.reward(response["eventId"], float(log["coins"][index, action_index] < log["probabilities"][index, action_index]))
+                client.pending.flush(force=True)
+                latencies[index] = time.perf_counter() - started
+
+            results[mode] = {
+                "p50us": float(np.percentile(latencies, 50) * 1e6),
+                "p99us": float(np.percentile(latencies, 99) * 1e6),
+            }
+            if mode == "snapshots":
+                # حتى ينتهي آخر حفظ خلفي
+                with client.snapshots._saving:
+                    results[mode].update(client.snapshots.get_stats())
+
+        cold = PersonalizerClient(engine="linucb")
+        cold.enable_snapshots(LocalSnapshotStore(directory))
+        timings = []
+        for context in log["contexts"][:2]:
+            started = time.perf_counter()
+            cold.rank(context, SCHEDULING_STRATEGIES)
+            timings.append(time.perf_counter() - started)
+        results["coldFirstRankUs"] = timings[0] * 1e6
+        results["coldSecondRankUs"] = timings[1] * 1e6
+        results["restoredUpdates"] = cold.bandit.updates
+
+    return results
+
+
+def shared_join(log: Dict[str, Any], reward_wait_sec: float = 0.5, capacity: int = 2000) -> Dict[str, Any]:
+    """
+    الربط عبر طابوري المخزن مع متعلمين يعملان معاً (نسختا personalizerLearner)
+
+    المكافأة تُرسل للقرارات الناجحة فقط، فالباقي يكتمل بالمكافأة الافتراضية
+    """
+    ids = [strategy["id"] for strategy in SCHEDULING_STRATEGIES]
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = LocalSnapshotStore(directory)
+
+        def instance() -> PersonalizerClient:
+            client = PersonalizerClient(engine="linucb", reward_wait_sec=reward_wait_sec, max_pending=capacity)
+            client.compile(SCHEDULING_STRATEGIES)
+            client.enable_snapshots(store)
+            client.enable_shared_join(store, ship_interval_sec=0.02, grace_sec=0.1)
+            return client
+
+        ranker, rewarder = instance(), instance()
+        learners = [instance(), instance()]
+        done = threading.Event()
+        rounds = [0, 0]
+        skipped = [0, 0]
+        peak_pending = [0]
+
+        def learn(index: int) -> None:
+            while not done.is_set():
+                result = learners[index].learner_round(time_budget_sec=0.05)
+                if result is None:
+                    skipped[index] += 1
+                else:
+                    rounds[index] += 1
+                peak_pending[0] = max(peak_pending[0], len(learners[index].pending))
+
+        threads = [threading.Thread(target=learn, args=(index,)) for index in range(2)]
+        for thread in threads:
+            thread.start()
+
+        sent = 0.0
+        for index, context in enumerate(log["contexts"]):
+            response = ranker.rank(context, SCHEDULING_STRATEGIES)
+            action_index = ids.index(response["rewardActionId"])
+            if log["coins"][index, action_index] < log["probabilities"][index, action_index]:
+                rewarder.reward(response["eventId"], 1.0)
+                sent += 1.0
+
+        ranker.rank_shipper.flush()
+        rewarder.reward_shipper.flush()
+        # حتى تنتهي مهلة آخر القرارات وتُسلَّم
+        time.sleep(reward_wait_sec + 0.5)
+        done.set()
+        for thread in threads:
+            thread.join()
+        learners[0].learner_round()
+
+        published = PersonalizerClient(engine="linucb")
+        published.compile(SCHEDULING_STRATEGIES)
+        published.enable_snapshots(store)
+        published.snapshots.warm_load()
+        counts, totals = published._reward_totals(ids)
+
+    return {
+        "decisions": len(log["contexts"]),
+        "learned": int(counts.sum()),
+        "rewardSent": sent,
+        "rewardLearned": float(totals.sum()),
+        "pendingLeft": len(published.pending),
+        "peakPending": peak_pending[0],
+        "rounds": rounds,
+        "skippedRounds": skipped
+    }
+
+
+# ============================================
+# Main
+# ============================================
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Personalizer replay benchmark")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--epsilon", type=float, default=0.05)
+    parser.add_argument("--alpha", type=float, default=0.3)
+    parser.add_argument("--chunks", type=int, default=10, help="عدد نقاط منحنى التعلم")
+    parser.add_argument("--batch", type=int, default=50, help="حجم دفعة rank_many")
+    parser.add_argument("--snapshot-interval", type=float, default=0.05, help="فترة الحفظ الخلفي في قياس اللقطات")
+    parser.add_argument("--json", action="store_true", help="طباعة النتائج كـ JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    log = build_log(args.events, args.seed)
+    oracle = float(log["probabilities"].max(axis=1).mean())
+    results = [
+        {
+            **replay(engine, log, args.epsilon, args.alpha, args.chunks),
+            **batch_latency(engine, log, args.batch)
+        }
+        for engine in ("heuristic", "linucb")
+    ]
+
+    snapshots = snapshot_latency(log, args.snapshot_interval)
+    joined = shared_join(log)
+    ok = (
+        joined["learned"] == joined["decisions"]
+        and joined["rewardLearned"] == joined["rewardSent"]
+        and joined["pendingLeft"] == 0
+    )
+
+    if args.json:
+        print(json.dumps({
+            "oracleReward": oracle, "results": results, "snapshots": snapshots, "sharedJoin": joined
+        }, indent=2))
+        return 0 if ok else 1
+
+    print(f"{args.events:,} events, epsilon {args.epsilon}, alpha {args.alpha}, oracle reward {oracle:.3f}")
+    for row in results:
+        print(f"{row['engine']:<10} rank p50 {row['rankP50us']:6.1f} us  p99 {row['rankP99us']:6.1f} us"
+              f"  mean reward {row['meanReward']:.3f}")
+        print(f"{'':<10} regret by chunk: " + " ".join(f"{value:.3f}" for value in row["regretCurve"]))
+        print(f"{'':<10} {args.batch} tasks: {args.batch} rank calls {row['singlesUs']:,.0f} us,"
+              f" one rank_many {row['batchUs']:,.0f} us")
+
+    saved = snapshots["snapshots"]
+    print(f"rank+reward without snapshots p50 {snapshots['none']['p50us']:.1f} us  p99 {snapshots['none']['p99us']:.1f} us")
+    print(f"rank+reward with snapshots    p50 {saved['p50us']:.1f} us  p99 {saved['p99us']:.1f} us"
+          f"  (save every {args.snapshot_interval}s: v{saved['version']}, {saved['snapshotBytes']:,} bytes,"
+          f" {saved['saveSeconds'] * 1000:.1f} ms per save)")
+    print(f"new instance: first rank {snapshots['coldFirstRankUs']:,.0f} us (lazy load,"
+          f" {snapshots['restoredUpdates']} updates restored), second {snapshots['coldSecondRankUs']:.0f} us")
+    print(f"shared join: {joined['decisions']:,} decisions, learned {joined['learned']:,},"
+          f" rewards sent {joined['rewardSent']:,.0f} learned {joined['rewardLearned']:,.0f},"
+          f" peak pending {joined['peakPending']:,}, rounds {joined['rounds']} skipped {joined['skippedRounds']}")
+    print("OK" if ok else "FAILED: shared join lost or duplicated events")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
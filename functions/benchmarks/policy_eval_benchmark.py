@@ -0,0 +1,189 @@
+"""
+Offline Policy Evaluation Benchmark
+دقة وسرعة policy_eval على سجلات اصطناعية معروفة القيمة الحقيقية
+
+- personalizer: سجل من مسار الإنتاج (rank ثم reward ثم DecisionLog) على عالم
+  personalizer_benchmark؛ القيمة الحقيقية لسياسة = متوسط Σa π(a|x)·P(نجاح a|x)
+- rl: تجارب بسياسة عشوائية على rl_simulator ووكيل مرشح مدرّب (rl_offline) على
+  سجل منفصل؛ القيمة الحقيقية من المكافأة المتوقعة لكل إجراء في كل حالة مسجلة
+
+التشغيل من مجلد functions:
+    python -m benchmarks.policy_eval_benchmark --events 50000 --workers 1,2,4
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import tempfile
+from typing import Dict, List, Any
+
+import numpy as np
+
+from benchmarks.personalizer_benchmark import build_log
+from personalizer import SCHEDULING_STRATEGIES, DecisionLog, PersonalizerClient
+from policy_eval import PersonalizerDomain, RLDomain, evaluate, train_linucb
+from rl_agent import ACTIONS, EXPERIENCE_DTYPE, calculate_reward, normalize_state, quantize_states
+from rl_offline import to_agent, train
+from rl_simulator import UserSimulator
+from snapshots import LocalSnapshotStore, encode_snapshot
+
+
+# ============================================
+# Logged Data
+# ============================================
+
+def log_personalizer(
+    directory: str, events: int, seed: int, epsilon: float, shard_size: int, engine: str = "linucb"
+) -> Dict[str, Any]:
+    """
+    سجل قرارات محرك engine بمسار الإنتاج؛ كل shard_size حدث شريحة
+
+    Returns:
+        Dict: عالم السجل (احتمالات النجاح الحقيقية بنفس ترتيب الأحداث) ومسارات الشرائح
+    """
+    log = build_log(events, seed)
+    decision_log = DecisionLog(LocalSnapshotStore(directory), batch_size=events + 1, flush_interval_sec=float("inf"))
+    client = PersonalizerClient(epsilon=epsilon, engine=engine, decision_log=decision_log)
+    ids = [strategy["id"] for strategy in SCHEDULING_STRATEGIES]
+
+    for index, context in enumerate(log["contexts"]):
+        response = client.rank(context, SCHEDULING_STRATEGIES)
+        action_index = ids.index(response["rewardActionId"])
+        client.reward(response["eventId"], float(log["coins"][index, action_index] < log["probabilities"][index, action_index]))
+        client.pending.flush(force=True)
+        if (index + 1) % shard_size == 0:
+            decision_log.flush()
+    decision_log.flush()
+
+    log["paths"] = sorted(glob.glob(os.path.join(directory, decision_log.name, "queue", "*.batch")))
+    return log
+
+
+def log_rl(directory: str, steps: int, users: int, seed: int, shard_size: int) -> Dict[str, Any]:
+    """تجارب بإجراءات عشوائية منتظمة كدفعات طابور، مع المكافأة المتوقعة لكل إجراء"""
+    rng = np.random.default_rng(seed)
+    simulator = UserSimulator(users, seed)
+    store = LocalSnapshotStore(directory)
+
+    experiences = np.zeros(steps, dtype=EXPERIENCE_DTYPE)
+    expected = np.zeros((steps, len(ACTIONS)))
+    for step in range(steps):
+        user_index, raw_state = simulator.sample()
+        action_index = int(rng.integers(len(ACTIONS)))
+        expected[step] = simulator.expected_rewards(user_index)
+        feedback, next_raw_state, done = simulator.respond(user_index, action_index)
+        experiences[step] = (
+            quantize_states([normalize_state(raw_state)])[0],
+            quantize_states([normalize_state(next_raw_state)])[0],
+            action_index,
+            calculate_reward(feedback),
+            done,
+        )
+
+    for start in range(0, steps, shard_size):
+        batch = experiences[start:start + shard_size]
+        store.push_batch("rl-log", encode_snapshot({field: batch[field] for field in EXPERIENCE_DTYPE.names}, {"count": len(batch)}))
+
+    paths = sorted(glob.glob(os.path.join(directory, "rl-log", "queue", "*.batch")))
+    return {"experiences": experiences, "expected": expected, "paths": paths}
+
+
+def true_values(domain: Any, paths: List[str], policies: List[str], success: np.ndarray) -> Dict[str, float]:
+    """Σa π(a|x)·القيمة الحقيقية لـ a، بنفس ترتيب الأحداث في الشرائح"""
+    batches = [domain.load(path) for path in paths]
+    return {
+        name: float((np.concatenate([domain.target(name, batch) for batch in batches]) * success).sum(axis=1).mean())
+        for name in policies
+    }
+
+
+# ============================================
+# Runs
+# ============================================
+
+def bench_personalizer(
+    directory: str, events: int, seed: int, epsilon: float, shard_size: int, workers: List[int], engine: str = "linucb"
+) -> Dict[str, Any]:
+    log = log_personalizer(os.path.join(directory, "eval"), events, seed, epsilon, shard_size, engine)
+    train_log = log_personalizer(os.path.join(directory, "train"), events, seed + 1, epsilon, shard_size, engine)
+    theta = train_linucb(train_log["paths"])
+
+    policies = PersonalizerDomain.POLICIES
+    truth = true_values(PersonalizerDomain(theta=theta), log["paths"], policies, log["probabilities"])
+    config = {"domain": "personalizer", "policies": policies, "theta": theta}
+    reports = [evaluate(config, log["paths"], count) for count in workers]
+    return {"truth": truth, "reports": reports}
+
+
+def bench_rl(directory: str, steps: int, users: int, seed: int, shard_size: int, workers: List[int]) -> Dict[str, Any]:
+    # المرشح مدرّب على سجل منفصل بخصم 0 (القيمة الحقيقية هنا للمكافأة الفورية)
+    train_log = log_rl(os.path.join(directory, "rl-train"), steps, users, seed + 1, shard_size)
+    values, visits, _ = train(train_log["experiences"], workers=1, epochs=3, discount=0.0)
+    arrays, meta = to_agent(values, visits, train_log["experiences"]).export_arrays()
+    agent_path = os.path.join(directory, "candidate.snap")
+    with open(agent_path, "wb") as f:
+        f.write(encode_snapshot(arrays, meta))
+
+    log = log_rl(os.path.join(directory, "rl-eval"), steps, users, seed, shard_size)
+    domain = RLDomain(agent_paths=[agent_path])
+    truth = true_values(domain, log["paths"], ["uniform", "candidate"], log["expected"])
+    # السلوك عشوائي منتظم: قيمته الحقيقية قيمة uniform
+    truth["logged"] = truth["uniform"]
+
+    config = {"domain": "rl", "agents": [agent_path]}
+    reports = [evaluate(config, log["paths"], count) for count in workers]
+    return {"truth": truth, "reports": reports}
+
+
+# ============================================
+# Main
+# ============================================
+
+def print_result(title: str, result: Dict[str, Any]) -> None:
+    report = result["reports"][-1]
+    print(f"{title}: {report['events']:,} events in {report['shards']} shards")
+    print(f"  {'policy':<12}{'truth':>8}{'IPS':>8}{'SNIPS':>8}{'DM':>8}{'DR':>8}{'DR err':>8}{'ESS':>9}")
+    for name, row in report["policies"].items():
+        truth = result["truth"][name]
+        print(f"  {name:<12}{truth:>8.4f}{row['ips']:>8.4f}{row['snips']:>8.4f}{row['dm']:>8.4f}"
+              f"{row['dr']:>8.4f}{row['dr'] - truth:>+8.4f}{row['effectiveSampleSize']:>9,.0f}")
+    for row in result["reports"]:
+        print(f"  workers={row['workers']:<3} {row['seconds']:.3f}s  {row['evaluationsPerSec']:,.0f} evaluations/s")
+
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Offline policy evaluation benchmark")
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--epsilon", type=float, default=0.2, help="استكشاف سياسة السلوك (personalizer)")
+    parser.add_argument("--engine", choices=["linucb", "heuristic"], default="linucb", help="محرك سياسة السلوك (personalizer)")
+    parser.add_argument("--shard-size", type=int, default=5000)
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--json", action="store_true", help="طباعة النتائج كـ JSON")
+    args = parser.parse_args(argv)
+
+    logging.disable(logging.INFO)
+    workers = [int(value) for value in args.workers.split(",")]
+    with tempfile.TemporaryDirectory() as directory:
+        results = {
+            "personalizer": bench_personalizer(
+                directory, args.events, args.seed, args.epsilon, args.shard_size, workers, args.engine
+            ),
+            "rl": bench_rl(directory, args.events, args.users, args.seed, args.shard_size, workers),
+        }
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print_result(f"Personalizer ({args.engine} behaviour)", results["personalizer"])
+    print_result("RL (uniform behaviour, estimated propensities)", results["rl"])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
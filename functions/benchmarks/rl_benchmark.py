@@ -0,0 +1,191 @@
+"""
+RL Training Benchmark
+قياس سرعة وذاكرة وندم كل نوع وكيل على مستخدمين محاكين (rl_simulator)
+
+المسار نفس الإنتاج: normalize_state ثم select_action، والتغذية الراجعة عبر
+calculate_reward إلى ExperienceQueue ثم Learner.step كل micro_batch خطوة.
+
+يقيس:
+- خطوات/ثانية للوكيل وحده (اختيار الإجراء + التعلم) وللحلقة كاملة
+- ذروة الذاكرة (tracemalloc) وحجم النموذج
+- الندم: الفرق بين أفضل مكافأة متوقعة ومكافأة الإجراء المختار، والخطوة التي
+  يصل عندها متوسط الندم المتحرك إلى 10% من مستواه النهائي
+
+الندم يُقاس على المكافأة الفورية، فمعامل خصم كبير (الافتراضي 0.99) يبطئ
+التقارب لأن Q تهيمن عليها قيمة الحالة التالية؛ قارن مع --discount 0.
+
+التشغيل من مجلد functions:
+    python -m benchmarks.rl_benchmark --steps 50000 --agents tabular,linear
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from typing import Dict, List, Any
+
+import numpy as np
+
+from rl_agent import (
+    AGENT_TYPES, ExperienceQueue, Learner, calculate_reward, create_agent, normalize_state
+)
+from rl_simulator import UserSimulator
+
+
+# ============================================
+# Regret
+# ============================================
+
+def steps_to_converge(regret: np.ndarray, window: int, tolerance: float = 0.1) -> int:
+    """
+    أول خطوة يبقى بعدها متوسط الندم المتحرك ضمن tolerance من مستواه النهائي
+    (الندم لا يصل للصفر بسبب الاستكشاف وعدم معرفة الوكيل بالمستخدم)
+    """
+    if len(regret) < window * 2:
+        return len(regret)
+
+    moving = np.convolve(regret, np.ones(window) / window, mode="valid")
+    plateau = moving[-1]
+    above = np.flatnonzero(moving > plateau * (1 + tolerance) + 1e-9)
+    return int(above[-1] + window + 1) if above.size else window
+
+
+def evaluate_greedy(agent: Any, seed: int, users: int, contexts: int) -> Dict[str, float]:
+    """ندم السياسة الجشعة (بدون استكشاف) مقابل السياسة العشوائية على سياقات جديدة"""
+    simulator = UserSimulator(users, seed)
+    greedy = []
+    uniform = []
+    for _ in range(contexts):
+        user_index, raw_state = simulator.sample()
+        expected = simulator.expected_rewards(user_index)
+        action_index = agent.select_action(normalize_state(raw_state), explore=False)["actionIndex"]
+        greedy.append(expected.max() - expected[action_index])
+        uniform.append(expected.max() - expected.mean())
+        simulator.respond(user_index, action_index)
+
+    return {"greedyRegret": float(np.mean(greedy)), "randomRegret": float(np.mean(uniform))}
+
+
+# ============================================
+# Runner
+# ============================================
+
+def run_agent(
+    agent_type: str,
+    steps: int,
+    users: int = 200,
+    seed: int = 0,
+    micro_batch: int = 256,
+    window: int = 2000,
+    **agent_kwargs
+) -> Dict[str, Any]:
+    """
+    تشغيل وكيل على المحاكي وإرجاع مقاييس الأداء
+
+    Args:
+        agent_type: نوع الوكيل من AGENT_TYPES
+        steps: عدد التفاعلات
+        users: عدد المستخدمين المحاكين
+        seed: البذرة
+        micro_batch: عدد التجارب بين دورات المتعلم
+        window: نافذة متوسط الندم المتحرك
+        **agent_kwargs: معاملات الوكيل (مثل discount_factor)
+
+    Returns:
+        Dict: السرعة والذاكرة والندم
+    """
+    np.random.seed(seed)
+    simulator = UserSimulator(users, seed)
+
+    tracemalloc.start()
+    agent = create_agent(agent_type, **agent_kwargs)
+    queue = ExperienceQueue()
+    learner = Learner(agent, queue, micro_batch=micro_batch)
+
+    regret = np.zeros(steps)
+    agent_seconds = 0.0
+    started = time.perf_counter()
+
+    for step in range(steps):
+        user_index, raw_state = simulator.sample()
+
+        tick = time.perf_counter()
+        state = normalize_state(raw_state)
+        action_index = agent.select_action(state)["actionIndex"]
+        agent_seconds += time.perf_counter() - tick
+
+        expected = simulator.expected_rewards(user_index)
+        regret[step] = expected.max() - expected[action_index]
+        feedback, next_raw_state, done = simulator.respond(user_index, action_index)
+
+        tick = time.perf_counter()
+        queue.put(state, action_index, calculate_reward(feedback), normalize_state(next_raw_state), done)
+        if (step + 1) % micro_batch == 0:
+            learner.step()
+        agent_seconds += time.perf_counter() - tick
+
+    total_seconds = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    stats = agent.get_stats()
+    tail = regret[-window:]
+    return {
+        "agent": agent_type,
+        "steps": steps,
+        "agentStepsPerSec": steps / agent_seconds if agent_seconds else 0.0,
+        "loopStepsPerSec": steps / total_seconds if total_seconds else 0.0,
+        "peakMemoryMB": peak / 1024 / 1024,
+        "modelBytes": int(stats.get("modelBytes", stats.get("qTableBytes", 0))),
+        "cumulativeRegret": float(regret.sum()),
+        "finalRegret": float(tail.mean()),
+        "stepsToConverge": steps_to_converge(regret, window),
+        **evaluate_greedy(agent, seed + 1, users, contexts=min(5000, steps)),
+    }
+
+
+# ============================================
+# Main
+# ============================================
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="RL agent benchmark on simulated users")
+    parser.add_argument("--agents", default=",".join(AGENT_TYPES), help="أنواع الوكلاء مفصولة بفواصل")
+    parser.add_argument("--steps", type=int, default=50000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--window", type=int, default=2000)
+    parser.add_argument("--discount", type=float, default=None, help="معامل الخصم (الافتراضي من الوكيل)")
+    parser.add_argument("--json", action="store_true", help="طباعة النتائج كـ JSON")
+    args = parser.parse_args(argv)
+
+    agent_kwargs = {} if args.discount is None else {"discount_factor": args.discount}
+    results = [
+        run_agent(agent_type, args.steps, args.users, args.seed, window=args.window, **agent_kwargs)
+        for agent_type in args.agents.split(",")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+
+    print(f"{args.steps:,} steps, {args.users} simulated users, seed {args.seed}"
+          + ("" if args.discount is None else f", discount {args.discount}"))
+    header = (
+        f"{'agent':<10}{'agent st/s':>12}{'loop st/s':>11}{'peak MB':>9}{'model KB':>10}"
+        f"{'cum regret':>12}{'final':>8}{'converge':>10}{'greedy':>8}{'random':>8}"
+    )
+    print(header)
+    for row in results:
+        print(
+            f"{row['agent']:<10}{row['agentStepsPerSec']:>12,.0f}{row['loopStepsPerSec']:>11,.0f}"
+            f"{row['peakMemoryMB']:>9.1f}{row['modelBytes'] / 1024:>10.0f}"
+            f"{row['cumulativeRegret']:>12.0f}{row['finalRegret']:>8.3f}{row['stepsToConverge']:>10,}"
+            f"{row['greedyRegret']:>8.3f}{row['randomRegret']:>8.3f}"
+        )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
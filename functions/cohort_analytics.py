@@ -0,0 +1,236 @@
+"""
+Cohort Analytics Batch Job
+تحليلات جماعية دفعية على صادرات الأحداث المجزأة
+
+الاستخدام:
+    python cohort_analytics.py exports/ --workers 8 --output cohort.json
+
+كل سطر في ملفات NDJSON (أو صف في Parquet) حدث بالشكل:
+    {"userId": "...", "type": "task_completed", "timestamp": "...", "metadata": {...}}
+"""
+
+import argparse
+import glob
+import json
+import logging
+import os
+import sys
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Any, Iterator, Tuple
+
+from analytics import AnalyticsAccumulator, AnalyticsEngine, WEEKDAYS
+from sketches import KLLSketch
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# Shard Readers
+# ============================================
+
+SHARD_PATTERNS = ["*.ndjson", "*.jsonl", "*.parquet"]
+
+COMPLETION_RATE_BINS = 10
+
+
+def find_shards(paths: List[str]) -> List[str]:
+    """إيجاد ملفات الأجزاء من مسارات ملفات أو مجلدات"""
+    shards = []
+    for path in paths:
+        if os.path.isdir(path):
+            for pattern in SHARD_PATTERNS:
+                shards.extend(glob.glob(os.path.join(path, "**", pattern), recursive=True))
+        else:
+            shards.extend(glob.glob(path))
+    return sorted(set(shards))
+
+
+def read_shard(path: str) -> Iterator[Dict[str, Any]]:
+    """قراءة أحداث جزء واحد (NDJSON أو Parquet)"""
+    if path.endswith(".parquet"):
+        try:
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("pyarrow is required to read Parquet shards")
+
+        for batch in pq.ParquetFile(path).iter_batches():
+            yield from batch.to_pylist()
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+# ============================================
+# Map / Reduce
+# ============================================
+
+def map_shard(path: str) -> Tuple[Dict[str, AnalyticsAccumulator], int, int]:
+    """
+    مرحلة Map: تشغيل مسار التحليلات لكل مستخدم داخل جزء واحد
+
+    Returns:
+        Tuple: (مجمّع لكل مستخدم، عدد الأحداث، عدد الأحداث غير الصالحة)
+    """
+    partials: Dict[str, AnalyticsAccumulator] = defaultdict(AnalyticsAccumulator)
+    events = 0
+    errors = 0
+
+    for event in read_shard(path):
+        events += 1
+        user_id = event.get("userId")
+        if not user_id:
+            errors += 1
+            continue
+        try:
+            partials[user_id].add_event(event)
+        except Exception:
+            errors += 1
+
+    return dict(partials), events, errors
+
+
+def reduce_partials(
+    users: Dict[str, AnalyticsAccumulator],
+    partials: Dict[str, AnalyticsAccumulator]
+) -> None:
+    """مرحلة Reduce: دمج المجمّعات الجزئية لنفس المستخدم من أجزاء مختلفة"""
+    for user_id, partial in partials.items():
+        existing = users.get(user_id)
+        if existing is None:
+            users[user_id] = partial
+        else:
+            existing.merge(partial)
+
+
+def summarize_cohort(users: Dict[str, AnalyticsAccumulator]) -> Dict[str, Any]:
+    """
+    حساب الأرقام الجماعية من مجمّعات المستخدمين
+
+    Returns:
+        Dict: توزيع معدلات الإنجاز وخريطة ساعات الإنتاجية وملخص المدد
+    """
+    rate_histogram = [0] * COMPLETION_RATE_BINS
+    rate_sketch = KLLSketch()
+    heatmap = [[0] * 24 for _ in WEEKDAYS]
+    cohort = AnalyticsAccumulator()
+    active_users = 0
+
+    for accumulator in users.values():
+        created = accumulator.counts["task_created"]
+        if created > 0:
+            rate = min(accumulator.counts["task_completed"] / created, 1.0)
+            rate_histogram[min(int(rate * COMPLETION_RATE_BINS), COMPLETION_RATE_BINS - 1)] += 1
+            rate_sketch.update(rate)
+            active_users += 1
+
+        for weekday in range(len(WEEKDAYS)):
+            row = accumulator.completed_heatmap[weekday]
+            for hour in range(24):
+                heatmap[weekday][hour] += row[hour]
+
+        cohort.merge(accumulator)
+
+    p10, p50, p90 = rate_sketch.quantiles([0.1, 0.5, 0.9])
+    totals = cohort.to_analytics()
+
+    return {
+        "users": len(users),
+        "usersWithTasks": active_users,
+        "completionRate": {
+            "histogram": rate_histogram,
+            "p10": p10,
+            "p50": p50,
+            "p90": p90
+        },
+        "productiveHoursHeatmap": {WEEKDAYS[d]: heatmap[d] for d in range(len(WEEKDAYS))},
+        "productiveHours": AnalyticsEngine.find_productive_hours(totals["taskPatterns"]["completedByHour"]),
+        "totals": totals
+    }
+
+
+def run_batch(shards: List[str], workers: int) -> Dict[str, Any]:
+    """
+    تشغيل المهمة الدفعية على مجموعة من الأجزاء
+
+    Args:
+        shards: مسارات الأجزاء
+        workers: عدد العمليات المتوازية
+
+    Returns:
+        Dict: الملخص الجماعي مع إحصائيات الإنتاجية
+    """
+    started = time.perf_counter()
+    users: Dict[str, AnalyticsAccumulator] = {}
+    total_events = 0
+    total_errors = 0
+
+    if workers <= 1:
+        results = map(map_shard, shards)
+        for partials, events, errors in results:
+            reduce_partials(users, partials)
+            total_events += events
+            total_errors += errors
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for partials, events, errors in pool.map(map_shard, shards):
+                reduce_partials(users, partials)
+                total_events += events
+                total_errors += errors
+
+    summary = summarize_cohort(users)
+    elapsed = time.perf_counter() - started
+
+    summary["job"] = {
+        "shards": len(shards),
+        "workers": workers,
+        "events": total_events,
+        "invalidEvents": total_errors,
+        "seconds": round(elapsed, 3),
+        "eventsPerSecond": round(total_events / elapsed) if elapsed > 0 else 0
+    }
+    return summary
+
+
+# ============================================
+# Entry Point
+# ============================================
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(description="Fleet-wide cohort analytics over sharded event exports")
+    parser.add_argument("paths", nargs="+", help="Shard files, globs or directories")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--output", help="Write the JSON summary to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+
+    shards = find_shards(args.paths)
+    if not shards:
+        logger.error("No shards found")
+        return 1
+
+    summary = run_batch(shards, min(args.workers, len(shards)))
+    job = summary["job"]
+    logger.info(
+        f"Processed {job['events']} events from {job['shards']} shards "
+        f"with {job['workers']} workers in {job['seconds']}s ({job['eventsPerSecond']} events/sec)"
+    )
+
+    output = json.dumps(summary, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output)
+    else:
+        print(output)
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
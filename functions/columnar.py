@@ -0,0 +1,130 @@
+"""
+Columnar Wire Format
+صيغة عمودية مضغوطة لرفع أحداث السلوك
+
+الشكل:
+    {
+        "format": "columnar-v1",
+        "count": n,
+        "types": base64(uint8[n]),        # فهرس في VALID_EVENT_TYPES
+        "timestamps": base64(uint32[n]),  # ثواني منذ epoch (UTC)
+        "durations": base64(float32[n]),  # NaN عند عدم وجود مدة
+        "taskIds": base64(uint32[n])      # اختياري: fnv1a32(taskId) أو 0
+    }
+
+كل المصفوفات little-endian وتُفك مباشرة إلى مصفوفات NumPy
+بدون إنشاء كائن Python لكل حدث
+"""
+
+import base64
+import binascii
+from dataclasses import dataclass
+from typing import Dict, Any, Optional
+
+import numpy as np
+
+
+# ============================================
+# Format Definition
+# ============================================
+
+COLUMNAR_FORMAT = "columnar-v1"
+
+COLUMN_DTYPES = {
+    "types": np.dtype("<u1"),
+    "timestamps": np.dtype("<u4"),
+    "durations": np.dtype("<f4"),
+}
+
+OPTIONAL_COLUMN_DTYPES = {
+    "task_ids": ("taskIds", np.dtype("<u4")),
+}
+
+
+@dataclass
+class ColumnarEvents:
+    """أعمدة الأحداث بعد فك الترميز"""
+    types: np.ndarray
+    timestamps: np.ndarray
+    durations: np.ndarray
+    task_ids: Optional[np.ndarray] = None
+
+    def __len__(self) -> int:
+        return len(self.types)
+
+
+# ============================================
+# Encoding / Decoding
+# ============================================
+
+def decode_events(payload: Dict[str, Any], type_count: int) -> ColumnarEvents:
+    """
+    فك ترميز الأحداث العمودية
+
+    Args:
+        payload: الحمولة العمودية
+        type_count: عدد أنواع الأحداث الصالحة
+
+    Returns:
+        ColumnarEvents: الأعمدة كمصفوفات NumPy
+
+    Raises:
+        ValueError: عند عدم صلاحية الحمولة
+    """
+    if not isinstance(payload, dict) or payload.get("format") != COLUMNAR_FORMAT:
+        raise ValueError("Unsupported columnar format")
+
+    count = payload.get("count")
+    if not isinstance(count, int) or count < 0:
+        raise ValueError("Invalid event count")
+
+    columns = {}
+    for name, dtype in COLUMN_DTYPES.items():
+        columns[name] = _decode_column(payload.get(name, ""), name, dtype, count)
+
+    for attribute, (name, dtype) in OPTIONAL_COLUMN_DTYPES.items():
+        if payload.get(name):
+            columns[attribute] = _decode_column(payload[name], name, dtype, count)
+
+    if count and int(columns["types"].max()) >= type_count:
+        raise ValueError("Unknown event type code")
+
+    return ColumnarEvents(**columns)
+
+
+def _decode_column(encoded: str, name: str, dtype: np.dtype, count: int) -> np.ndarray:
+    """فك عمود واحد والتحقق من طوله"""
+    try:
+        raw = base64.b64decode(encoded, validate=True)
+    except (binascii.Error, TypeError) as e:
+        raise ValueError(f"Invalid base64 in column {name}: {e}")
+
+    if len(raw) != count * dtype.itemsize:
+        raise ValueError(f"Column {name} has wrong length")
+
+    return np.frombuffer(raw, dtype=dtype)
+
+
+def encode_events(events: ColumnarEvents) -> Dict[str, Any]:
+    """
+    ترميز أعمدة الأحداث (مفيد للتصدير والاختبار)
+
+    Args:
+        events: أعمدة الأحداث
+
+    Returns:
+        Dict: الحمولة العمودية
+    """
+    payload = {"format": COLUMNAR_FORMAT, "count": len(events)}
+
+    for name, dtype in COLUMN_DTYPES.items():
+        column = np.ascontiguousarray(getattr(events, name), dtype=dtype)
+        payload[name] = base64.b64encode(column.tobytes()).decode("ascii")
+
+    for attribute, (name, dtype) in OPTIONAL_COLUMN_DTYPES.items():
+        column = getattr(events, attribute)
+        if column is not None:
+            column = np.ascontiguousarray(column, dtype=dtype)
+            payload[name] = base64.b64encode(column.tobytes()).decode("ascii")
+
+    return payload
@@ -0,0 +1,96 @@
+"""
+Conditional Responses
+ردود مشروطة بالبصمة (digest) لتجنب إعادة الحساب وإرسال نفس النتيجة
+"""
+
+import hashlib
+import json
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Callable, Optional
+
+
+# ============================================
+# Digest
+# ============================================
+
+def canonical_digest(*parts: Any) -> str:
+    """
+    بصمة ثابتة لمدخلات الطلب
+
+    تُرمّز الأجزاء بـ JSON مرتب المفاتيح حتى تعطي المدخلات المتطابقة
+    نفس البصمة بغض النظر عن ترتيب المفاتيح
+    """
+    encoded = json.dumps(
+        parts,
+        sort_keys=True,
+        separators=(",", ":"),
+        ensure_ascii=False,
+        default=str
+    )
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()[:32]
+
+
+# ============================================
+# Response Memo
+# ============================================
+
+class ResponseMemo:
+    """ذاكرة صغيرة محدودة (LRU) تربط البصمة بالنتيجة"""
+
+    def __init__(self, capacity: int = 256):
+        self.capacity = capacity
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> Optional[Dict[str, Any]]:
+        result = self.entries.get(digest)
+        if result is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(digest)
+        self.hits += 1
+        return result
+
+    def put(self, digest: str, result: Dict[str, Any]) -> None:
+        self.entries[digest] = result
+        self.entries.move_to_end(digest)
+        while len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+
+
+def conditional_response(
+    memo: ResponseMemo,
+    digest: str,
+    if_none_match: Optional[str],
+    compute: Callable[[], Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    إرجاع "لم يتغير" أو نتيجة محفوظة أو نتيجة جديدة
+
+    Args:
+        memo: ذاكرة النتائج
+        digest: بصمة المدخلات الحالية
+        if_none_match: آخر بصمة لدى العميل (اختياري)
+        compute: دالة حساب النتيجة عند عدم وجودها
+
+    Returns:
+        Dict: الرد مع digest
+    """
+    timestamp = datetime.utcnow().isoformat()
+
+    if if_none_match and if_none_match == digest:
+        return {
+            "success": True,
+            "notModified": True,
+            "digest": digest,
+            "timestamp": timestamp
+        }
+
+    result = memo.get(digest)
+    if result is None:
+        result = compute()
+        memo.put(digest, result)
+
+    return {**result, "digest": digest, "timestamp": timestamp}
@@ -19,7 +19,7 @@ from tools import CALENDAR_TOOLS, get_system_prompt, build_context_prompt
 
 # تهيئة Firebase Admin
 try:
-initialize_app()
+    initialize_app()
 except ValueError:
     pass # Already initialized
 
@@ -243,10 +243,10 @@ def chat(req: https_fn.CallableRequest) -> dict:
 from analytics import trackBehavior, getAnalytics, getInsights
 
 # Personalizer
-from personalizer import getPersonalizedStrategy, sendReward, getAvailableStrategies
+from personalizer import getPersonalizedStrategy, getPersonalizedStrategies, sendReward, personalizerLearner, getAvailableStrategies
 
 # Recommendations
 from recommendations import getRecommendations, suggestSchedule
 
 # RL Agent
-from rl_agent import rlPredict, rlFeedback, rlTrain, rlStats, rlGetActions
+from rl_agent import rlPredict, rlPredictBatch, rlFeedback, rlTrain, rlStats, rlGetActions, rlLearner
@@ -3,15 +3,914 @@ Azure Personalizer Integration
 التعلم التكيفي باستخدام Contextual Bandit
 """
 
-from firebase_functions import https_fn, options
+from firebase_functions import https_fn, options, scheduler_fn
+from collections import OrderedDict
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Dict, List, Any, Optional
-import random
+from typing import Callable, Dict, List, Any, Optional, Tuple
 import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from snapshots import SnapshotManager, decode_snapshot, encode_snapshot, snapshot_store_from_env
 
 logger = logging.getLogger(__name__)
 
 
+# ============================================
+# Precompiled Scores
+# ============================================
+
+TIMES_OF_DAY = ["morning", "afternoon", "evening", "night"]
+PRODUCTIVITY_LEVELS = ["high", "medium", "low"]
+WEEKEND_DAYS = frozenset(["friday", "saturday"])
+DAYS_OF_WEEK = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+_DAY_IS_WEEKEND = {day: day in WEEKEND_DAYS for day in DAYS_OF_WEEK}
+
+# قيمة سياق خارج المفردات (لا تطابق أي ميزة)
+_OTHER = object()
+
+
+def _base_score(action: Dict[str, Any], context: Dict[str, Any]) -> float:
+    """
+    الجزء الحتمي من نقاط الإجراء في السياق (بدون ضجيج الاستكشاف وبدون قص)
+    """
+    score = 0.5  # النقطة الأساسية
+    features = action.get("features", {})
+    
+    # مطابقة الوقت
+    if features.get("bestTimeOfDay") == context.get("timeOfDay"):
+        score += 0.3
+    elif features.get("bestTimeOfDay") == "any":
+        score += 0.1
+    
+    # مطابقة الإنتاجية
+    required_productivity = features.get("requiredProductivity")
+    user_productivity = context.get("userProductivity")
+    
+    if required_productivity == user_productivity:
+        score += 0.2
+    elif user_productivity == "high" and required_productivity == "medium":
+        score += 0.1
+    elif required_productivity == "any":
+        score += 0.1
+    
+    # مطابقة نوع المهمة
+    if features.get("taskType") == context.get("taskType"):
+        score += 0.2
+    elif features.get("taskType") == "any":
+        score += 0.1
+    
+    # أنماط أيام الأسبوع
+    if context.get("weekend"):
+        if features.get("suitableForWeekend"):
+            score += 0.15
+        else:
+            score -= 0.1
+    
+    return score
+
+
+class StrategyScoreTable:
+    """
+    نقاط _base_score لكل السياقات مسبقاً في مصفوفة كثيفة
+    (فترة اليوم × عطلة × الإنتاجية × نوع المهمة × الإجراء)
+    
+    المفردات تشمل كل قيم ميزات الإجراءات، فأي قيمة سياق خارجها تأخذ خانة
+    "أخرى" بنفس نتيجة المقارنة في الحساب المباشر
+    """
+    
+    def __init__(self, actions: List[Dict[str, Any]]):
+        self.actions = actions
+        self.ids = [action["id"] for action in actions]
+        
+        def vocabulary(canonical: List[str], feature: str) -> List[Any]:
+            values = list(canonical)
+            for action in actions:
+                value = action.get("features", {}).get(feature)
+                if value not in values:
+                    values.append(value)
+            return values
+        
+        times = vocabulary(TIMES_OF_DAY, "bestTimeOfDay")
+        levels = vocabulary(PRODUCTIVITY_LEVELS, "requiredProductivity")
+        task_types = vocabulary([], "taskType")
+        self.time_index = {value: index for index, value in enumerate(times)}
+        self.level_index = {value: index for index, value in enumerate(levels)}
+        self.task_index = {value: index for index, value in enumerate(task_types)}
+        
+        self.scores = np.array([
+            [
+                [
+                    [
+                        [_base_score(action, {
+                            "timeOfDay": time_of_day,
+                            "weekend": weekend,
+                            "userProductivity": level,
+                            "taskType": task_type
+                        }) for action in actions]
+                        for task_type in task_types + [_OTHER]
+                    ]
+                    for level in levels + [_OTHER]
+                ]
+                for weekend in (False, True)
+            ]
+            for time_of_day in times + [_OTHER]
+        ], dtype=np.float64).reshape(len(times) + 1, 2, len(levels) + 1, len(task_types) + 1, len(actions))
+        # صفوف كقوائم Python: الوصول لستة أعداد أسرع من فهرسة numpy لكل طلب
+        self.rows = self.scores.tolist()
+    
+    def lookup(self, context: Dict[str, Any]) -> List[float]:
+        """النقاط الحتمية لكل إجراء في السياق"""
+        day = context.get("dayOfWeek", "")
+        weekend = _DAY_IS_WEEKEND.get(day)
+        if weekend is None:
+            weekend = isinstance(day, str) and day.lower() in WEEKEND_DAYS
+        
+        return self.rows[self.time_index.get(context.get("timeOfDay"), -1)][weekend][
+            self.level_index.get(context.get("userProductivity"), -1)
+        ][self.task_index.get(context.get("taskType"), -1)]
+
+
+# ============================================
+# LinUCB
+# ============================================
+
+class ContextEncoder:
+    """
+    ترميز one-hot للسياق: ثابت + فترة اليوم + يوم الأسبوع + الإنتاجية + نوع المهمة
+    (مفردات الجدول المترجم، ولكل مجموعة خانة "أخرى" للقيم غير المعروفة)
+    """
+    
+    def __init__(self, table: StrategyScoreTable):
+        self.groups = []
+        offset = 1
+        for key, index in (
+            ("timeOfDay", table.time_index),
+            ("dayOfWeek", {day: position for position, day in enumerate(DAYS_OF_WEEK)}),
+            ("userProductivity", table.level_index),
+            ("taskType", table.task_index),
+        ):
+            self.groups.append((key, index, offset))
+            offset += len(index) + 1
+        self.dimension = offset
+    
+    def encode(self, context: Dict[str, Any]) -> np.ndarray:
+        """متجه الخصائص (dimension,)"""
+        features = np.zeros(self.dimension)
+        features[0] = 1.0
+        for key, index, offset in self.groups:
+            value = context.get(key)
+            position = index.get(value)
+            if position is None and key == "dayOfWeek" and isinstance(value, str):
+                position = index.get(value.lower())
+            features[offset + (len(index) if position is None else position)] = 1.0
+        return features
+    
+    def contexts(self) -> List[Dict[str, Any]]:
+        """كل تركيبات المفردات (مع قيمة غير معروفة لكل مجموعة)"""
+        contexts = [{}]
+        for key, index, _ in self.groups:
+            contexts = [{**context, key: value} for context in contexts for value in list(index) + [_OTHER]]
+        return contexts
+
+
+class LinUCB:
+    """
+    LinUCB منفصل لكل إجراء: Q(x, a) = θa·x + alpha·sqrt(xᵀ Aa⁻¹ x)
+    
+    - التحديث Sherman–Morrison على Aa⁻¹ بكلفة O(d²) لكل مكافأة
+    - التقييم لكل الإجراءات بعملية مصفوفات واحدة (A⁻¹ @ x)
+    - البداية من معاملات prior (انحدار نقاط الاستدلال) بقوة prior_strength:
+      A = λI و b = λθ₀ فتكون θ = θ₀ قبل أي مكافأة
+    - المكافأة تعدّل صف ذراعها فقط في مكانه تحت القفل، والتقييم بدون قفل
+      يعيد الحساب إذا تغير عداد التسلسل أثناءه (seqlock: فردي أثناء الكتابة)
+    - التحميل والدمج يستبدلان المصفوفات كمرجع واحد
+    """
+    
+    def __init__(
+        self,
+        actions: List[Dict[str, Any]],
+        encoder: ContextEncoder,
+        alpha: float = 0.3,
+        prior_strength: float = 5.0,
+        prior_theta: Optional[np.ndarray] = None
+    ):
+        self.actions = actions
+        self.ids = [action["id"] for action in actions]
+        self.encoder = encoder
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.updates = 0
+        self._sequence = 0
+        
+        dimension = encoder.dimension
+        theta = np.zeros((len(actions), dimension)) if prior_theta is None else prior_theta.copy()
+        a_inverse = np.repeat(np.eye(dimension)[None] / prior_strength, len(actions), axis=0)
+        self._model = (a_inverse, prior_strength * theta, theta)
+        # A و b قبل أي مكافأة (أساس الدمج لنسخة لم تُزامن بعد)
+        self.prior = (np.repeat(np.eye(dimension)[None] * prior_strength, len(actions), axis=0), prior_strength * theta, 0)
+    
+    @classmethod
+    def from_heuristic(
+        cls,
+        table: StrategyScoreTable,
+        alpha: float = 0.3,
+        prior_strength: float = 5.0
+    ) -> "LinUCB":
+        """LinUCB يبدأ من نقاط _base_score (مطابقة تامة لأن الاستدلال جمعي في المجموعات)"""
+        encoder = ContextEncoder(table)
+        contexts = encoder.contexts()
+        features = np.array([encoder.encode(context) for context in contexts])
+        scores = np.array([table.lookup(context) for context in contexts])
+        prior_theta = np.linalg.lstsq(features, scores, rcond=None)[0].T
+        return cls(table.actions, encoder, alpha, prior_strength, prior_theta)
+    
+    def score(self, context: Dict[str, Any]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        تقييم كل الإجراءات
+        
+        Returns:
+            Tuple: (المكافأة المتوقعة، الحد الأعلى للثقة) لكل إجراء
+        """
+        features = self.encoder.encode(context)
+        while True:
+            sequence = self._sequence
+            a_inverse, _, theta = self._model
+            mean = theta @ features
+            width = np.sqrt(np.maximum((a_inverse @ features) @ features, 0.0))
+            if not sequence & 1 and sequence == self._sequence:
+                return mean, mean + self.alpha * width
+    
+    def score_many(self, contexts: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        تقييم كل الإجراءات لعدة سياقات (m سياق × n إجراء) بعمليتي مصفوفات
+        
+        Returns:
+            Tuple: (المكافأة المتوقعة، الحد الأعلى للثقة) بالشكل (m, n)
+        """
+        features = np.array([self.encoder.encode(context) for context in contexts])
+        while True:
+            sequence = self._sequence
+            a_inverse, _, theta = self._model
+            mean = features @ theta.T
+            # xᵀ Aa⁻¹ x لكل (سياق، إجراء): (n, m, d) ثم جمع على d
+            quadratic = ((features @ a_inverse) * features).sum(axis=2).T
+            if not sequence & 1 and sequence == self._sequence:
+                return mean, mean + self.alpha * np.sqrt(np.maximum(quadratic, 0.0))
+    
+    def update(self, context: Dict[str, Any], action_index: int, reward: float) -> None:
+        """تحديث ذراع واحدة بمكافأة (Sherman–Morrison) في مكانها، O(d²)"""
+        features = self.encoder.encode(context)
+        with self.lock:
+            a_inverse, b, theta = self._model
+            projected = a_inverse[action_index] @ features
+            arm_inverse = a_inverse[action_index] - np.outer(projected, projected) / (1.0 + features @ projected)
+            arm_b = b[action_index] + reward * features
+            arm_theta = arm_inverse @ arm_b
+            
+            self._sequence += 1
+            a_inverse[action_index] = arm_inverse
+            b[action_index] = arm_b
+            theta[action_index] = arm_theta
+            self._sequence += 1
+            self.updates += 1
+    
+    # --- الحالة للّقطات: A و b إحصاءات جمعية فتُدمج نسخ متعددة بجمع الفروق ---
+    
+    def state(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """نسخة من (A⁻¹، b، عدد التحديثات) لأن التحديث يعدّل المصفوفات في مكانها"""
+        with self.lock:
+            a_inverse, b, _ = self._model
+            return a_inverse.copy(), b.copy(), self.updates
+    
+    def sufficient_statistics(self) -> Tuple[np.ndarray, np.ndarray, int]:
+        """(A، b، عدد التحديثات)"""
+        a_inverse, b, updates = self.state()
+        return np.linalg.inv(a_inverse), b, updates
+    
+    def load(self, a_inverse: np.ndarray, b: np.ndarray, updates: int = 0) -> None:
+        """استبدال النموذج بحالة محفوظة"""
+        if a_inverse.shape != self._model[0].shape or b.shape != self._model[1].shape:
+            raise ValueError("LinUCB state was saved for a different feature layout")
+        with self.lock:
+            a_inverse = np.array(a_inverse, dtype=np.float64)
+            b = np.array(b, dtype=np.float64)
+            self._model = (a_inverse, b, np.einsum("aij,aj->ai", a_inverse, b))
+            self.updates = updates
+    
+    def merge(
+        self,
+        gram: np.ndarray,
+        b: np.ndarray,
+        updates: int = 0,
+        baseline: Optional[Tuple[np.ndarray, np.ndarray, int]] = None
+    ) -> None:
+        """
+        دمج حالة منشورة: المنشور + (المحلي - الأساس)
+        
+        Args:
+            gram: A المنشورة
+            b: b المنشورة
+            updates: عدد التحديثات المنشورة
+            baseline: sufficient_statistics المحلية عند آخر مزامنة (الـ prior إن لم تُزامن)
+        """
+        base_gram, base_b, base_updates = self.prior if baseline is None else baseline
+        with self.lock:
+            local_gram = np.linalg.inv(self._model[0])
+            merged_gram = gram + local_gram - base_gram
+            merged_b = b + self._model[1] - base_b
+            a_inverse = np.linalg.inv(merged_gram)
+            self._model = (a_inverse, merged_b, np.einsum("aij,aj->ai", a_inverse, merged_b))
+            self.updates = updates + self.updates - base_updates
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {"dimension": self.encoder.dimension, "alpha": self.alpha, "updates": self.updates}
+
+
+# ============================================
+# Rank / Reward Join
+# ============================================
+
+@dataclass(slots=True)
+class RankEvent:
+    """قرار rank بانتظار مكافأته"""
+    event_id: str
+    context: Dict[str, Any]
+    action_index: int
+    action_id: str
+    probabilities: Tuple[float, ...]    # احتمال اختيار كل إجراء (propensity) بترتيب قائمة الإجراءات
+    created: float
+    reward: float = 0.0
+    rewarded: bool = False
+    
+    @property
+    def probability(self) -> float:
+        """احتمال الإجراء المختار (propensity)"""
+        return self.probabilities[self.action_index]
+
+
+class RewardJoinBuffer:
+    """
+    ربط قرارات rank بمكافآت sendReward بذاكرة ثابتة
+    
+    OrderedDict بترتيب الإنشاء: الإضافة والربط O(1)، والأقدم دائماً في المقدمة
+    فالإخلاء (انتهاء مهلة الانتظار أو تجاوز السعة) يقرأ من المقدمة فقط.
+    المكافآت خلال مهلة الانتظار تُجمع، وعند الإخلاء يُسلَّم الحدث المكتمل
+    للمتعلمين. الحدث الذي لم تصله مكافأة يأخذ المكافأة الافتراضية، ولا يُسلَّم
+    إلا مع learn_unrewarded: بدون ربط مشترك تصل المكافأة غالباً لنسخة أخرى،
+    فغيابها هنا لا يعني أن المستخدم لم يكافئ
+    """
+    
+    def __init__(
+        self,
+        capacity: int = 10000,
+        reward_wait_sec: float = 600,
+        default_reward: float = 0.0,
+        learn_unrewarded: bool = False
+    ):
+        self.capacity = capacity
+        self.reward_wait_sec = reward_wait_sec
+        self.default_reward = default_reward
+        self.learn_unrewarded = learn_unrewarded
+        self.events: "OrderedDict[str, RankEvent]" = OrderedDict()
+        self.learners: List[Callable[[RankEvent], None]] = []
+        self.lock = threading.Lock()
+        
+        self.joined = 0
+        self.unmatched = 0
+        self.completed = 0
+        self.defaulted = 0
+        self.evicted_early = 0
+    
+    def __len__(self) -> int:
+        return len(self.events)
+    
+    def add_learner(self, learner: Callable[[RankEvent], None]) -> None:
+        """تسجيل دالة تستقبل كل حدث مكتمل"""
+        self.learners.append(learner)
+    
+    def record(self, event: RankEvent) -> None:
+        """إضافة قرار جديد وإخلاء المنتهي والزائد عن السعة"""
+        self.record_many([event])
+    
+    def record_many(self, events: List[RankEvent]) -> None:
+        """إضافة قرارات (بنفس وقت الإنشاء أو بترتيب زمني) بقفل واحد"""
+        if not events:
+            return
+        with self.lock:
+            for event in events:
+                # معرف مكرر يُنقل للنهاية حتى يبقى الترتيب زمنياً
+                self.events.pop(event.event_id, None)
+                self.events[event.event_id] = event
+            done = self._expire(events[-1].created)
+            while len(self.events) > self.capacity:
+                done.append(self.events.popitem(last=False)[1])
+                self.evicted_early += 1
+        self._complete(done)
+    
+    def restore(self, events: List[RankEvent]) -> None:
+        """
+        إعادة أحداث منتظرة (من لقطة أو طابور القرارات) بأي ترتيب زمني
+        
+        المنتهي منها لا يُسلَّم حتى أول record أو flush، فتُربط مكافآته أولاً.
+        الزائد عن السعة يُسلَّم حالاً (الأقدم أولاً) كما في record_many
+        """
+        with self.lock:
+            merged = {event.event_id: event for event in events}
+            merged.update(self.events)
+            self.events = OrderedDict(
+                (event.event_id, event) for event in sorted(merged.values(), key=lambda event: event.created)
+            )
+            done = []
+            while len(self.events) > self.capacity:
+                done.append(self.events.popitem(last=False)[1])
+                self.evicted_early += 1
+        self._complete(done)
+    
+    def join(self, event_id: str, reward: float, now: Optional[float] = None) -> bool:
+        """
+        ربط مكافأة بحدث
+        
+        Returns:
+            bool: False إذا كان الحدث غير معروف أو انتهت مهلته
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            event = self.events.get(event_id)
+            if event is None or now - event.created > self.reward_wait_sec:
+                self.unmatched += 1
+                return False
+            event.reward += reward
+            event.rewarded = True
+            self.joined += 1
+            return True
+    
+    def flush(self, now: Optional[float] = None, force: bool = False) -> int:
+        """
+        تسليم الأحداث المنتهية (أو كل الأحداث مع force)
+        
+        Returns:
+            int: عدد الأحداث المسلّمة
+        """
+        with self.lock:
+            if force:
+                done = list(self.events.values())
+                self.events.clear()
+            else:
+                done = self._expire(time.time() if now is None else now)
+        self._complete(done)
+        return len(done)
+    
+    def _expire(self, now: float) -> List[RankEvent]:
+        done = []
+        deadline = now - self.reward_wait_sec
+        while self.events:
+            event = next(iter(self.events.values()))
+            if event.created > deadline:
+                break
+            done.append(self.events.popitem(last=False)[1])
+        return done
+    
+    def _complete(self, events: List[RankEvent]) -> None:
+        # المتعلمون خارج القفل حتى لا يتأخر rank و sendReward
+        for event in events:
+            self.completed += 1
+            if not event.rewarded:
+                event.reward = self.default_reward
+                self.defaulted += 1
+                if not self.learn_unrewarded:
+                    continue
+            for learner in self.learners:
+                try:
+                    learner(event)
+                except Exception as e:
+                    logger.error(f"Personalizer learner error: {e}")
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "pending": len(self.events),
+            "capacity": self.capacity,
+            "rewardWaitSec": self.reward_wait_sec,
+            "joined": self.joined,
+            "unmatched": self.unmatched,
+            "completed": self.completed,
+            "defaulted": self.defaulted,
+            "evictedEarly": self.evicted_early
+        }
+
+
+# ============================================
+# Decision Log
+# ============================================
+
+# مفاتيح السياق المحفوظة في سجل القرارات (ما يستخدمه الجدول و LinUCB)
+LOGGED_CONTEXT_KEYS = ("timeOfDay", "dayOfWeek", "userProductivity", "taskType")
+DECISION_LOG_KIND = "personalizerDecisions"
+STATE_SNAPSHOT_KIND = "personalizerState"
+
+
+def event_columns(events: List[RankEvent], action_ids: List[str]) -> Tuple[Dict[str, np.ndarray], Dict[str, List[Any]]]:
+    """
+    أحداث rank كأعمدة numpy (لسجل القرارات ولقطات الحالة)
+    
+    قيم السياق رموز uint16 في مفردات تُحفظ في البيانات الوصفية، فيُعاد بناء
+    خصائص الشريحة كاملة بالفهرسة بدون المرور على الأحداث واحداً واحداً
+    
+    Args:
+        events: أحداث بنفس قائمة الإجراءات
+        action_ids: معرفات الإجراءات بترتيب الاحتمالات
+    
+    Returns:
+        Tuple: (الأعمدة، مفردات كل مفتاح سياق)
+    """
+    vocabularies: Dict[str, Dict[Any, int]] = {key: {} for key in LOGGED_CONTEXT_KEYS}
+    arrays = {f"context_{key}": np.zeros(len(events), dtype=np.uint16) for key in LOGGED_CONTEXT_KEYS}
+    for row, event in enumerate(events):
+        for key in LOGGED_CONTEXT_KEYS:
+            value = event.context.get(key)
+            if value is not None and not isinstance(value, str):
+                value = str(value)
+            codes = vocabularies[key]
+            arrays[f"context_{key}"][row] = codes.setdefault(value, len(codes))
+    
+    arrays["action"] = np.array([event.action_index for event in events], dtype=np.int16)
+    arrays["probabilities"] = np.array([event.probabilities for event in events], dtype=np.float32).reshape(
+        len(events), len(action_ids)
+    )
+    arrays["reward"] = np.array([event.reward for event in events], dtype=np.float32)
+    arrays["rewarded"] = np.array([event.rewarded for event in events], dtype=np.bool_)
+    arrays["created"] = np.array([event.created for event in events], dtype=np.float64)
+    return arrays, {key: list(codes) for key, codes in vocabularies.items()}
+
+
+def events_from_columns(
+    arrays: Dict[str, np.ndarray],
+    vocabularies: Dict[str, List[Any]],
+    action_ids: List[str],
+    event_ids: List[str]
+) -> List[RankEvent]:
+    """عكس event_columns (السياق يشمل مفاتيح LOGGED_CONTEXT_KEYS فقط)"""
+    codes = {key: arrays[f"context_{key}"].tolist() for key in LOGGED_CONTEXT_KEYS}
+    events = []
+    for row, (action_index, probabilities, reward, rewarded, created) in enumerate(zip(
+        arrays["action"].tolist(),
+        arrays["probabilities"].tolist(),
+        arrays["reward"].tolist(),
+        arrays["rewarded"].tolist(),
+        arrays["created"].tolist()
+    )):
+        context = {}
+        for key in LOGGED_CONTEXT_KEYS:
+            value = vocabularies[key][codes[key][row]]
+            if value is not None:
+                context[key] = value
+        events.append(RankEvent(
+            event_id=event_ids[row],
+            context=context,
+            action_index=action_index,
+            action_id=action_ids[action_index],
+            probabilities=tuple(probabilities),
+            created=created,
+            reward=reward,
+            rewarded=rewarded
+        ))
+    return events
+
+
+def encode_decisions(events: List[RankEvent], action_ids: List[str]) -> bytes:
+    """
+    ترميز أحداث مكتملة كشريحة بصيغة اللقطات الثنائية (أعمدة بدل JSON لكل حدث)
+    
+    Args:
+        events: أحداث مكتملة (قرار + مكافأة) بنفس قائمة الإجراءات
+        action_ids: معرفات الإجراءات بترتيب الاحتمالات
+    
+    Returns:
+        bytes: محتوى الشريحة
+    """
+    arrays, vocabularies = event_columns(events, action_ids)
+    meta = {
+        "kind": DECISION_LOG_KIND,
+        "actions": list(action_ids),
+        "vocabularies": vocabularies,
+        "savedAt": datetime.utcnow().isoformat()
+    }
+    return encode_snapshot(arrays, meta)
+
+
+def decode_decisions(buffer: Any) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    قراءة شريحة سجل قرارات
+    
+    Raises:
+        ValueError: إذا لم تكن الشريحة سجل قرارات
+    """
+    arrays, meta = decode_snapshot(buffer)
+    if meta.get("kind") != DECISION_LOG_KIND:
+        raise ValueError("Not a personalizer decision log")
+    return arrays, meta
+
+
+class DecisionLog:
+    """
+    سجل القرارات المكتملة (السياق، الإجراء، الاحتمالات، المكافأة) للتقييم خارج السياسة
+    
+    متعلم على مخزن الربط: الأحداث تُجمع في الذاكرة وتُرسل كدفعات إلى طابور
+    المخزن (push_batch) في خيط خلفي، فلا يضيف rank أو sendReward زمن كتابة.
+    كل دفعة شريحة مستقلة يقرأها policy_eval.
+    """
+    
+    def __init__(
+        self,
+        store: Any,
+        name: str = "personalizer-decisions",
+        batch_size: int = 1000,
+        flush_interval_sec: float = 300,
+        max_buffered: int = 50000
+    ):
+        self.store = store
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval_sec = flush_interval_sec
+        self.max_buffered = max_buffered
+        self.lock = threading.Lock()
+        self.action_ids: List[str] = []
+        self.events: List[RankEvent] = []
+        self.started = time.time()
+        
+        self.written = 0
+        self.shards = 0
+        self.dropped = 0
+        self.failed = 0
+    
+    def set_actions(self, action_ids: List[str]) -> None:
+        """قائمة الإجراءات الحالية؛ الأحداث المجمعة بالقائمة السابقة تُكتب أولاً"""
+        with self.lock:
+            batch, previous = self._take()
+            self.action_ids = list(action_ids)
+        if batch:
+            self._write(batch, previous)
+    
+    def append(self, event: RankEvent) -> None:
+        """استقبال حدث مكتمل (يُسجَّل كمتعلم في RewardJoinBuffer)"""
+        with self.lock:
+            ids = self.action_ids
+            # أحداث من قبل تعديل الاستراتيجيات لا تطابق أعمدة الشريحة
+            if len(event.probabilities) != len(ids) or ids[event.action_index] != event.action_id:
+                self.dropped += 1
+                return
+            if len(self.events) >= self.max_buffered:
+                # المخزن متعطل: الاحتفاظ بالأحدث بدل نمو الذاكرة
+                self.events.pop(0)
+                self.dropped += 1
+            self.events.append(event)
+            due = (
+                len(self.events) >= self.batch_size
+                or time.time() - self.started >= self.flush_interval_sec
+            )
+            if not due:
+                return
+            batch, ids = self._take()
+        threading.Thread(target=self._write, args=(batch, ids), daemon=True).start()
+    
+    def flush(self) -> int:
+        """كتابة المجمّع حالاً في الخيط الحالي (للإيقاف والاختبارات)"""
+        with self.lock:
+            batch, ids = self._take()
+        return self._write(batch, ids) if batch else 0
+    
+    def _take(self) -> Tuple[List[RankEvent], List[str]]:
+        batch, self.events = self.events, []
+        self.started = time.time()
+        return batch, self.action_ids
+    
+    def _write(self, batch: List[RankEvent], action_ids: List[str]) -> int:
+        try:
+            self.store.push_batch(self.name, encode_decisions(batch, action_ids))
+        except Exception as e:
+            logger.error(f"Personalizer decision log error: {e}")
+            with self.lock:
+                self.failed += len(batch)
+            return 0
+        with self.lock:
+            self.written += len(batch)
+            self.shards += 1
+        return len(batch)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self.events),
+            "written": self.written,
+            "shards": self.shards,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
+# ============================================
+# Shared Rank / Reward Queues
+# ============================================
+
+# getPersonalizedStrategy و sendReward نسختان مختلفتان، فالربط يتم في المتعلم
+# المجدول (personalizerLearner) على طابوري المخزن المشترك
+RANK_EVENTS_KIND = "personalizerRanks"
+REWARDS_KIND = "personalizerRewards"
+# أقصى تأخير متوقع بين القرار (أو المكافأة) ووصوله للطابور: فترة الإرسال الخلفي
+# مع إعادة المحاولة. المتعلم لا يُخلي حدثاً قبل مرور هذه المهلة بعد مهلة الانتظار
+SHIP_INTERVAL_SEC = 5.0
+JOIN_GRACE_SEC = 30.0
+# جولة المتعلم (كل دقيقة) أقصر من الفترة، وعقد الإيجار يغطي مهلة الدالة كاملة
+# فلا تعمل جولتان معاً حتى لو تأخرت إحداهما
+LEARNER_BUDGET_SEC = 40.0
+LEARNER_LEASE_SEC = 120.0
+
+
+def encode_rank_events(events: List[RankEvent], action_ids: List[str]) -> bytes:
+    """
+    ترميز قرارات rank (بمعرفاتها) كدفعة لطابور القرارات
+    
+    Args:
+        events: قرارات بنفس قائمة الإجراءات
+        action_ids: معرفات الإجراءات بترتيب الاحتمالات
+    
+    Returns:
+        bytes: محتوى الدفعة
+    """
+    arrays, vocabularies = event_columns(events, action_ids)
+    arrays["event_id"] = np.array([event.event_id.encode("utf-8") for event in events], dtype=np.bytes_)
+    meta = {
+        "kind": RANK_EVENTS_KIND,
+        "actions": list(action_ids),
+        "vocabularies": vocabularies
+    }
+    return encode_snapshot(arrays, meta)
+
+
+def decode_rank_events(buffer: Any, action_ids: List[str]) -> List[RankEvent]:
+    """
+    عكس encode_rank_events
+    
+    Raises:
+        ValueError: إذا لم تكن الدفعة قرارات rank أو كُتبت لقائمة إجراءات أخرى
+    """
+    arrays, meta = decode_snapshot(buffer)
+    if meta.get("kind") != RANK_EVENTS_KIND:
+        raise ValueError("Not a personalizer rank batch")
+    if meta.get("actions") != action_ids:
+        raise ValueError("Rank batch was written for a different strategy list")
+    event_ids = [event_id.decode("utf-8") for event_id in arrays.pop("event_id").tolist()]
+    return events_from_columns(arrays, meta["vocabularies"], action_ids, event_ids)
+
+
+def encode_rewards(rewards: List[Tuple[str, float, float]]) -> bytes:
+    """
+    ترميز مكافآت sendReward كدفعة لطابور المكافآت
+    
+    Args:
+        rewards: (معرف الحدث، المكافأة، وقت الإرسال)
+    
+    Returns:
+        bytes: محتوى الدفعة (مع وقت الدفع للطابور)
+    """
+    arrays = {
+        "event_id": np.array([event_id.encode("utf-8") for event_id, _, _ in rewards], dtype=np.bytes_),
+        "reward": np.array([reward for _, reward, _ in rewards], dtype=np.float64),
+        "sent": np.array([sent for _, _, sent in rewards], dtype=np.float64)
+    }
+    return encode_snapshot(arrays, {"kind": REWARDS_KIND, "shipped": time.time()})
+
+
+def decode_rewards(buffer: Any) -> Tuple[List[Tuple[str, float, float]], float]:
+    """
+    عكس encode_rewards
+    
+    Returns:
+        Tuple: (المكافآت، وقت دفع الدفعة للطابور)
+    
+    Raises:
+        ValueError: إذا لم تكن الدفعة مكافآت
+    """
+    arrays, meta = decode_snapshot(buffer)
+    if meta.get("kind") != REWARDS_KIND:
+        raise ValueError("Not a personalizer reward batch")
+    rewards = [
+        (event_id.decode("utf-8"), reward, sent)
+        for event_id, reward, sent in zip(
+            arrays["event_id"].tolist(), arrays["reward"].tolist(), arrays["sent"].tolist()
+        )
+    ]
+    return rewards, meta.get("shipped", 0.0)
+
+
+class QueueShipper:
+    """
+    إرسال عناصر لطابور المخزن المشترك كدفعات من خيط خلفي
+    
+    rank و sendReward يضيفان للذاكرة فقط (بدون كتابة في الطلب)، والخيط يرسل كل
+    interval_sec أو عند اكتمال batch_size، فيكتب المتعلم ويقرأ عدداً قليلاً من
+    الكائنات بدل كائن لكل طلب. العناصر بنفس المفتاح (قائمة الإجراءات) تُرمّز
+    معاً. نافذة الفقد: ما لم يُرسل بعد (حتى interval_sec، أو أكثر إذا خنقت
+    Cloud Functions المعالج بعد الرد) يضيع إذا أُغلقت النسخة، والإرسال الفاشل
+    يُعاد للمقدمة. عند تجاوز max_buffered يُحذف الأقدم
+    """
+    
+    def __init__(
+        self,
+        store: Any,
+        name: str,
+        encode: Callable[[List[Any], Any], bytes],
+        batch_size: int = 500,
+        interval_sec: float = SHIP_INTERVAL_SEC,
+        max_buffered: int = 50000
+    ):
+        self.store = store
+        self.name = name
+        self.encode = encode
+        self.batch_size = batch_size
+        self.interval_sec = interval_sec
+        self.max_buffered = max_buffered
+        self.lock = threading.Lock()
+        self.items: List[Tuple[Any, Any]] = []
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        
+        self.shipped = 0
+        self.batches = 0
+        self.dropped = 0
+        self.failed = 0
+    
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    def put_many(self, items: List[Any], key: Any = None) -> None:
+        """إضافة عناصر بنفس المفتاح (داخل الطلب: ذاكرة فقط)"""
+        with self.lock:
+            self.items.extend((key, item) for item in items)
+            overflow = len(self.items) - self.max_buffered
+            if overflow > 0:
+                # المخزن متعطل: الاحتفاظ بالأحدث بدل نمو الذاكرة
+                del self.items[:overflow]
+                self.dropped += overflow
+            due = len(self.items) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+        if due:
+            self._wake.set()
+    
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.interval_sec)
+            self._wake.clear()
+            self.flush()
+    
+    def flush(self) -> int:
+        """
+        إرسال كل ما في الذاكرة الآن (الخيط الخلفي، وعند الإيقاف والاختبارات)
+        
+        Returns:
+            int: عدد العناصر المرسلة
+        """
+        with self.lock:
+            items, self.items = self.items, []
+        
+        position = 0
+        batches = 0
+        try:
+            while position < len(items):
+                key = items[position][0]
+                end = position
+                while end < len(items) and end - position < self.batch_size and items[end][0] == key:
+                    end += 1
+                self.store.push_batch(self.name, self.encode([item for _, item in items[position:end]], key))
+                batches += 1
+                position = end
+        except Exception as e:
+            logger.error(f"Personalizer queue {self.name} shipping error: {e}")
+            with self.lock:
+                self.items[:0] = items[position:]
+                self.failed += 1
+        
+        with self.lock:
+            self.shipped += position
+            self.batches += batches
+        return position
+    
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self.items),
+            "shipped": self.shipped,
+            "batches": self.batches,
+            "dropped": self.dropped,
+            "failed": self.failed
+        }
+
+
 # ============================================
 # Personalizer Client (Local Implementation)
 # For production, use Azure Personalizer API
@@ -23,9 +922,67 @@ class PersonalizerClient:
     يمكن استبداله بـ Azure Personalizer API في الإنتاج
     """
     
-    def __init__(self, epsilon: float = 0.2):
-        self.learning_data: Dict[str, float] = {}
+    def __init__(
+        self,
+        epsilon: float = 0.2,
+        max_pending: int = 10000,
+        reward_wait_sec: float = 600,
+        default_reward: float = 0.0,
+        engine: str = "heuristic",
+        alpha: float = 0.3,
+        prior_strength: float = 5.0,
+        decision_log: Optional[DecisionLog] = None
+    ):
+        if engine not in ("linucb", "heuristic"):
+            raise ValueError(f"Unknown personalizer engine: {engine}")
+        
         self.epsilon = epsilon  # معدل الاستكشاف
+        self.engine = engine
+        self.alpha = alpha
+        self.prior_strength = prior_strength
+        self.rng = np.random.default_rng()
+        self.table: Optional[StrategyScoreTable] = None
+        self.bandit: Optional[LinUCB] = None
+        
+        # القرارات بانتظار مكافآتها (ذاكرة ثابتة بدل قاموس لا يُخلى)
+        self.pending = RewardJoinBuffer(max_pending, reward_wait_sec, default_reward)
+        self.pending.add_learner(self._learn)
+        # سجل القرارات المكتملة للتقييم خارج السياسة (policy_eval)
+        self.decision_log = decision_log
+        if decision_log is not None:
+            self.pending.add_learner(decision_log.append)
+        # مجموع وعدد المكافآت لكل إجراء من الأحداث المكتملة
+        self.lock = threading.Lock()
+        self.action_rewards: Dict[str, List[float]] = {}
+        # لقطات الحالة (enable_snapshots)؛ بدونها لا يوجد ما يُحمّل
+        self.snapshots: Optional[SnapshotManager] = None
+        self._snapshot_loaded = True
+        self._snapshot_lock = threading.Lock()
+        # طابورا القرارات والمكافآت المشتركان (enable_shared_join)
+        self.join_store: Optional[Any] = None
+        self.join_name = "personalizer"
+        self.rank_shipper: Optional[QueueShipper] = None
+        self.reward_shipper: Optional[QueueShipper] = None
+        self.join_grace_sec = JOIN_GRACE_SEC
+    
+    def compile(self, actions: List[Dict[str, Any]]) -> StrategyScoreTable:
+        """
+        بناء جدول النقاط (ونموذج LinUCB من الاستدلال) للإجراءات
+        يُستدعى عند تحميل الوحدة أو تعديل الاستراتيجيات، ويبدأ التعلم من جديد
+        
+        Args:
+            actions: قائمة الإجراءات
+        
+        Returns:
+            StrategyScoreTable: الجدول المستخدم في rank
+        """
+        table = StrategyScoreTable(actions)
+        if self.engine == "linucb":
+            self.bandit = LinUCB.from_heuristic(table, self.alpha, self.prior_strength)
+        if self.decision_log is not None:
+            self.decision_log.set_actions(table.ids)
+        self.table = table
+        return table
     
     def rank(
         self,
@@ -42,105 +999,627 @@ class PersonalizerClient:
         Returns:
             Dict: الإجراء المختار والترتيب
         """
-        # حساب النقاط لكل إجراء
-        scored_actions = []
-        for action in actions:
-            score = self._calculate_score(action, context_features)
-            scored_actions.append({"action": action, "score": score})
+        table = self._compiled(actions)
+        self._sync_snapshot()
+        
+        # سحب واحد لكل العشوائية: ضجيج لكل إجراء، ثم قرار الاستكشاف، ثم الإجراء العشوائي
+        count = len(actions)
+        draw = self.rng.random(count + 2).tolist()
         
-        # ترتيب تنازلي
-        scored_actions.sort(key=lambda x: x["score"], reverse=True)
+        if self.engine == "linucb":
+            order, probabilities = self._linucb_policy(context_features, draw)
+        else:
+            order, probabilities = self._heuristic_policy(table, context_features, draw)
         
         # Epsilon-greedy exploration
-        if random.random() < self.epsilon:
+        if draw[count] < self.epsilon:
             # استكشاف: اختيار عشوائي
-            selected_action = random.choice(actions)
+            selected_index = int(draw[count + 1] * count)
         else:
             # استغلال: أفضل إجراء
-            selected_action = scored_actions[0]["action"]
+            selected_index = order[0]
         
-        # حساب الاحتمالات
-        total_score = sum(max(sa["score"], 0.01) for sa in scored_actions)
-        ranking = [
-            {
-                "id": sa["action"]["id"],
-                "probability": max(sa["score"], 0.01) / total_score
-            }
-            for sa in scored_actions
-        ]
+        event, response = self._decision(
+            table, self._event_id(), time.time(), context_features, order, probabilities, selected_index
+        )
+        self._record(table, [event])
+        return response
+    
+    def rank_many(
+        self,
+        contexts: List[Dict[str, Any]],
+        actions: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        نسخة rank لعدة سياقات بعمليات مصفوفات واحدة (مثل مهام يوم كامل)
         
-        event_id = f"event_{int(datetime.utcnow().timestamp() * 1000)}_{random.randint(1000, 9999)}"
+        Args:
+            contexts: ميزات السياق لكل عنصر
+            actions: قائمة الإجراءات المتاحة
         
-        return {
-            "rewardActionId": selected_action["id"],
-            "ranking": ranking,
+        Returns:
+            List[Dict]: لكل سياق الإجراء المختار والترتيب ومعرف الحدث
+        """
+        if not contexts:
+            return []
+        
+        table = self._compiled(actions)
+        self._sync_snapshot()
+        count = len(actions)
+        draw = self.rng.random((len(contexts), count + 2))
+        
+        if self.engine == "linucb":
+            orders, probabilities = self._linucb_policy_many(contexts, draw)
+        else:
+            orders, probabilities = self._heuristic_policy_many(table, contexts, draw)
+        
+        selected = np.where(
+            draw[:, count] < self.epsilon,
+            (draw[:, count + 1] * count).astype(np.int64),
+            orders[:, 0]
+        )
+        
+        # معرف واحد للطلب ولاحقة لكل عنصر حتى لا تتصادم معرفات الدفعة
+        base_id = self._event_id()
+        created = time.time()
+        events = []
+        responses = []
+        for position, (context, order, row, selected_index) in enumerate(
+            zip(contexts, orders.tolist(), probabilities.tolist(), selected.tolist())
+        ):
+            event, response = self._decision(
+                table, f"{base_id}_{position}", created, context, order, row, selected_index
+            )
+            events.append(event)
+            responses.append(response)
+        
+        self._record(table, events)
+        return responses
+    
+    def _record(self, table: StrategyScoreTable, events: List[RankEvent]) -> None:
+        """القرارات تنتظر مكافآتها محلياً، أو في طابور القرارات مع الربط المشترك"""
+        if self.rank_shipper is None:
+            self.pending.record_many(events)
+            return
+        # ذاكرة فقط؛ الإرسال من الخيط الخلفي (المفتاح: قائمة الإجراءات للترميز)
+        self.rank_shipper.put_many(events, key=tuple(table.ids))
+    
+    def _compiled(self, actions: List[Dict[str, Any]]) -> StrategyScoreTable:
+        # قائمة إجراءات مختلفة عن المترجمة تعني أن الاستراتيجيات تغيرت
+        table = self.table
+        if table is None or table.actions is not actions:
+            table = self.compile(actions)
+        return table
+    
+    @staticmethod
+    def _event_id() -> str:
+        # عشوائية كافية حتى لا تتصادم قرارات نفس الميلي ثانية بين النسخ (الطابور مشترك)
+        return f"event_{int(datetime.utcnow().timestamp() * 1000)}_{uuid.uuid4().hex[:12]}"
+    
+    def _decision(
+        self,
+        table: StrategyScoreTable,
+        event_id: str,
+        created: float,
+        context: Dict[str, Any],
+        order: List[int],
+        probabilities: List[float],
+        selected_index: int
+    ) -> Tuple[RankEvent, Dict[str, Any]]:
+        """
+        الحدث المنتظر لمكافأته واستجابة rank لقرار واحد
+        
+        الاستجابة تعرض احتمالات المحرك (نقاط مطبّعة في heuristic)، والحدث يحمل
+        احتمال الاختيار الفعلي لـ epsilon-greedy: الأول في الترتيب 1 - ε + ε/K
+        وكل إجراء آخر ε/K (propensity صحيح لـ policy_eval للمحركين)
+        """
+        count = len(order)
+        propensities = [self.epsilon / count] * count
+        propensities[order[0]] += 1.0 - self.epsilon
+        event = RankEvent(
+            event_id=event_id,
+            context=context,
+            action_index=selected_index,
+            action_id=table.ids[selected_index],
+            probabilities=tuple(propensities),
+            created=created
+        )
+        response = {
+            "rewardActionId": table.ids[selected_index],
+            "ranking": [{"id": table.ids[index], "probability": probabilities[index]} for index in order],
             "eventId": event_id
         }
+        return event, response
     
-    def reward(self, event_id: str, reward_value: float) -> None:
+    # --- السياسات: نسخة لسياق واحد (قوائم Python أسرع لستة إجراءات) ونسخة مصفوفات لعدة سياقات ---
+    
+    def _heuristic_policy(
+        self,
+        table: StrategyScoreTable,
+        context: Dict[str, Any],
+        draw: List[float]
+    ) -> Tuple[List[int], List[float]]:
+        """الاستدلال الثابت مع ضجيج: الاحتمالات نقاط مطبّعة"""
+        count = len(table.ids)
+        scores = [
+            min(1.0, max(0.0, base + (noise - 0.5) * 0.1))
+            for base, noise in zip(table.lookup(context), draw)
+        ]
+        
+        # ترتيب تنازلي (مستقر كما في الترتيب السابق)
+        order = sorted(range(count), key=scores.__getitem__, reverse=True)
+        weights = [max(score, 0.01) for score in scores]
+        total_score = sum(weights)
+        return order, [weight / total_score for weight in weights]
+    
+    def _heuristic_policy_many(
+        self,
+        table: StrategyScoreTable,
+        contexts: List[Dict[str, Any]],
+        draw: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        count = len(table.ids)
+        base_scores = np.array([table.lookup(context) for context in contexts])
+        scores = np.clip(base_scores + (draw[:, :count] - 0.5) * 0.1, 0.0, 1.0)
+        
+        # argsort مستقر على السالب = نفس ترتيب sorted(reverse=True)
+        orders = np.argsort(-scores, axis=1, kind="stable")
+        weights = np.maximum(scores, 0.01)
+        return orders, weights / weights.sum(axis=1, keepdims=True)
+    
+    def _linucb_policy(self, context: Dict[str, Any], draw: List[float]) -> Tuple[List[int], List[float]]:
+        """
+        الترتيب حسب الحد الأعلى للثقة، والاحتمالات هي احتمالات الاختيار الفعلية
+        لـ epsilon-greedy (تُستخدم كـ propensity في التقييم خارج السياسة)
+        """
+        count = len(draw) - 2
+        _, upper = self.bandit.score(context)
+        # ضجيج صغير جداً لكسر التعادل عشوائياً
+        upper = [value + (noise - 0.5) * 1e-9 for value, noise in zip(upper.tolist(), draw)]
+        order = sorted(range(count), key=upper.__getitem__, reverse=True)
+        
+        probabilities = [self.epsilon / count] * count
+        probabilities[order[0]] += 1.0 - self.epsilon
+        return order, probabilities
+    
+    def _linucb_policy_many(self, contexts: List[Dict[str, Any]], draw: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        count = draw.shape[1] - 2
+        _, upper = self.bandit.score_many(contexts)
+        orders = np.argsort(-(upper + (draw[:, :count] - 0.5) * 1e-9), axis=1)
+        
+        probabilities = np.full((len(contexts), count), self.epsilon / count)
+        probabilities[np.arange(len(contexts)), orders[:, 0]] += 1.0 - self.epsilon
+        return orders, probabilities
+    
+    def reward(self, event_id: str, reward_value: float) -> bool:
         """
         تسجيل المكافأة للتعلم
         
         Args:
             event_id: معرف الحدث
             reward_value: قيمة المكافأة (0-1)
+        
+        Returns:
+            bool: هل رُبطت المكافأة بقرار ما زال ينتظر (مع الربط المشترك: دائماً
+            True، فالمكافأة تُرسل لطابور المكافآت في الخلفية والربط في learn_from_queue)
+        """
+        if self.join_store is not None:
+            return self._queue_reward(event_id, reward_value)
+        
+        # نسخة تخدم sendReward فقط تستعيد أيضاً قرارات النسخة السابقة المنتظرة
+        if not self._snapshot_loaded:
+            self._load_snapshot()
+        
+        joined = self.pending.join(event_id, reward_value)
+        if joined:
+            logger.info(f"Reward received: {event_id} = {reward_value}")
+        else:
+            logger.warning(f"Reward for unknown or expired event: {event_id}")
+        return joined
+    
+    def _queue_reward(self, event_id: str, reward_value: float) -> bool:
+        self.reward_shipper.put_many([(event_id, reward_value, time.time())])
+        logger.info(f"Reward queued: {event_id} = {reward_value}")
+        return True
+    
+    def _learn(self, event: RankEvent) -> None:
+        """استقبال حدث مكتمل (قرار + مكافأة) من مخزن الربط"""
+        with self.lock:
+            totals = self.action_rewards.setdefault(event.action_id, [0, 0.0])
+            totals[0] += 1
+            totals[1] += event.reward
+        
+        # الأحداث السابقة لتعديل الاستراتيجيات قد لا تطابق النموذج الحالي
+        bandit = self.bandit
+        index = event.action_index
+        if bandit is not None and index < len(bandit.ids) and bandit.ids[index] == event.action_id:
+            bandit.update(event.context, index, event.reward)
+        
+        # write-behind: الحفظ في خيط خلفي عند مرور الفترة (مع الربط المشترك يحفظ
+        # personalizerLearner في نهاية كل جولة)
+        snapshots = self.snapshots
+        if snapshots is not None and self.join_store is None:
+            snapshots.maybe_save_async()
+    
+    # --- لقطات الحالة (واجهة SnapshotManager: export/load/merge/baseline) ---
+    
+    def enable_snapshots(self, store: Any, interval_sec: float = 60, name: str = "personalizer") -> SnapshotManager:
         """
-        current_reward = self.learning_data.get(event_id, 0)
-        self.learning_data[event_id] = current_reward + reward_value
-        logger.info(f"Reward received: {event_id} = {reward_value}")
+        حفظ حالة النموذج (LinUCB وعدادات المكافآت والأحداث المنتظرة) في مخزن اللقطات
+        
+        - التحميل كسول عند أول rank أو reward (لا يتأخر بدء النسخة)
+        - الحفظ في خيط خلفي بعد تعلم جديد كل interval_sec، فلا يضيف rank أو
+          sendReward زمن كتابة
+        - عند وجود إصدار أحدث من نسخة أخرى تُدمج الفروق: A و b والعدادات جمعية
+        
+        Args:
+            store: مخزن اللقطات (محلي أو Cloud Storage)
+            interval_sec: أقل فترة بين حفظين
+            name: اسم اللقطة في المخزن
+        
+        Returns:
+            SnapshotManager: مدير اللقطات
+        """
+        self.snapshots = SnapshotManager(self, store, name=name, interval_sec=interval_sec)
+        self._snapshot_loaded = False
+        return self.snapshots
+    
+    def _load_snapshot(self) -> None:
+        with self._snapshot_lock:
+            if self._snapshot_loaded:
+                return
+            try:
+                self.snapshots.warm_load()
+            except Exception as e:
+                logger.error(f"Personalizer snapshot load error: {e}")
+            self._snapshot_loaded = True
     
-    def _calculate_score(
+    def _sync_snapshot(self) -> None:
+        if self.join_store is not None and self.snapshots is not None:
+            # الربط المشترك: المتعلم وحده يتعلم وينشر، وهذه النسخة تبدّل النموذج (في الخلفية)
+            self.snapshots.refresh_async()
+        elif not self._snapshot_loaded:
+            self._load_snapshot()
+    
+    def _check_layout(self, meta: Dict[str, Any]) -> None:
+        if meta.get("kind") != STATE_SNAPSHOT_KIND:
+            raise ValueError("Not a personalizer state snapshot")
+        if self.table is None or meta.get("actions") != self.table.ids:
+            raise ValueError("Snapshot was written for a different strategy list")
+    
+    def _reward_totals(self, action_ids: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        with self.lock:
+            totals = [self.action_rewards.get(action_id, (0, 0.0)) for action_id in action_ids]
+        return (
+            np.array([count for count, _ in totals], dtype=np.int64),
+            np.array([total for _, total in totals], dtype=np.float64)
+        )
+    
+    def export_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """مصفوفات الحالة مع البيانات الوصفية (صيغة snapshots)"""
+        ids = self.table.ids
+        arrays = {}
+        meta = {
+            "kind": STATE_SNAPSHOT_KIND,
+            "engine": self.engine,
+            "actions": ids,
+            "savedAt": datetime.utcnow().isoformat()
+        }
+        
+        if self.bandit is not None:
+            a_inverse, b, updates = self.bandit.state()
+            arrays["bandit_a_inverse"] = a_inverse
+            arrays["bandit_b"] = b
+            meta["banditUpdates"] = updates
+        arrays["action_count"], arrays["action_reward"] = self._reward_totals(ids)
+        
+        with self.pending.lock:
+            pending = [
+                event for event in self.pending.events.values()
+                if len(event.probabilities) == len(ids) and ids[event.action_index] == event.action_id
+            ]
+        columns, meta["vocabularies"] = event_columns(pending, ids)
+        for name, array in columns.items():
+            arrays[f"pending_{name}"] = array
+        arrays["pending_event_id"] = np.array([event.event_id.encode("utf-8") for event in pending], dtype=np.bytes_)
+        return arrays, meta
+    
+    def load_arrays(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """
+        استبدال الحالة بمحتوى لقطة (عند أول rank أو reward)
+        
+        الأحداث المنتظرة تعود لمخزن الربط فتُربط مكافآت قرارات النسخة السابقة
+        (إذا كانت تلك النسخة ما زالت تعمل فقد تتعلم النسختان من نفس الحدث)
+        """
+        self.load_table(arrays, meta)
+        columns = {name[len("pending_"):]: array for name, array in arrays.items() if name.startswith("pending_")}
+        event_ids = [event_id.decode("utf-8") for event_id in columns.pop("event_id").tolist()]
+        self.pending.restore(events_from_columns(columns, meta["vocabularies"], self.table.ids, event_ids))
+    
+    def load_table(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """استبدال النموذج والعدادات فقط بإصدار منشور (نسخ rank مع الربط المشترك)"""
+        self._check_layout(meta)
+        ids = self.table.ids
+        
+        if self.bandit is not None and "bandit_a_inverse" in arrays:
+            self.bandit.load(arrays["bandit_a_inverse"], arrays["bandit_b"], meta.get("banditUpdates", 0))
+        with self.lock:
+            self.action_rewards = {
+                action_id: [count, total]
+                for action_id, count, total in zip(ids, arrays["action_count"].tolist(), arrays["action_reward"].tolist())
+                if count
+            }
+    
+    def snapshot_baseline(
         self,
-        action: Dict[str, Any],
-        context: Dict[str, Any]
-    ) -> float:
-        """
-        حساب النقاط للإجراء بناءً على السياق
-        """
-        score = 0.5  # النقطة الأساسية
-        features = action.get("features", {})
-        
-        # مطابقة الوقت
-        if features.get("bestTimeOfDay") == context.get("timeOfDay"):
-            score += 0.3
-        elif features.get("bestTimeOfDay") == "any":
-            score += 0.1
-        
-        # مطابقة الإنتاجية
-        required_productivity = features.get("requiredProductivity")
-        user_productivity = context.get("userProductivity")
-        
-        if required_productivity == user_productivity:
-            score += 0.2
-        elif user_productivity == "high" and required_productivity == "medium":
-            score += 0.1
-        elif required_productivity == "any":
-            score += 0.1
-        
-        # مطابقة نوع المهمة
-        if features.get("taskType") == context.get("taskType"):
-            score += 0.2
-        elif features.get("taskType") == "any":
-            score += 0.1
-        
-        # أنماط أيام الأسبوع
-        weekend_days = ["friday", "saturday"]
-        day_of_week = context.get("dayOfWeek", "").lower()
-        
-        if day_of_week in weekend_days:
-            if features.get("suitableForWeekend"):
-                score += 0.15
-            else:
-                score -= 0.1
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        الإحصاءات الجمعية عند نقطة المزامنة (لدمج الجديد منها فقط لاحقاً)
         
-        # إضافة عشوائية للاستكشاف
-        score += (random.random() - 0.5) * 0.1
+        مع arrays: إحصاءات لقطة منشورة قبل دمجها، أو None إذا كانت لن تُدمج
+        """
+        if arrays is None:
+            counts, totals = self._reward_totals(self.table.ids)
+            return {
+                "bandit": self.bandit.sufficient_statistics() if self.bandit is not None else None,
+                "counts": counts,
+                "totals": totals
+            }
         
-        return max(0, min(1, score))
+        try:
+            self._check_layout(meta)
+        except ValueError:
+            return None
+        bandit = None
+        if self.bandit is not None and "bandit_a_inverse" in arrays:
+            bandit = (np.linalg.inv(arrays["bandit_a_inverse"]), arrays["bandit_b"].copy(), meta.get("banditUpdates", 0))
+        return {
+            "bandit": bandit,
+            "counts": arrays["action_count"].astype(np.int64),
+            "totals": arrays["action_reward"].astype(np.float64)
+        }
+    
+    def merge_arrays(
+        self,
+        arrays: Dict[str, np.ndarray],
+        meta: Dict[str, Any],
+        strategy: str = "visits",
+        baseline: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        دمج لقطة نسخة أخرى: المنشور + (المحلي - الأساس)
+        
+        last_writer: الحالة المحلية تحل محل المنشورة بدون دمج. الأحداث المنتظرة
+        المحلية تبقى كما هي (كل نسخة تربط مكافآت قراراتها)
+        """
+        try:
+            self._check_layout(meta)
+        except ValueError as e:
+            # لقطة لقائمة استراتيجيات سابقة: الإصدار التالي يحل محلها
+            logger.warning(f"Personalizer snapshot not merged: {e}")
+            return
+        if strategy == "last_writer":
+            return
+        
+        ids = self.table.ids
+        if self.bandit is not None and "bandit_a_inverse" in arrays:
+            self.bandit.merge(
+                np.linalg.inv(arrays["bandit_a_inverse"]),
+                arrays["bandit_b"],
+                meta.get("banditUpdates", 0),
+                baseline["bandit"] if baseline is not None else None
+            )
+        
+        base_counts = baseline["counts"] if baseline is not None else np.zeros(len(ids), dtype=np.int64)
+        base_totals = baseline["totals"] if baseline is not None else np.zeros(len(ids))
+        with self.lock:
+            for position, action_id in enumerate(ids):
+                local = self.action_rewards.get(action_id, [0, 0.0])
+                count = int(arrays["action_count"][position]) + local[0] - int(base_counts[position])
+                total = float(arrays["action_reward"][position]) + local[1] - float(base_totals[position])
+                if count > 0:
+                    self.action_rewards[action_id] = [count, total]
+    
+    # --- الربط المشترك: rank و sendReward يكتبان للطابورين والمتعلم المجدول يربط ---
+    
+    def enable_shared_join(
+        self,
+        store: Any,
+        name: str = "personalizer",
+        ship_interval_sec: float = SHIP_INTERVAL_SEC,
+        grace_sec: float = JOIN_GRACE_SEC
+    ) -> None:
+        """
+        ربط القرارات والمكافآت عبر طابوري مخزن مشترك بدل ذاكرة النسخة
+        
+        - rank يضيف قراراته لـ {name}-ranks و reward يضيف المكافأة لـ
+          {name}-rewards عبر QueueShipper (دفعات من خيط خلفي، بدون كتابة في
+          الطلب)، ولا يتعلم أي منهما
+        - learn_from_queue (personalizerLearner) يربط ويسلّم للمتعلمين وينشر اللقطة،
+          ونسخ rank تبدّل النموذج بالإصدار المنشور
+        - الحدث بدون مكافأة يُسلَّم مع المكافأة الافتراضية: كل المكافآت تصل للمتعلم
+        
+        Args:
+            store: مخزن اللقطات (نفسه في كل النسخ)
+            name: بادئة اسمي الطابورين
+            ship_interval_sec: أقصى فترة بين دفعتين من الخيط الخلفي
+            grace_sec: تأخير الوصول للطابور المسموح قبل إخلاء حدث (أكبر من ship_interval_sec)
+        """
+        # المتعلم ينقل الأحداث المنتظرة بين الجولات في اللقطة
+        if self.snapshots is None:
+            raise ValueError("Shared join needs enable_snapshots first")
+        
+        self.join_store = store
+        self.join_name = name
+        self.join_grace_sec = grace_sec
+        self.pending.learn_unrewarded = True
+        self.rank_shipper = QueueShipper(
+            store, f"{name}-ranks", encode_rank_events, interval_sec=ship_interval_sec
+        )
+        self.reward_shipper = QueueShipper(
+            store, f"{name}-rewards", lambda rewards, _: encode_rewards(rewards), interval_sec=ship_interval_sec
+        )
+    
+    def learn_from_queue(self, time_budget_sec: float = LEARNER_BUDGET_SEC, limit: int = 64) -> Dict[str, int]:
+        """
+        ربط طابوري القرارات والمكافآت وتسليم الأحداث المنتهية للمتعلمين
+        
+        المكافآت تُسحب قبل القرارات: قرار كل مكافأة دُفع قبلها فيُسحب في نفس
+        الجولة، أو كان منتظراً من جولة سابقة (الأحداث المنتظرة جزء من اللقطة).
+        الأحداث المنتهية تُسلَّم في كل جولة حتى لو لم يفرغ الطابوران: إذا بقيت
+        مكافآت في الطابور فالحد هو وقت دفع آخر دفعة مسحوبة (ما بعدها لم يُسحب
+        بعد)، مطروحاً منه join_grace_sec لتأخر الإرسال الخلفي. المكافأة غير
+        المربوطة تعود للطابور حتى تنتهي مهلتها: قرارها قد يكون في دفعة لم تصل بعد
+        
+        Args:
+            time_budget_sec: أقصى وقت للسحب
+            limit: عدد الدفعات في كل سحب
+        
+        Returns:
+            Dict: عدد القرارات والمكافآت المسحوبة والمربوطة والأحداث المسلّمة
+        """
+        started = time.perf_counter()
+        if not self._snapshot_loaded:
+            self._load_snapshot()
+        ids = self.table.ids
+        # قبل السحب: الحدث المنتهي عند هذا الوقت وصلت كل مكافآته للطابور
+        now = time.time()
+        
+        reward_batches, rewards_drained = self._claim(f"{self.join_name}-rewards", limit, started, time_budget_sec)
+        rank_batches, _ = self._claim(f"{self.join_name}-ranks", limit, started, time_budget_sec)
+        
+        events = []
+        for buffer in rank_batches:
+            try:
+                events.extend(decode_rank_events(buffer, ids))
+            except ValueError as e:
+                # قرارات لقائمة استراتيجيات سابقة لا تطابق النموذج الحالي
+                logger.warning(f"Personalizer rank batch skipped: {e}")
+        # restore وليس record: لا يُخلى حدث قبل ربط مكافآت هذه الجولة
+        self.pending.restore(events)
+        
+        rewards = []
+        # الطابور بترتيب الدفع: مكافآت أي حدث أُنشئ قبل horizon - المهلة سُحبت كلها
+        horizon = now if rewards_drained else None
+        for buffer in reward_batches:
+            try:
+                batch, shipped = decode_rewards(buffer)
+            except ValueError as e:
+                logger.warning(f"Personalizer reward batch skipped: {e}")
+                continue
+            rewards.extend(batch)
+            if not rewards_drained:
+                horizon = shipped if horizon is None else max(horizon, shipped)
+        
+        joined = 0
+        retry = []
+        for event_id, value, sent in rewards:
+            if self.pending.join(event_id, value, now=sent):
+                joined += 1
+            elif now - sent <= self.pending.reward_wait_sec + self.join_grace_sec:
+                retry.append((event_id, value, sent))
+        if retry:
+            self.join_store.push_batch(f"{self.join_name}-rewards", encode_rewards(retry))
+        
+        delivered = 0
+        if horizon is not None:
+            delivered = self.pending.flush(min(horizon, now) - self.join_grace_sec)
+        return {"ranks": len(events), "rewards": len(rewards), "joined": joined, "delivered": delivered}
+    
+    def learner_round(
+        self,
+        time_budget_sec: float = LEARNER_BUDGET_SEC,
+        lease_sec: float = LEARNER_LEASE_SEC
+    ) -> Optional[Dict[str, int]]:
+        """
+        جولة متعلم كاملة تحت عقد إيجار في المخزن (personalizerLearner)
+        
+        كل جولة لها الأحداث المنتظرة كاملة: جولتان متزامنتان على نسختين تقسمان
+        المكافآت وقراراتها فلا تُربط، لذا تعمل جولة واحدة فقط في كل مرة. النسخة
+        التي سبقتها نسخة أخرى بإصدار أحدث تستبدل حالتها به قبل السحب
+        
+        Returns:
+            Optional[Dict]: نتيجة learn_from_queue مع الإصدار، أو None إذا كان العقد مأخوذاً
+        """
+        lease = f"{self.join_name}-learner"
+        token = self.join_store.acquire_lease(lease, lease_sec)
+        if token is None:
+            return None
+        
+        try:
+            snapshots = self.snapshots
+            if self._snapshot_loaded and snapshots.store.latest_version(snapshots.name) > snapshots.version:
+                with self.pending.lock:
+                    self.pending.events.clear()
+                self._snapshot_loaded = False
+            
+            result = self.learn_from_queue(time_budget_sec)
+            result["version"] = snapshots.version
+            if result["ranks"] or result["rewards"] or result["delivered"]:
+                result["version"] = snapshots.save()
+            if self.decision_log is not None:
+                self.decision_log.flush()
+            return result
+        finally:
+            self.join_store.release_lease(lease, token)
+    
+    def _claim(self, queue: str, limit: int, started: float, time_budget_sec: float) -> Tuple[List[bytes], bool]:
+        """سحب دفعات الطابور حتى يفرغ (True) أو ينتهي الوقت (False)"""
+        batches = []
+        while time.perf_counter() - started < time_budget_sec:
+            claimed = self.join_store.claim_batches(queue, limit)
+            if not claimed:
+                return batches, True
+            batches.extend(claimed)
+        return batches, False
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """إحصائيات الربط ومتوسط المكافأة لكل إجراء"""
+        with self.lock:
+            action_rewards = {
+                action_id: {"count": count, "meanReward": total / count}
+                for action_id, (count, total) in self.action_rewards.items()
+            }
+        stats = {
+            "engine": self.engine,
+            "sharedJoin": self.join_store is not None,
+            "events": self.pending.get_stats(),
+            "actions": action_rewards
+        }
+        if self.bandit is not None:
+            stats["bandit"] = self.bandit.get_stats()
+        if self.decision_log is not None:
+            stats["decisionLog"] = self.decision_log.get_stats()
+        if self.snapshots is not None:
+            stats["snapshot"] = self.snapshots.get_stats()
+        if self.rank_shipper is not None:
+            stats["shipping"] = {"ranks": self.rank_shipper.get_stats(), "rewards": self.reward_shipper.get_stats()}
+        return stats
 
 
+# مخزن اللقطات (RL_SNAPSHOT_BUCKET أو RL_SNAPSHOT_DIR) للحالة، ولسجل القرارات عند PERSONALIZER_DECISION_LOG=1
+_snapshot_store = snapshot_store_from_env()
+_decision_store = _snapshot_store if os.environ.get("PERSONALIZER_DECISION_LOG") == "1" else None
+
 # Singleton instance
-personalizer_client = PersonalizerClient()
+personalizer_client = PersonalizerClient(
+    max_pending=int(os.environ.get("PERSONALIZER_MAX_PENDING", "10000")),
+    reward_wait_sec=float(os.environ.get("PERSONALIZER_REWARD_WAIT_SEC", "600")),
+    # linucb يتعلم من المكافآت المربوطة فقط، فيحتاج الربط المشترك (مخزن لقطات)
+    engine=os.environ.get("PERSONALIZER_ENGINE", "heuristic"),
+    decision_log=DecisionLog(_decision_store) if _decision_store is not None else None
+)
+
+if _snapshot_store is not None and os.environ.get("PERSONALIZER_SNAPSHOTS", "1") != "0":
+    personalizer_client.enable_snapshots(
+        _snapshot_store,
+        interval_sec=float(os.environ.get("PERSONALIZER_SNAPSHOT_INTERVAL_SEC", "60"))
+    )
+    # rank و sendReward في نسخ مختلفة: الربط في personalizerLearner
+    if os.environ.get("PERSONALIZER_SHARED_JOIN", "1") != "0":
+        personalizer_client.enable_shared_join(_snapshot_store)
 
 
 # ============================================
@@ -216,6 +1695,8 @@ SCHEDULING_STRATEGIES = [
     }
 ]
 
+personalizer_client.compile(SCHEDULING_STRATEGIES)
+
 
 # ============================================
 # Helper Functions
@@ -234,8 +1715,7 @@ def get_time_of_day(hour: int) -> str:
 
 def get_day_of_week() -> str:
     """الحصول على اسم اليوم"""
-    days = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
-    return days[datetime.utcnow().weekday()]
+    return DAYS_OF_WEEK[datetime.utcnow().weekday()]
 
 
 def calculate_user_productivity(completion_rate: float, streak: int) -> str:
@@ -249,6 +1729,22 @@ def calculate_user_productivity(completion_rate: float, streak: int) -> str:
     return "low"
 
 
+def build_user_context(user_behavior: Dict[str, Any]) -> Dict[str, Any]:
+    """السياق المشترك بين كل مهام المستخدم في الطلب (بدون نوع المهمة)"""
+    return {
+        "timeOfDay": get_time_of_day(datetime.utcnow().hour),
+        "dayOfWeek": get_day_of_week(),
+        "userProductivity": calculate_user_productivity(
+            user_behavior.get("completionRate", 0.5),
+            user_behavior.get("streak", 0)
+        )
+    }
+
+
+# الحد الأقصى للمهام في طلب getPersonalizedStrategies
+MAX_RANK_BATCH = 200
+
+
 # ============================================
 # Firebase Functions
 # ============================================
@@ -280,17 +1776,7 @@ def getPersonalizedStrategy(req: https_fn.CallableRequest) -> dict:
     task_type = data.get("taskType", "routine")
     
     try:
-        current_hour = datetime.utcnow().hour
-        
-        context = {
-            "timeOfDay": get_time_of_day(current_hour),
-            "dayOfWeek": get_day_of_week(),
-            "userProductivity": calculate_user_productivity(
-                user_behavior.get("completionRate", 0.5),
-                user_behavior.get("streak", 0)
-            ),
-            "taskType": task_type
-        }
+        context = {**build_user_context(user_behavior), "taskType": task_type}
         
         rank_response = personalizer_client.rank(
             context_features=context,
@@ -322,6 +1808,79 @@ def getPersonalizedStrategy(req: https_fn.CallableRequest) -> dict:
         )
 
 
+@https_fn.on_call(
+    cors=options.CorsOptions(
+        cors_origins=["*"],
+        cors_methods=["POST", "OPTIONS"],
+    ),
+    memory=options.MemoryOption.MB_256,
+    timeout_sec=15
+)
+def getPersonalizedStrategies(req: https_fn.CallableRequest) -> dict:
+    """
+    استراتيجية مخصصة لكل مهمة في طلب واحد (مثل خطة يوم كامل)
+    
+    المعاملات:
+        userBehavior (dict): سلوك المستخدم (completionRate, streak) المشترك بين المهام
+        tasks (list): المهام (حتى MAX_RANK_BATCH)، لكل مهمة taskType و id (اختياري)
+    """
+    if not req.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="يجب تسجيل الدخول"
+        )
+    
+    data = req.data
+    user_behavior = data.get("userBehavior", {})
+    tasks = data.get("tasks") or []
+    
+    if not isinstance(tasks, list) or not tasks or not all(isinstance(task, dict) for task in tasks):
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            message="قائمة المهام مطلوبة"
+        )
+    
+    if len(tasks) > MAX_RANK_BATCH:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            message=f"الحد الأقصى {MAX_RANK_BATCH} مهمة في الطلب"
+        )
+    
+    try:
+        # السياق المشترك مرة واحدة، ثم ترتيب كل المهام بعمليات مصفوفات واحدة
+        shared_context = build_user_context(user_behavior)
+        contexts = [{**shared_context, "taskType": task.get("taskType", "routine")} for task in tasks]
+        rank_responses = personalizer_client.rank_many(contexts, SCHEDULING_STRATEGIES)
+        
+        strategies = {strategy["id"]: strategy for strategy in SCHEDULING_STRATEGIES}
+        results = [
+            {
+                "taskId": task.get("id"),
+                "taskType": context["taskType"],
+                "strategy": strategies.get(rank_response["rewardActionId"]),
+                "eventId": rank_response["eventId"],
+                "ranking": rank_response["ranking"]
+            }
+            for task, context, rank_response in zip(tasks, contexts, rank_responses)
+        ]
+        
+        logger.info(f"Strategies selected for user {req.auth.uid}: {len(results)} tasks")
+        
+        return {
+            "success": True,
+            "results": results,
+            "context": shared_context,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Personalizer batch error: {e}")
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INTERNAL,
+            message=f"خطأ في التخصيص: {str(e)}"
+        )
+
+
 @https_fn.on_call(
     cors=options.CorsOptions(
         cors_origins=["*"],
@@ -360,12 +1919,16 @@ def sendReward(req: https_fn.CallableRequest) -> dict:
         # تطبيع المكافأة (0-1)
         normalized_reward = max(0, min(1, float(reward)))
         
-        personalizer_client.reward(event_id, normalized_reward)
+        accepted = personalizer_client.reward(event_id, normalized_reward)
+        # مع الربط المشترك تُربط المكافأة لاحقاً في personalizerLearner
+        queued = personalizer_client.join_store is not None
         
         logger.info(f"Reward sent by user {req.auth.uid}: {event_id} = {normalized_reward}")
         
         return {
             "success": True,
+            "joined": accepted and not queued,
+            "queued": accepted and queued,
             "message": "تم تسجيل التقييم بنجاح",
             "timestamp": datetime.utcnow().isoformat()
         }
@@ -378,6 +1941,34 @@ def sendReward(req: https_fn.CallableRequest) -> dict:
         )
 
 
+@scheduler_fn.on_schedule(
+    schedule="every 1 minutes",
+    memory=options.MemoryOption.MB_512,
+    timeout_sec=120
+)
+def personalizerLearner(event: scheduler_fn.ScheduledEvent) -> None:
+    """
+    المتعلم المجدول: ربط طابوري القرارات والمكافآت والتعلم من الأحداث المنتهية
+    ونشر لقطة جديدة (تشمل الأحداث التي ما زالت تنتظر مكافآتها)
+    """
+    if personalizer_client.join_store is None:
+        logger.info("Personalizer learner skipped: shared join is not enabled")
+        return
+    
+    try:
+        result = personalizer_client.learner_round()
+        if result is None:
+            logger.info("Personalizer learner skipped: another round holds the lease")
+            return
+        logger.info(
+            f"Personalizer learner: ranks={result['ranks']}, rewards={result['rewards']}, "
+            f"joined={result['joined']}, delivered={result['delivered']}, version={result['version']}"
+        )
+        
+    except Exception as e:
+        logger.error(f"Personalizer learner error: {e}")
+
+
 @https_fn.on_call(
     cors=options.CorsOptions(
         cors_origins=["*"],
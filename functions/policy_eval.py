@@ -0,0 +1,553 @@
+"""
+Offline Policy Evaluation
+تقييم سياسات personalizer و RL من السجلات قبل نشرها (IPS و SNIPS و Doubly Robust)
+
+السجلات:
+- personalizer: شرائح DecisionLog (السياق، الإجراء، احتمال كل إجراء، المكافأة)
+  من طابور المخزن personalizer-decisions عند PERSONALIZER_DECISION_LOG=1.
+  الاحتمالات المسجلة هي احتمالات الاختيار الفعلية لـ epsilon-greedy في المحركين
+  (استجابة rank لمحرك heuristic تعرض نقاطاً مطبّعة، والسجل لا يستخدمها)
+- rl: لقطات الوكيل (ذاكرة التجارب replay_*) أو دفعات طابور rlFeedback
+  (الحالة، الإجراء، المكافأة). التغذية الراجعة لا تحمل احتمال الإجراء، فسياسة
+  السلوك تُقدّر من تكرار كل إجراء في الحالة (منعّماً نحو التكرار العام)؛ مع
+  احتمالات مقدّرة يميل IPS للأعلى (1/p̂ محدب) والأدق SNIPS و DR
+
+المقدّرات لسياسة مرشحة π على n حدث بوزن w = π(a|x) / p(a|x):
+    IPS   = Σ w·r / n
+    SNIPS = Σ w·r / Σ w
+    DM    = Σ Σa π(a|x)·r̂(x, a) / n
+    DR    = DM + Σ w·(r - r̂(x, a)) / n
+حيث r̂ متوسط المكافأة لكل (مفتاح سياق، إجراء) منكمشاً نحو متوسط الإجراء، ويُستبعد
+كل حدث من r̂ ومن سياسة السلوك المقدرة الخاصة به (leave-one-out).
+
+مروران متوازيان على الشرائح (شريحة لكل مهمة): الأول يجمع إحصاءات r̂ وسياسة
+السلوك، والثاني مجاميع المقدّرات لكل سياسة. كل المجاميع قابلة للجمع فالدمج
+بين العمليات جمع فقط، ولا تنتقل الأحداث نفسها بين العمليات.
+
+التشغيل من مجلد functions:
+    python -m policy_eval personalizer logs/*.batch --train old/*.batch
+    python -m policy_eval rl exports/*.snap --agent candidate.snap --workers 1,2,4
+"""
+
+import argparse
+import glob
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from personalizer import (
+    DAYS_OF_WEEK, LOGGED_CONTEXT_KEYS, SCHEDULING_STRATEGIES, WEEKEND_DAYS,
+    ContextEncoder, LinUCB, StrategyScoreTable, decode_decisions
+)
+from rl_agent import ACTIONS, create_agent, encode_quantized
+from rl_offline import load_experiences
+from snapshots import decode_snapshot, map_file
+
+
+# ============================================
+# Estimators
+# ============================================
+
+def estimator_sums(
+    target: np.ndarray,
+    actions: np.ndarray,
+    propensities: np.ndarray,
+    rewards: np.ndarray,
+    predicted: np.ndarray
+) -> Dict[str, float]:
+    """
+    مجاميع المقدّرات لشريحة (تُجمع بين الشرائح ثم تُحوَّل بـ summarize)
+
+    Args:
+        target: احتمالات السياسة المرشحة (n, actions)
+        actions: الإجراءات المسجلة
+        propensities: احتمال الإجراء المسجل تحت سياسة السلوك
+        rewards: المكافآت المسجلة
+        predicted: r̂ لكل (حدث، إجراء) بالشكل (n, actions)
+
+    Returns:
+        Dict: المجاميع
+    """
+    rows = np.arange(len(actions))
+    weights = target[rows, actions] / propensities
+    ips = weights * rewards
+    direct = (target * predicted).sum(axis=1)
+    doubly_robust = direct + weights * (rewards - predicted[rows, actions])
+    return {
+        "count": float(len(actions)),
+        "weight": float(weights.sum()),
+        "weightSquared": float((weights ** 2).sum()),
+        "ips": float(ips.sum()),
+        "ipsSquared": float((ips ** 2).sum()),
+        "dm": float(direct.sum()),
+        "dr": float(doubly_robust.sum()),
+        "drSquared": float((doubly_robust ** 2).sum()),
+        "maxWeight": float(weights.max()) if len(weights) else 0.0,
+    }
+
+
+def merge_sums(parts: List[Dict[str, float]]) -> Dict[str, float]:
+    merged: Dict[str, float] = {}
+    for part in parts:
+        for name, value in part.items():
+            if name == "maxWeight":
+                merged[name] = max(merged.get(name, 0.0), value)
+            else:
+                merged[name] = merged.get(name, 0.0) + value
+    return merged
+
+
+def summarize(sums: Dict[str, float]) -> Dict[str, float]:
+    """التقديرات والخطأ المعياري وحجم العينة الفعال من المجاميع"""
+    count = sums.get("count", 0.0)
+    if not count:
+        return {"events": 0}
+
+    def mean_and_error(total: float, squared: float) -> Tuple[float, float]:
+        mean = total / count
+        variance = max(squared / count - mean * mean, 0.0)
+        return mean, float(np.sqrt(variance / count))
+
+    ips, ips_error = mean_and_error(sums["ips"], sums["ipsSquared"])
+    dr, dr_error = mean_and_error(sums["dr"], sums["drSquared"])
+    return {
+        "events": int(count),
+        "ips": ips,
+        "ipsStderr": ips_error,
+        "snips": sums["ips"] / sums["weight"] if sums["weight"] else 0.0,
+        "dm": sums["dm"] / count,
+        "dr": dr,
+        "drStderr": dr_error,
+        # كم حدثاً "فعلياً" يبقى بعد إعادة الوزن (صغير = تقدير غير موثوق)
+        "effectiveSampleSize": sums["weight"] ** 2 / sums["weightSquared"] if sums["weightSquared"] else 0.0,
+        "maxWeight": sums["maxWeight"],
+    }
+
+
+def epsilon_greedy(scores: np.ndarray, epsilon: float) -> np.ndarray:
+    """احتمالات epsilon-greedy، والتعادل يقسم حصة الاستغلال بالتساوي"""
+    best = scores >= scores.max(axis=1, keepdims=True) - 1e-12
+    greedy = best / best.sum(axis=1, keepdims=True)
+    return (1.0 - epsilon) * greedy + epsilon / scores.shape[1]
+
+
+# ============================================
+# Reward Model
+# ============================================
+
+class RewardModel:
+    """
+    عدد ومجموع المكافآت لكل زوج (مفتاح سياق، إجراء) كمصفوفات مرتبة
+
+    - r̂(x, a) = (مجموع + k·متوسط الإجراء) / (عدد + k) بقوة انكماش k
+    - سياسة السلوك المقدرة p(a|x) = (عدد(x, a) + s·تكرار a) / (عدد(x) + s)
+    """
+
+    def __init__(self, n_actions: int, pairs: np.ndarray, counts: np.ndarray, sums: np.ndarray, shrinkage: float = 5.0):
+        self.n_actions = n_actions
+        self.pairs = pairs
+        self.counts = counts
+        self.sums = sums
+        self.shrinkage = shrinkage
+
+        actions = pairs % n_actions
+        self.action_counts = np.bincount(actions, weights=counts, minlength=n_actions)
+        action_sums = np.bincount(actions, weights=sums, minlength=n_actions)
+        self.action_means = np.divide(
+            action_sums, self.action_counts, out=np.zeros(n_actions), where=self.action_counts > 0
+        )
+
+    @staticmethod
+    def collect(keys: np.ndarray, actions: np.ndarray, rewards: np.ndarray, n_actions: int) -> Dict[str, np.ndarray]:
+        """إحصاءات شريحة: الأزواج الفريدة وعددها ومجموع مكافآتها"""
+        pairs, inverse = np.unique(keys.astype(np.int64) * n_actions + actions, return_inverse=True)
+        return {
+            "pairs": pairs,
+            "counts": np.bincount(inverse, minlength=len(pairs)).astype(np.float64),
+            "sums": np.bincount(inverse, weights=rewards, minlength=len(pairs)),
+        }
+
+    @classmethod
+    def from_parts(cls, parts: List[Dict[str, np.ndarray]], n_actions: int, shrinkage: float = 5.0) -> "RewardModel":
+        if not parts:
+            empty = np.zeros(0)
+            return cls(n_actions, empty.astype(np.int64), empty, empty, shrinkage)
+
+        pairs, inverse = np.unique(np.concatenate([part["pairs"] for part in parts]), return_inverse=True)
+        counts = np.bincount(inverse, weights=np.concatenate([part["counts"] for part in parts]), minlength=len(pairs))
+        sums = np.bincount(inverse, weights=np.concatenate([part["sums"] for part in parts]), minlength=len(pairs))
+        return cls(n_actions, pairs, counts, sums, shrinkage)
+
+    def _lookup(
+        self,
+        keys: np.ndarray,
+        actions: Optional[np.ndarray] = None,
+        rewards: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        عدد ومجموع المكافآت لكل (حدث، إجراء) بالشكل (n, actions) ببحث ثنائي واحد
+
+        مع actions و rewards يُستبعد الحدث نفسه من زوجه (leave-one-out)، وإلا
+        تميل التقديرات نحو مكافأة الحدث وإجرائه في السياقات النادرة
+        """
+        query = keys.astype(np.int64)[:, None] * self.n_actions + np.arange(self.n_actions)
+        if not len(self.pairs):
+            return np.zeros(query.shape), np.zeros(query.shape)
+
+        positions = np.minimum(np.searchsorted(self.pairs, query), len(self.pairs) - 1)
+        found = self.pairs[positions] == query
+        counts = np.where(found, self.counts[positions], 0.0)
+        sums = np.where(found, self.sums[positions], 0.0)
+        if actions is not None:
+            rows = np.arange(len(actions))
+            counts[rows, actions] = np.maximum(counts[rows, actions] - 1.0, 0.0)
+            sums[rows, actions] -= rewards
+        return counts, sums
+
+    def predict(self, keys: np.ndarray, actions: Optional[np.ndarray] = None, rewards: Optional[np.ndarray] = None) -> np.ndarray:
+        """r̂ بالشكل (n, actions)"""
+        counts, sums = self._lookup(keys, actions, rewards)
+        return (sums + self.shrinkage * self.action_means) / (counts + self.shrinkage)
+
+    def behaviour(self, keys: np.ndarray, actions: np.ndarray, smoothing: float = 10.0) -> np.ndarray:
+        """سياسة السلوك المقدرة بالشكل (n, actions) بدون الحدث نفسه"""
+        counts, _ = self._lookup(keys, actions, np.zeros(len(actions)))
+        total = self.action_counts.sum()
+        frequency = self.action_counts / total if total else np.full(self.n_actions, 1.0 / self.n_actions)
+        return (counts + smoothing * frequency) / (counts.sum(axis=1, keepdims=True) + smoothing)
+
+
+# ============================================
+# Personalizer Logs
+# ============================================
+
+class PersonalizerDomain:
+    """
+    شرائح DecisionLog والسياسات المرشحة لـ personalizer
+
+    السياسات:
+        logged: سياسة السلوك نفسها (IPS يساوي متوسط المكافأة المسجلة)
+        uniform: إجراء عشوائي
+        heuristic: أعلى نقاط StrategyScoreTable
+        linucb: أعلى مكافأة متوقعة لـ LinUCB (من الاستدلال أو مدرّب بـ train_linucb)
+    """
+
+    POLICIES = ["logged", "uniform", "heuristic", "linucb"]
+
+    def __init__(self, epsilon: float = 0.0, theta: Optional[np.ndarray] = None, actions: Optional[List[Dict[str, Any]]] = None):
+        self.table = StrategyScoreTable(actions or SCHEDULING_STRATEGIES)
+        self.encoder = ContextEncoder(self.table)
+        self.n_actions = len(self.table.ids)
+        self.epsilon = epsilon
+        self.policies = list(self.POLICIES)
+        self.model: Optional[RewardModel] = None
+        self.theta = LinUCB.from_heuristic(self.table)._model[2] if theta is None else theta
+        self.cell_scores = self.table.scores.reshape(-1, self.n_actions)
+
+    def _positions(self, vocabularies: Dict[str, List[Any]]) -> Dict[str, np.ndarray]:
+        """موقع كل قيمة في مفردات الجدول والمرمّز (مرة لكل شريحة بدل مرة لكل حدث)"""
+        table = self.table
+
+        def index_of(index: Dict[Any, int], values: List[Any], lower: bool = False) -> np.ndarray:
+            positions = []
+            for value in values:
+                position = index.get(value)
+                if position is None and lower and isinstance(value, str):
+                    position = index.get(value.lower())
+                positions.append(len(index) if position is None else position)
+            return np.array(positions, dtype=np.int64)
+
+        days = vocabularies["dayOfWeek"]
+        weekend = [isinstance(day, str) and day.lower() in WEEKEND_DAYS for day in days]
+        return {
+            "time": index_of(table.time_index, vocabularies["timeOfDay"]),
+            "weekend": np.array(weekend, dtype=np.int64),
+            "day": index_of({day: position for position, day in enumerate(DAYS_OF_WEEK)}, days, lower=True),
+            "level": index_of(table.level_index, vocabularies["userProductivity"]),
+            "task": index_of(table.task_index, vocabularies["taskType"]),
+        }
+
+    def load(self, path: str) -> Dict[str, np.ndarray]:
+        """
+        قراءة شريحة: خلية الجدول وخصائص LinUCB لكل حدث بالفهرسة فقط
+
+        Raises:
+            ValueError: إذا كُتبت الشريحة لقائمة استراتيجيات مختلفة
+        """
+        arrays, meta = decode_decisions(map_file(path))
+        if meta["actions"] != self.table.ids:
+            raise ValueError(f"{path} was logged for a different strategy list")
+
+        positions = self._positions(meta["vocabularies"])
+        codes = {key: arrays[f"context_{key}"].astype(np.int64) for key in LOGGED_CONTEXT_KEYS}
+        time_of_day = positions["time"][codes["timeOfDay"]]
+        level = positions["level"][codes["userProductivity"]]
+        task = positions["task"][codes["taskType"]]
+        weekend = positions["weekend"][codes["dayOfWeek"]]
+
+        # فهرس مسطح في scores بالشكل (فترة، عطلة، إنتاجية، نوع، إجراء)
+        _, _, levels, tasks, _ = self.table.scores.shape
+        cells = ((time_of_day * 2 + weekend) * levels + level) * tasks + task
+
+        count = len(cells)
+        rows = np.arange(count)
+        features = np.zeros((count, self.encoder.dimension))
+        features[:, 0] = 1.0
+        for (_, _, offset), group in zip(self.encoder.groups, (time_of_day, positions["day"][codes["dayOfWeek"]], level, task)):
+            features[rows, offset + group] = 1.0
+
+        actions = arrays["action"].astype(np.int64)
+        logged = arrays["probabilities"].astype(np.float64)
+        return {
+            "keys": cells,
+            "actions": actions,
+            "rewards": arrays["reward"].astype(np.float64),
+            "propensities": logged[rows, actions],
+            "logged": logged,
+            "features": features,
+        }
+
+    def target(self, name: str, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        """احتمالات السياسة المرشحة لكل حدث (n, actions)"""
+        count = len(batch["actions"])
+        if name == "logged":
+            return batch["logged"]
+        if name == "uniform":
+            return np.full((count, self.n_actions), 1.0 / self.n_actions)
+        if name == "heuristic":
+            return epsilon_greedy(self.cell_scores[batch["keys"]], self.epsilon)
+        if name == "linucb":
+            return epsilon_greedy(batch["features"] @ self.theta.T, self.epsilon)
+        raise ValueError(f"Unknown personalizer policy: {name}")
+
+
+def train_linucb(paths: List[str], prior_strength: float = 5.0) -> np.ndarray:
+    """
+    معاملات LinUCB من شرائح تدريب (منفصلة عن شرائح التقييم)
+
+    نفس نتيجة تحديثات Sherman–Morrison المتتالية لكن بحل واحد لكل إجراء:
+    θa = (λI + XaᵀXa)⁻¹ (λθ₀ + Xaᵀra)
+
+    Returns:
+        np.ndarray: θ بالشكل (actions, dimension)
+    """
+    domain = PersonalizerDomain()
+    dimension = domain.encoder.dimension
+    gram = np.repeat(np.eye(dimension)[None] * prior_strength, domain.n_actions, axis=0)
+    moment = prior_strength * domain.theta.copy()
+
+    for path in paths:
+        batch = domain.load(path)
+        for action in range(domain.n_actions):
+            chosen = batch["actions"] == action
+            features = batch["features"][chosen]
+            gram[action] += features.T @ features
+            moment[action] += features.T @ batch["rewards"][chosen]
+
+    return np.linalg.solve(gram, moment[:, :, None])[:, :, 0]
+
+
+# ============================================
+# RL Logs
+# ============================================
+
+class RLDomain:
+    """
+    تجارب rlFeedback والسياسات المرشحة لوكيل RL
+
+    السياسات:
+        logged: سياسة السلوك المقدرة
+        uniform: إجراء عشوائي
+        <اسم اللقطة>: الإجراء الجشع لوكيل من لقطة (--agent)؛ الحالات غير المعروفة
+        للوكيل تتعادل كل إجراءاتها فتكون عشوائية كما في rlPredict
+    """
+
+    POLICIES = ["logged", "uniform"]
+
+    def __init__(self, epsilon: float = 0.0, agent_paths: Optional[List[str]] = None, smoothing: float = 10.0):
+        self.n_actions = len(ACTIONS)
+        self.epsilon = epsilon
+        self.smoothing = smoothing
+        self.model: Optional[RewardModel] = None
+        self.agents = {}
+        for path in agent_paths or []:
+            arrays, meta = decode_snapshot(map_file(path))
+            agent = create_agent(meta.get("agentType", "tabular"))
+            agent.load_arrays(arrays, meta)
+            self.agents[os.path.splitext(os.path.basename(path))[0]] = agent
+        self.policies = self.POLICIES + list(self.agents)
+
+    def load(self, path: str) -> Dict[str, np.ndarray]:
+        experiences = load_experiences([path])
+        batch = {
+            "keys": encode_quantized(experiences["state"]),
+            "actions": experiences["action"].astype(np.int64),
+            "rewards": experiences["reward"].astype(np.float64),
+            "states": experiences["state"],
+        }
+        # بعد المرور الأول فقط (إحصاءات كل الشرائح)
+        if self.model is not None:
+            behaviour = self.model.behaviour(batch["keys"], batch["actions"], self.smoothing)
+            batch["logged"] = behaviour
+            batch["propensities"] = behaviour[np.arange(len(batch["actions"])), batch["actions"]]
+        return batch
+
+    def target(self, name: str, batch: Dict[str, np.ndarray]) -> np.ndarray:
+        count = len(batch["actions"])
+        if name == "logged":
+            return batch["logged"]
+        if name == "uniform":
+            return np.full((count, self.n_actions), 1.0 / self.n_actions)
+        if name in self.agents:
+            q_values = self.agents[name].predict_quantized(batch["states"], noise=False)
+            return epsilon_greedy(q_values.astype(np.float64), self.epsilon)
+        raise ValueError(f"Unknown RL policy: {name}")
+
+
+def build_domain(config: Dict[str, Any]) -> Any:
+    if config["domain"] == "personalizer":
+        return PersonalizerDomain(config.get("epsilon", 0.0), config.get("theta"))
+    if config["domain"] == "rl":
+        return RLDomain(config.get("epsilon", 0.0), config.get("agents"), config.get("smoothing", 10.0))
+    raise ValueError(f"Unknown log domain: {config['domain']}")
+
+
+# ============================================
+# Parallel Evaluation
+# ============================================
+
+# حالة كل عملية: النطاق (مع الوكلاء المحملين) يُبنى مرة واحدة في initializer
+_domain: Any = None
+_policies: List[str] = []
+
+
+def _init_worker(config: Dict[str, Any], model: Optional[RewardModel] = None) -> None:
+    global _domain, _policies
+    _domain = build_domain(config)
+    _domain.model = model
+    _policies = config.get("policies") or _domain.policies
+
+
+def _collect_shard(path: str) -> Dict[str, np.ndarray]:
+    batch = _domain.load(path)
+    return RewardModel.collect(batch["keys"], batch["actions"], batch["rewards"], _domain.n_actions)
+
+
+def _evaluate_shard(path: str) -> Tuple[float, Dict[str, Dict[str, float]]]:
+    batch = _domain.load(path)
+    predicted = _domain.model.predict(batch["keys"], batch["actions"], batch["rewards"])
+    sums = {
+        name: estimator_sums(
+            _domain.target(name, batch), batch["actions"], batch["propensities"], batch["rewards"], predicted
+        )
+        for name in _policies
+    }
+    return float(batch["rewards"].sum()), sums
+
+
+def _map(function: Any, paths: List[str], workers: int, initargs: Tuple) -> List[Any]:
+    """تشغيل دالة على كل شريحة (في العملية الحالية مع عامل واحد)"""
+    if workers <= 1:
+        _init_worker(*initargs)
+        return [function(path) for path in paths]
+
+    # fork أسرع على Linux (لا يعيد استيراد الوحدات)؛ spawn في غيره
+    context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    with context.Pool(workers, _init_worker, initargs) as pool:
+        return pool.map(function, paths, chunksize=1)
+
+
+def evaluate(config: Dict[str, Any], paths: List[str], workers: int = 1, shrinkage: float = 5.0) -> Dict[str, Any]:
+    """
+    تقييم السياسات المرشحة على شرائح السجل
+
+    Args:
+        config: domain (personalizer أو rl) و policies و epsilon وإعدادات النطاق
+        paths: مسارات الشرائح
+        workers: عدد العمليات
+        shrinkage: قوة انكماش r̂ نحو متوسط الإجراء
+
+    Returns:
+        Dict: تقديرات كل سياسة وسرعة التقييم
+    """
+    started = time.perf_counter()
+    parts = _map(_collect_shard, paths, workers, (config,))
+    n_actions = len(ACTIONS) if config["domain"] == "rl" else len(SCHEDULING_STRATEGIES)
+    model = RewardModel.from_parts(parts, n_actions, shrinkage)
+    fitted = time.perf_counter()
+
+    results = _map(_evaluate_shard, paths, workers, (config, model))
+    elapsed = time.perf_counter() - started
+
+    policies = list(results[0][1]) if results else []
+    events = int(model.counts.sum())
+    return {
+        "domain": config["domain"],
+        "shards": len(paths),
+        "events": events,
+        "workers": workers,
+        "loggedMeanReward": sum(total for total, _ in results) / events if events else 0.0,
+        "policies": {name: summarize(merge_sums([sums[name] for _, sums in results])) for name in policies},
+        "fitSeconds": fitted - started,
+        "seconds": elapsed,
+        # تقييم = (حدث، سياسة)، بالمرورين معاً
+        "evaluationsPerSec": events * len(policies) / elapsed if elapsed else 0.0,
+    }
+
+
+# ============================================
+# Main
+# ============================================
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Offline IPS / doubly-robust policy evaluation")
+    parser.add_argument("domain", choices=["personalizer", "rl"])
+    parser.add_argument("inputs", nargs="+", help="شرائح السجل (تدعم أنماط glob)")
+    parser.add_argument("--policies", help="السياسات مفصولة بفواصل (الافتراضي كل سياسات النطاق)")
+    parser.add_argument("--agent", action="append", default=[], help="لقطة وكيل RL مرشحة (تتكرر)")
+    parser.add_argument("--train", nargs="*", default=[], help="شرائح تدريب linucb المرشح (personalizer)")
+    parser.add_argument("--epsilon", type=float, default=0.0, help="استكشاف السياسات المرشحة")
+    parser.add_argument("--shrinkage", type=float, default=5.0)
+    parser.add_argument("--workers", default=str(mp.cpu_count()), help="عدد العمليات أو قائمة لقياس التوسع (1,2,4)")
+    parser.add_argument("--json", action="store_true", help="طباعة النتائج كـ JSON")
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.inputs for path in glob.glob(pattern)})
+    if not paths:
+        print("No log shards found")
+        return 1
+
+    config: Dict[str, Any] = {
+        "domain": args.domain,
+        "epsilon": args.epsilon,
+        "policies": args.policies.split(",") if args.policies else None,
+        "agents": args.agent,
+    }
+    if args.train:
+        train_paths = sorted({path for pattern in args.train for path in glob.glob(pattern)})
+        config["theta"] = train_linucb(train_paths)
+
+    reports = [evaluate(config, paths, int(workers), args.shrinkage) for workers in args.workers.split(",")]
+    if args.json:
+        print(json.dumps(reports, indent=2))
+        return 0
+
+    report = reports[-1]
+    print(f"{report['events']:,} events in {report['shards']} shards,"
+          f" logged mean reward {report['loggedMeanReward']:.4f}")
+    print(f"{'policy':<14}{'IPS':>9}{'±':>8}{'SNIPS':>9}{'DM':>9}{'DR':>9}{'±':>8}{'ESS':>10}")
+    for name, row in report["policies"].items():
+        print(f"{name:<14}{row['ips']:>9.4f}{row['ipsStderr']:>8.4f}{row['snips']:>9.4f}{row['dm']:>9.4f}"
+              f"{row['dr']:>9.4f}{row['drStderr']:>8.4f}{row['effectiveSampleSize']:>10,.0f}")
+    for row in reports:
+        print(f"workers={row['workers']:<3} {row['seconds']:.2f}s  {row['evaluationsPerSec']:,.0f} evaluations/s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
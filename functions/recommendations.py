@@ -5,11 +5,228 @@ Recommendations System
 
 from firebase_functions import https_fn, options
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from operator import itemgetter
+from typing import Callable, Dict, List, Any, Optional
+import heapq
 import logging
 
+from conditional import ResponseMemo, canonical_digest, conditional_response
+
 logger = logging.getLogger(__name__)
 
+# ذاكرة النتائج للردود المشروطة
+recommendations_memo = ResponseMemo()
+
+
+# ============================================
+# Recommendation Rules
+# ============================================
+
+# ساعات العمل المتأخر (مفاتيح completedByHour نصية)
+LATE_NIGHT_HOURS = tuple(str(h) for h in (22, 23, 0, 1, 2, 3))
+
+PRIORITY_ORDER = {"high": 0, "medium": 1, "low": 2}
+
+# جدول القواعد: الشرط يقرأ متجه الخصائص فقط (extract_features)، والنصوص قوالب
+# format على نفس الخصائص. قاعدة جديدة لا تضيف مروراً على بيانات السلوك؛ إن
+# احتاجت خاصية جديدة تُحسب في نفس حلقة extract_features
+RECOMMENDATION_RULES = [
+    # الجدولة
+    {
+        "id": "schedule-best-hours",
+        "type": "schedule",
+        "priority": "high",
+        "when": lambda f: f["bestHours"],
+        "title": "أفضل أوقات الإنتاجية",
+        "description": "بناءً على بياناتك، أنت أكثر إنتاجية في الساعة {bestHoursText}. ننصح بجدولة المهام المهمة في هذه الأوقات.",
+        "action": lambda f: {
+            "type": "suggest_schedule",
+            "params": {"preferredHours": f["bestHours"]}
+        },
+        "confidence": 0.85
+    },
+    {
+        "id": "schedule-avoid-hours",
+        "type": "schedule",
+        "priority": "medium",
+        "when": lambda f: f["worstHours"] and f["completionRate"] < 0.7,
+        "title": "تجنب هذه الأوقات",
+        "description": "لاحظنا أنك تواجه صعوبة في إكمال المهام في الساعة {worstHoursText}. حاول تجنب جدولة مهام مهمة في هذه الأوقات.",
+        "confidence": 0.75
+    },
+    # الإنتاجية
+    {
+        "id": "productivity-low",
+        "type": "productivity",
+        "priority": "high",
+        "when": lambda f: f["completionRate"] < 0.5,
+        "title": "تحسين معدل الإنجاز",
+        "description": "معدل إنجازك منخفض. جرب تقسيم المهام الكبيرة إلى مهام أصغر، أو استخدم تقنية بومودورو.",
+        "action": {
+            "type": "enable_pomodoro",
+            "params": {"duration": 25, "breakDuration": 5}
+        },
+        "confidence": 0.9
+    },
+    {
+        "id": "productivity-great",
+        "type": "productivity",
+        "priority": "low",
+        "when": lambda f: f["completionRate"] >= 0.8,
+        "title": "أداء ممتاز! 🎉",
+        "description": "معدل إنجازك {completionPercent}%! استمر على هذا المستوى.",
+        "confidence": 1.0
+    },
+    {
+        "id": "productivity-duration",
+        "type": "productivity",
+        "priority": "medium",
+        "when": lambda f: f["avgDuration"] > 90,
+        "title": "تقسيم المهام الطويلة",
+        "description": "متوسط مدة مهامك طويل. جرب تقسيمها إلى مهام أقصر (30-45 دقيقة) لتحسين التركيز.",
+        "confidence": 0.8
+    },
+    {
+        "id": "productivity-streak",
+        "type": "productivity",
+        "priority": "low",
+        "when": lambda f: f["streak"] >= 7,
+        "title": "سلسلة رائعة! {streak} أيام 🔥",
+        "description": "أنت ملتزم بشكل ممتاز! حافظ على هذا المستوى.",
+        "confidence": 1.0
+    },
+    # الصحة
+    {
+        "id": "wellness-sleep",
+        "type": "wellness",
+        "priority": "high",
+        "when": lambda f: f["lateNightTasks"] > 5,
+        "title": "احرص على النوم الكافي",
+        "description": "لاحظنا أنك تعمل في ساعات متأخرة بشكل متكرر. حاول إنهاء مهامك قبل الساعة 10 مساءً للحصول على نوم أفضل.",
+        "confidence": 0.85
+    },
+    {
+        "id": "wellness-breaks",
+        "type": "wellness",
+        "priority": "medium",
+        "when": lambda f: f["totalCompleted"] > 10,
+        "title": "لا تنسَ الاستراحات",
+        "description": "أنت نشيط جداً! تذكر أخذ فترات راحة قصيرة بين المهام للحفاظ على تركيزك وصحتك.",
+        "confidence": 0.7
+    },
+    # الأهداف
+    {
+        "id": "goal-set",
+        "type": "goal",
+        "priority": "medium",
+        "when": lambda f: f["streak"] < 3 and f["completionRate"] < 0.6,
+        "title": "حدد أهدافك",
+        "description": "ضع أهدافاً واضحة وقابلة للقياس لتحسين التزامك. ابدأ بهدف صغير: أكمل مهمة واحدة على الأقل يومياً.",
+        "action": {
+            "type": "set_goal",
+            "params": {"type": "daily_minimum", "value": 1}
+        },
+        "confidence": 0.8
+    },
+    {
+        "id": "goal-progress",
+        "type": "goal",
+        "priority": "low",
+        "when": lambda f: f["completionRate"] >= 0.7 and f["streak"] >= 5,
+        "title": "تقدم ملحوظ! 🌟",
+        "description": "أنت تحقق تقدماً رائعاً نحو أهدافك. ربما حان الوقت لتحدي نفسك بأهداف أكبر!",
+        "action": {
+            "type": "suggest_challenge",
+            "params": {"type": "increase_tasks"}
+        },
+        "confidence": 0.75
+    },
+]
+
+
+def _compile_text(template: str) -> Callable[[Dict[str, Any]], str]:
+    """قالب بخصائص ← format_map، ونص ثابت ← يُعاد كما هو"""
+    if "{" in template:
+        return template.format_map
+    return lambda features: template
+
+
+def _compile_action(action: Any) -> Optional[Callable[[Dict[str, Any]], Dict[str, Any]]]:
+    """إجراء ثابت ← نسخة جديدة لكل توصية (الرد قد يُخزَّن ويُعدَّل)، أو دالة على الخصائص"""
+    if action is None or callable(action):
+        return action
+    return lambda features: {"type": action["type"], "params": dict(action.get("params", {}))}
+
+
+class RuleEvaluator:
+    """
+    مقيّم القواعد المترجمة
+    
+    الأولوية والثقة ثابتتان لكل قاعدة، فالترتيب يُحسب مرة عند الترجمة (ترتيب
+    مستقر: القواعد المتساوية تبقى بترتيب الجدول) ويُخرج التقييم التوصيات مرتبة
+    بدون فرز لكل طلب.
+    """
+    
+    def __init__(self, rules: List[Dict[str, Any]]):
+        ordered = sorted(
+            rules,
+            key=lambda rule: (PRIORITY_ORDER.get(rule.get("priority", "low"), 2), -rule.get("confidence", 0))
+        )
+        self.rules = [
+            (
+                rule["when"],
+                rule["id"],
+                rule["type"],
+                rule["priority"],
+                _compile_text(rule["title"]),
+                _compile_text(rule["description"]),
+                _compile_action(rule.get("action")),
+                rule["confidence"],
+            )
+            for rule in ordered
+        ]
+    
+    def evaluate(self, features: Dict[str, Any], timestamp_ms: int) -> List[Dict[str, Any]]:
+        """
+        تقييم كل القواعد على متجه الخصائص
+        
+        Args:
+            features: ناتج extract_features
+            timestamp_ms: الطابع الزمني المشترك لمعرّفات التوصيات
+        
+        Returns:
+            List[Dict]: التوصيات المطابقة مرتبة حسب الأولوية والثقة
+        """
+        recommendations = []
+        for when, rule_id, rule_type, priority, title, description, action, confidence in self.rules:
+            if not when(features):
+                continue
+            
+            recommendation = {
+                "id": f"{rule_id}-{timestamp_ms}",
+                "type": rule_type,
+                "priority": priority,
+                "title": title(features),
+                "description": description(features),
+            }
+            if action is not None:
+                recommendation["action"] = action(features)
+            recommendation["confidence"] = confidence
+            recommendations.append(recommendation)
+        
+        return recommendations
+
+
+def top_hours(by_hour: Dict, k: int) -> List[int]:
+    """
+    أعلى k ساعات (عدد > 0) بكومة بدل فرز كامل
+    
+    nlargest مستقر مثل sorted(reverse=True)[:k]، فالساعات المتساوية تبقى
+    بترتيب القاموس. الساعات بعدد > 0 تسبق غيرها، فتصفية الفائزين تساوي
+    تصفية المدخلات، و int يُستدعى لـ k ساعات فقط.
+    """
+    return [int(h) for h, c in heapq.nlargest(k, by_hour.items(), key=itemgetter(1)) if c > 0]
+
 
 # ============================================
 # Recommendation Engine
@@ -18,6 +235,8 @@ logger = logging.getLogger(__name__)
 class RecommendationEngine:
     """محرك التوصيات"""
     
+    rules = RuleEvaluator(RECOMMENDATION_RULES)
+    
     @classmethod
     def generate_recommendations(cls, behavior: Dict[str, Any]) -> List[Dict[str, Any]]:
         """
@@ -29,223 +248,50 @@ class RecommendationEngine:
         Returns:
             List[Dict]: قائمة التوصيات
         """
-        recommendations = []
-        
-        # 1. توصيات الجدولة
-        schedule_recs = cls._get_schedule_recommendations(behavior)
-        recommendations.extend(schedule_recs)
-        
-        # 2. توصيات الإنتاجية
-        productivity_recs = cls._get_productivity_recommendations(behavior)
-        recommendations.extend(productivity_recs)
-        
-        # 3. توصيات الصحة
-        wellness_recs = cls._get_wellness_recommendations(behavior)
-        recommendations.extend(wellness_recs)
-        
-        # 4. توصيات الأهداف
-        goal_recs = cls._get_goal_recommendations(behavior)
-        recommendations.extend(goal_recs)
-        
-        # ترتيب حسب الأولوية والثقة
-        priority_order = {"high": 0, "medium": 1, "low": 2}
-        recommendations.sort(
-            key=lambda x: (priority_order.get(x.get("priority", "low"), 2), -x.get("confidence", 0))
-        )
-        
-        return recommendations
-    
-    @classmethod
-    def _get_schedule_recommendations(cls, behavior: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """توصيات تحسين الجدولة"""
-        recommendations = []
-        task_patterns = behavior.get("taskPatterns", {})
-        completion_rate = behavior.get("completionRate", 0)
-        
-        # إيجاد أفضل الساعات
-        completed_by_hour = task_patterns.get("completedByHour", {})
-        failed_by_hour = task_patterns.get("failedByHour", {})
-        
-        best_hours = cls._find_best_hours(completed_by_hour)
-        worst_hours = cls._find_worst_hours(failed_by_hour)
-        
-        if best_hours:
-            recommendations.append({
-                "id": f"schedule-best-hours-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "schedule",
-                "priority": "high",
-                "title": "أفضل أوقات الإنتاجية",
-                "description": f"بناءً على بياناتك، أنت أكثر إنتاجية في الساعة {cls._format_hours(best_hours)}. ننصح بجدولة المهام المهمة في هذه الأوقات.",
-                "action": {
-                    "type": "suggest_schedule",
-                    "params": {"preferredHours": best_hours}
-                },
-                "confidence": 0.85
-            })
-        
-        if worst_hours and completion_rate < 0.7:
-            recommendations.append({
-                "id": f"schedule-avoid-hours-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "schedule",
-                "priority": "medium",
-                "title": "تجنب هذه الأوقات",
-                "description": f"لاحظنا أنك تواجه صعوبة في إكمال المهام في الساعة {cls._format_hours(worst_hours)}. حاول تجنب جدولة مهام مهمة في هذه الأوقات.",
-                "confidence": 0.75
-            })
-        
-        return recommendations
+        features = cls.extract_features(behavior)
+        timestamp_ms = int(datetime.utcnow().timestamp() * 1000)
+        return cls.rules.evaluate(features, timestamp_ms)
     
     @classmethod
-    def _get_productivity_recommendations(cls, behavior: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """توصيات الإنتاجية"""
-        recommendations = []
-        completion_rate = behavior.get("completionRate", 0)
-        task_patterns = behavior.get("taskPatterns", {})
-        streak = behavior.get("streak", 0)
-        
-        if completion_rate < 0.5:
-            recommendations.append({
-                "id": f"productivity-low-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "productivity",
-                "priority": "high",
-                "title": "تحسين معدل الإنجاز",
-                "description": "معدل إنجازك منخفض. جرب تقسيم المهام الكبيرة إلى مهام أصغر، أو استخدم تقنية بومودورو.",
-                "action": {
-                    "type": "enable_pomodoro",
-                    "params": {"duration": 25, "breakDuration": 5}
-                },
-                "confidence": 0.9
-            })
-        elif completion_rate >= 0.8:
-            recommendations.append({
-                "id": f"productivity-great-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "productivity",
-                "priority": "low",
-                "title": "أداء ممتاز! 🎉",
-                "description": f"معدل إنجازك {round(completion_rate * 100)}%! استمر على هذا المستوى.",
-                "confidence": 1.0
-            })
-        
-        # تحسين مدة المهام
-        avg_duration = task_patterns.get("avgDuration", 0)
-        if avg_duration > 90:
-            recommendations.append({
-                "id": f"productivity-duration-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "productivity",
-                "priority": "medium",
-                "title": "تقسيم المهام الطويلة",
-                "description": "متوسط مدة مهامك طويل. جرب تقسيمها إلى مهام أقصر (30-45 دقيقة) لتحسين التركيز.",
-                "confidence": 0.8
-            })
+    def extract_features(cls, behavior: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        استخراج خصائص السلوك التي تقرأها القواعد (مرة واحدة لكل طلب)
         
-        # تحفيز الالتزام
-        if streak >= 7:
-            recommendations.append({
-                "id": f"productivity-streak-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "productivity",
-                "priority": "low",
-                "title": f"سلسلة رائعة! {streak} أيام 🔥",
-                "description": "أنت ملتزم بشكل ممتاز! حافظ على هذا المستوى.",
-                "confidence": 1.0
-            })
+        Args:
+            behavior: بيانات سلوك المستخدم
         
-        return recommendations
-    
-    @classmethod
-    def _get_wellness_recommendations(cls, behavior: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """توصيات الصحة"""
-        recommendations = []
+        Returns:
+            Dict: متجه الخصائص
+        """
         task_patterns = behavior.get("taskPatterns", {})
-        completed_by_hour = task_patterns.get("completedByHour", {})
-        
-        # فحص العمل في ساعات متأخرة
-        late_night_hours = [22, 23, 0, 1, 2, 3]
-        late_night_tasks = sum(completed_by_hour.get(str(h), 0) for h in late_night_hours)
-        
-        if late_night_tasks > 5:
-            recommendations.append({
-                "id": f"wellness-sleep-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "wellness",
-                "priority": "high",
-                "title": "احرص على النوم الكافي",
-                "description": "لاحظنا أنك تعمل في ساعات متأخرة بشكل متكرر. حاول إنهاء مهامك قبل الساعة 10 مساءً للحصول على نوم أفضل.",
-                "confidence": 0.85
-            })
-        
-        # فحص العمل المستمر
-        total_tasks = sum(completed_by_hour.values())
-        if total_tasks > 10:
-            recommendations.append({
-                "id": f"wellness-breaks-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "wellness",
-                "priority": "medium",
-                "title": "لا تنسَ الاستراحات",
-                "description": "أنت نشيط جداً! تذكر أخذ فترات راحة قصيرة بين المهام للحفاظ على تركيزك وصحتك.",
-                "confidence": 0.7
-            })
-        
-        return recommendations
-    
-    @classmethod
-    def _get_goal_recommendations(cls, behavior: Dict[str, Any]) -> List[Dict[str, Any]]:
-        """توصيات الأهداف"""
-        recommendations = []
         completion_rate = behavior.get("completionRate", 0)
-        streak = behavior.get("streak", 0)
-        
-        # اقتراح تحديد أهداف
-        if streak < 3 and completion_rate < 0.6:
-            recommendations.append({
-                "id": f"goal-set-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "goal",
-                "priority": "medium",
-                "title": "حدد أهدافك",
-                "description": "ضع أهدافاً واضحة وقابلة للقياس لتحسين التزامك. ابدأ بهدف صغير: أكمل مهمة واحدة على الأقل يومياً.",
-                "action": {
-                    "type": "set_goal",
-                    "params": {"type": "daily_minimum", "value": 1}
-                },
-                "confidence": 0.8
-            })
         
-        # الاحتفال بالتقدم
-        if completion_rate >= 0.7 and streak >= 5:
-            recommendations.append({
-                "id": f"goal-progress-{int(datetime.utcnow().timestamp() * 1000)}",
-                "type": "goal",
-                "priority": "low",
-                "title": "تقدم ملحوظ! 🌟",
-                "description": "أنت تحقق تقدماً رائعاً نحو أهدافك. ربما حان الوقت لتحدي نفسك بأهداف أكبر!",
-                "action": {
-                    "type": "suggest_challenge",
-                    "params": {"type": "increase_tasks"}
-                },
-                "confidence": 0.75
-            })
+        completed_by_hour = task_patterns.get("completedByHour", {})
+        best_hours = top_hours(completed_by_hour, 3)
+        worst_hours = top_hours(task_patterns.get("failedByHour", {}), 2)
         
-        return recommendations
+        return {
+            "completionRate": completion_rate,
+            "completionPercent": round(completion_rate * 100),
+            "streak": behavior.get("streak", 0),
+            "avgDuration": task_patterns.get("avgDuration", 0),
+            "totalCompleted": sum(completed_by_hour.values()),
+            "lateNightTasks": sum(completed_by_hour.get(h, 0) for h in LATE_NIGHT_HOURS),
+            "bestHours": best_hours,
+            "bestHoursText": cls._format_hours(best_hours),
+            "worstHours": worst_hours,
+            "worstHoursText": cls._format_hours(worst_hours),
+        }
     
     @staticmethod
     def _find_best_hours(completed_by_hour: Dict) -> List[int]:
         """إيجاد أفضل ساعات الإنجاز"""
-        entries = [
-            {"hour": int(h), "count": c}
-            for h, c in completed_by_hour.items()
-            if c > 0
-        ]
-        entries.sort(key=lambda x: x["count"], reverse=True)
-        return [e["hour"] for e in entries[:3]]
+        return top_hours(completed_by_hour, 3)
     
     @staticmethod
     def _find_worst_hours(failed_by_hour: Dict) -> List[int]:
         """إيجاد أسوأ ساعات الإنجاز"""
-        entries = [
-            {"hour": int(h), "count": c}
-            for h, c in failed_by_hour.items()
-            if c > 0
-        ]
-        entries.sort(key=lambda x: x["count"], reverse=True)
-        return [e["hour"] for e in entries[:2]]
+        return top_hours(failed_by_hour, 2)
     
     @staticmethod
     def _format_hours(hours: List[int]) -> str:
@@ -325,6 +371,7 @@ def getRecommendations(req: https_fn.CallableRequest) -> dict:
     
     المعاملات:
         behavior (dict): بيانات سلوك المستخدم
+        ifNoneMatch (str): آخر digest لدى العميل (اختياري)
     """
     if not req.auth:
         raise https_fn.HttpsError(
@@ -341,7 +388,9 @@ def getRecommendations(req: https_fn.CallableRequest) -> dict:
             message="بيانات السلوك مطلوبة"
         )
     
-    try:
+    digest = canonical_digest("getRecommendations", req.auth.uid, behavior)
+    
+    def compute() -> dict:
         logger.info(f"Generating recommendations for user {req.auth.uid}")
         
         behavior["userId"] = req.auth.uid
@@ -349,9 +398,11 @@ def getRecommendations(req: https_fn.CallableRequest) -> dict:
         
         return {
             "success": True,
-            "recommendations": recommendations,
-            "timestamp": datetime.utcnow().isoformat()
+            "recommendations": recommendations
         }
+    
+    try:
+        return conditional_response(recommendations_memo, digest, data.get("ifNoneMatch"), compute)
         
     except Exception as e:
         logger.error(f"Recommendation error: {e}")
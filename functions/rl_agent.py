@@ -3,11 +3,22 @@ Reinforcement Learning Agent (Q-Learning)
 نظام التعلم المعزز للتقويم الذكي
 """
 
-from firebase_functions import https_fn, options
+from firebase_functions import https_fn, options, scheduler_fn
+from collections import OrderedDict, deque
 from datetime import datetime
 from typing import Dict, List, Any, Optional, Tuple
+import hashlib
+import math
 import random
 import logging
+import os
+import re
+import threading
+import time
+
+import numpy as np
+
+from snapshots import SnapshotManager, snapshot_store_from_env, encode_snapshot, decode_snapshot
 
 logger = logging.getLogger(__name__)
 
@@ -41,205 +52,2089 @@ ACTIONS = [
 ]
 
 
+# كل ميزة تُقسم إلى 4 مستويات (2-bit) فتُضغط الحالة في عدد صحيح من 20-bit
+NUM_BINS = 4
+BITS_PER_FEATURE = 2
+STATE_SPACE_SIZE = NUM_BINS ** len(STATE_FEATURES)
+
+_FEATURE_SHIFTS = np.arange(len(STATE_FEATURES), dtype=np.int64) * BITS_PER_FEATURE
+
+
+def encode_state(state: List[float]) -> int:
+    """ضغط الحالة المستمرة في عدد صحيح (2-bit لكل ميزة)"""
+    code = 0
+    shift = 0
+    for value in state:
+        if value < 0.25:
+            pass
+        elif value < 0.5:
+            code |= 1 << shift
+        elif value < 0.75:
+            code |= 2 << shift
+        else:
+            code |= 3 << shift
+        shift += BITS_PER_FEATURE
+    return code
+
+
+def encode_states(states: np.ndarray) -> np.ndarray:
+    """ضغط مصفوفة حالات (n × features) دفعة واحدة"""
+    states = np.asarray(states, dtype=np.float64)
+    bins = np.clip(np.floor(np.nan_to_num(states, nan=1.0) * NUM_BINS), 0, NUM_BINS - 1).astype(np.int64)
+    return (bins << _FEATURE_SHIFTS).sum(axis=-1)
+
+
+# الحالات في ذاكرة التجارب تُخزن بدقة 256 مستوى (uint8)
+# والمستويات الأربعة للجدول هي البتان العلويان: q >> 6 == floor(value * 4)
+QUANT_LEVELS = 256
+
+
+def quantize_state(state: List[float]) -> List[int]:
+    """تحويل حالة واحدة إلى مستويات 0-255 (مسار سريع بدون NumPy)"""
+    return [
+        QUANT_LEVELS - 1 if not value < 1 else (int(value * QUANT_LEVELS) if value > 0 else 0)
+        for value in state
+    ]
+
+
+def quantize_states(states: np.ndarray) -> np.ndarray:
+    """تحويل مصفوفة حالات مستمرة (0-1) إلى uint8"""
+    scaled = np.array(states, dtype=np.float64) * QUANT_LEVELS
+    scaled[np.isnan(scaled)] = QUANT_LEVELS - 1
+    np.minimum(scaled, QUANT_LEVELS - 1, out=scaled)
+    np.maximum(scaled, 0, out=scaled)
+    return scaled.astype(np.uint8)
+
+
+def dequantize_states(quantized: np.ndarray) -> np.ndarray:
+    """إرجاع الحالات المستمرة (منتصف كل مستوى)"""
+    return (quantized.astype(np.float32) + 0.5) / QUANT_LEVELS
+
+
+def encode_quantized(quantized: np.ndarray) -> np.ndarray:
+    """رموز الجدول مباشرة من الحالات المضغوطة uint8"""
+    bins = (quantized >> 6).astype(np.int64)
+    return (bins << _FEATURE_SHIFTS).sum(axis=-1)
+
+
+# ============================================
+# Q-Table Storage
+# ============================================
+
+class QTable:
+    """
+    جدول Q مضغوط
+    فهرس open-addressing من رمز الحالة إلى صف، وقيم Q في مصفوفة float32
+    مع مصفوفات متوازية لعدد الزيارات ووقت آخر تحديث
+    
+    كاتب واحد وقراء بلا أقفال: الفهرس (slots, slot_rows, shift, mask) يُقرأ
+    ويُستبدل كمرجع واحد، والتوسيع يبني مصفوفات جديدة ثم ينشرها (copy-on-write)
+    """
+    
+    EMPTY = -1
+    
+    def __init__(self, n_actions: int, capacity: int = 1024):
+        self.n_actions = n_actions
+        self.size = 0
+        
+        self.codes = np.empty(capacity, dtype=np.int64)
+        self.values = np.zeros((capacity, n_actions), dtype=np.float32)
+        self.visits = np.zeros(capacity, dtype=np.uint32)
+        self.last_update = np.zeros(capacity, dtype=np.float64)
+        
+        self._index = self._new_index(capacity * 2)
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def __contains__(self, code: int) -> bool:
+        return self.find(code) != self.EMPTY
+    
+    @property
+    def nbytes(self) -> int:
+        """الذاكرة المستخدمة بالبايت"""
+        return (
+            self.codes.nbytes + self.values.nbytes + self.visits.nbytes
+            + self.last_update.nbytes + self._index[0].nbytes + self._index[1].nbytes
+        )
+    
+    # --- الفهرس ---
+    
+    @classmethod
+    def _new_index(cls, count: int) -> Tuple[np.ndarray, np.ndarray, int, int]:
+        bits = max(4, int(count - 1).bit_length())
+        slots = np.full(1 << bits, cls.EMPTY, dtype=np.int64)
+        slot_rows = np.zeros(1 << bits, dtype=np.int32)
+        return slots, slot_rows, 32 - bits, (1 << bits) - 1
+    
+    @staticmethod
+    def _hash(code: int, shift: int) -> int:
+        # Fibonacci hashing: البتات العليا من ضرب 32-bit
+        return ((code * 2654435761) & 0xFFFFFFFF) >> shift
+    
+    @staticmethod
+    def _hash_many(codes: np.ndarray, shift: int) -> np.ndarray:
+        hashed = (codes.astype(np.uint64) * np.uint64(2654435761)) & np.uint64(0xFFFFFFFF)
+        return (hashed >> np.uint64(shift)).astype(np.int64)
+    
+    def _place(self, code: int, row: int) -> None:
+        slots, slot_rows, shift, mask = self._index
+        slot = self._hash(code, shift)
+        while slots[slot] != self.EMPTY:
+            slot = (slot + 1) & mask
+        # الصف أولاً ثم الرمز: القارئ الذي يرى الرمز يرى صفه الصحيح
+        slot_rows[slot] = row
+        slots[slot] = code
+    
+    def _place_many(self, codes: np.ndarray, rows: np.ndarray, index: Optional[Tuple] = None) -> None:
+        """وضع رموز جديدة (غير مكررة) في الفهرس بعمليات مصفوفات"""
+        slots, slot_rows, shift, mask = index or self._index
+        targets = self._hash_many(codes, shift)
+        pending = np.arange(len(codes))
+        
+        while pending.size:
+            free = slots[targets[pending]] == self.EMPTY
+            # عند تزاحم عدة رموز على نفس الخانة الفارغة يفوز أولها
+            candidates = pending[free]
+            _, first = np.unique(targets[candidates], return_index=True)
+            placed = candidates[first]
+            slot_rows[targets[placed]] = rows[placed]
+            slots[targets[placed]] = codes[placed]
+            
+            done = np.zeros(len(codes), dtype=bool)
+            done[placed] = True
+            pending = pending[~done[pending]]
+            # المتبقية تنتقل للخانة التالية فقط إن كانت خانتها مشغولة
+            busy = pending[slots[targets[pending]] != self.EMPTY]
+            targets[busy] = (targets[busy] + 1) & mask
+    
+    def _grow(self, minimum: int = 0) -> None:
+        capacity = len(self.codes) * 2
+        while capacity < minimum:
+            capacity *= 2
+        
+        # بناء النسخة الجديدة كاملة ثم نشرها: المصفوفات أولاً ثم الفهرس،
+        # فالقارئ الذي يأخذ الفهرس الجديد يجد صفوفه في المصفوفات الجديدة
+        grown = {}
+        for name in ("codes", "values", "visits", "last_update"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.size] = old[:self.size]
+            grown[name] = new
+        
+        index = self._new_index(capacity * 2)
+        self._place_many(grown["codes"][:self.size], np.arange(self.size), index)
+        
+        for name, array in grown.items():
+            setattr(self, name, array)
+        self._index = index
+    
+    # --- البحث والإضافة ---
+    
+    def find(self, code: int) -> int:
+        """إرجاع صف الحالة أو EMPTY"""
+        slots, slot_rows, shift, mask = self._index
+        slot = self._hash(code, shift)
+        while True:
+            key = slots.item(slot)
+            if key == code:
+                return slot_rows.item(slot)
+            if key == self.EMPTY:
+                return self.EMPTY
+            slot = (slot + 1) & mask
+    
+    def find_many(self, codes: np.ndarray) -> np.ndarray:
+        """البحث عن مجموعة حالات بعمليات مصفوفات (EMPTY لغير الموجودة)"""
+        slots, slot_rows, shift, mask = self._index
+        codes = np.asarray(codes, dtype=np.int64)
+        targets = self._hash_many(codes, shift)
+        rows = np.full(len(codes), self.EMPTY, dtype=np.int64)
+        pending = np.arange(len(codes))
+        
+        while pending.size:
+            keys = slots[targets[pending]]
+            hit = keys == codes[pending]
+            rows[pending[hit]] = slot_rows[targets[pending[hit]]]
+            pending = pending[~hit & (keys != self.EMPTY)]
+            targets[pending] = (targets[pending] + 1) & mask
+        
+        return rows
+    
+    def insert(self, code: int) -> int:
+        """إرجاع صف الحالة مع إنشائه بقيم صفرية إن لم يوجد"""
+        row = self.find(code)
+        if row != self.EMPTY:
+            return row
+        
+        if self.size == len(self.codes):
+            self._grow()
+        
+        row = self.size
+        self.codes[row] = code
+        self.values[row] = 0.0
+        self.visits[row] = 0
+        self.last_update[row] = time.time()
+        self._place(code, row)
+        self.size += 1
+        return row
+    
+    def insert_many(self, codes: np.ndarray) -> np.ndarray:
+        """نسخة دفعية من insert"""
+        codes = np.asarray(codes, dtype=np.int64)
+        rows = self.find_many(codes)
+        missing = rows == self.EMPTY
+        
+        if missing.any():
+            new_codes = np.unique(codes[missing])
+            start = self.size
+            end = start + len(new_codes)
+            if end > len(self.codes):
+                self._grow(end)
+            
+            new_rows = np.arange(start, end)
+            self.codes[start:end] = new_codes
+            self.values[start:end] = 0.0
+            self.visits[start:end] = 0
+            self.last_update[start:end] = time.time()
+            self._place_many(new_codes, new_rows)
+            self.size = end
+            
+            rows[missing] = new_rows[np.searchsorted(new_codes, codes[missing])]
+        
+        return rows
+    
+    # --- اللقطات ---
+    
+    def to_arrays(self) -> Dict[str, np.ndarray]:
+        """المصفوفات المستخدمة فعلياً مع الفهرس (للحفظ في لقطة)"""
+        return {
+            "codes": self.codes[:self.size],
+            "values": self.values[:self.size],
+            "visits": self.visits[:self.size],
+            "last_update": self.last_update[:self.size],
+            "slots": self._index[0],
+            "slot_rows": self._index[1],
+        }
+    
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "QTable":
+        """
+        بناء جدول من مصفوفات لقطة بدون نسخ
+        (المصفوفات تبقى على الذاكرة المربوطة حتى أول توسيع)
+        """
+        values = arrays["values"]
+        table = cls.__new__(cls)
+        table.n_actions = values.shape[1]
+        table.size = len(values)
+        table.codes = arrays["codes"]
+        table.values = values
+        table.visits = arrays["visits"]
+        table.last_update = arrays["last_update"]
+        
+        slots = arrays["slots"]
+        bits = len(slots).bit_length() - 1
+        table._index = (slots, arrays["slot_rows"], 32 - bits, (1 << bits) - 1)
+        return table
+    
+    def merge(
+        self,
+        other: "QTable",
+        strategy: str = "visits",
+        baseline_visits: Optional[np.ndarray] = None
+    ) -> "QTable":
+        """
+        دمج هذا الجدول (المحلي) في جدول آخر (منشور) وإرجاع الناتج
+        
+        Args:
+            other: الجدول المنشور (يُعدَّل ويُرجع)
+            strategy: visits (متوسط مرجح بالزيارات) أو last_writer (الأحدث لكل حالة)
+            baseline_visits: زيارات الجدول المحلي عند آخر مزامنة
+                (حتى لا تُحسب الزيارات المشتركة مرتين)
+        
+        Returns:
+            QTable: الجدول المدموج
+        """
+        count = self.size
+        local_values = self.values[:count]
+        local_visits = self.visits[:count].astype(np.int64)
+        local_updated = self.last_update[:count]
+        
+        rows = other.insert_many(self.codes[:count])
+        
+        if strategy == "last_writer":
+            newer = local_updated >= other.last_update[rows]
+            other.values[rows[newer]] = local_values[newer]
+            other.visits[rows[newer]] = local_visits[newer]
+            other.last_update[rows[newer]] = local_updated[newer]
+            return other
+        
+        # زيارات المحلي الجديدة فقط منذ آخر مزامنة
+        own_visits = local_visits.copy()
+        if baseline_visits is not None:
+            synced = min(len(baseline_visits), count)
+            own_visits[:synced] -= baseline_visits[:synced].astype(np.int64)
+        np.maximum(own_visits, 0, out=own_visits)
+        
+        other_visits = other.visits[rows].astype(np.int64)
+        total = own_visits + other_visits
+        weighted = total > 0
+        
+        blended = (
+            own_visits[weighted, None] * local_values[weighted]
+            + other_visits[weighted, None] * other.values[rows[weighted]]
+        ) / total[weighted, None]
+        other.values[rows[weighted]] = blended
+        # حالات بلا زيارات في الطرفين تأخذ القيمة المحلية
+        other.values[rows[~weighted]] = local_values[~weighted]
+        other.visits[rows] = total
+        other.last_update[rows] = np.maximum(local_updated, other.last_update[rows])
+        return other
+
+
+# ============================================
+# Experience Replay
+# ============================================
+
+EXPERIENCE_DTYPE = np.dtype([
+    ("state", np.uint8, (len(STATE_FEATURES),)),
+    ("next_state", np.uint8, (len(STATE_FEATURES),)),
+    ("action", np.int8),
+    ("reward", np.float32),
+    ("done", np.bool_),
+])
+
+
+class SumTree:
+    """
+    شجرة مجاميع بتفرع FANOUT: المستوى 0 هو الأولويات وكل مستوى أعلى مجاميع
+    مجموعات من FANOUT عنصراً في المستوى الذي تحته
+    التفرع العالي يجعل العمق 3-4 مستويات فقط، فالسحب والتحديث O(log n)
+    بعدد ثابت صغير من عمليات المصفوفات لكل دفعة
+    """
+    
+    FANOUT = 32
+    
+    def __init__(self, capacity: int):
+        k = self.FANOUT
+        size = k
+        while size < capacity:
+            size *= k
+        
+        self.levels: List[np.ndarray] = []
+        while size >= 1:
+            self.levels.append(np.zeros(size, dtype=np.float64))
+            if size == 1:
+                break
+            size //= k
+    
+    @property
+    def total(self) -> float:
+        return float(self.levels[-1][0])
+    
+    def get(self, indices: np.ndarray) -> np.ndarray:
+        return self.levels[0][indices]
+    
+    def set(self, index: int, priority: float) -> None:
+        """تحديث ورقة واحدة (مسار سريع للإضافة الفردية)"""
+        k = self.FANOUT
+        self.levels[0][index] = priority
+        for level in range(1, len(self.levels)):
+            index //= k
+            children = self.levels[level - 1]
+            self.levels[level][index] = children[index * k:(index + 1) * k].sum()
+    
+    def update(self, indices: np.ndarray, priorities: np.ndarray) -> None:
+        """تحديث مجموعة أوراق ثم إعادة حساب آبائها مستوى بمستوى"""
+        indices = np.asarray(indices, dtype=np.int64)
+        if indices.size == 0:
+            return
+        
+        k = self.FANOUT
+        self.levels[0][indices] = priorities
+        # بعد الترتيب مرة واحدة تبقى الآباء مرتبة فيكفي حذف المتجاور المكرر
+        nodes = np.sort(indices)
+        for level in range(1, len(self.levels)):
+            nodes //= k
+            nodes = nodes[np.concatenate(([True], nodes[1:] != nodes[:-1]))]
+            self.levels[level][nodes] = self.levels[level - 1].reshape(-1, k)[nodes].sum(axis=1)
+    
+    def find(self, values: np.ndarray) -> np.ndarray:
+        """النزول من الجذر لكل قيمة في [0, total) وإرجاع فهارس الأوراق"""
+        k = self.FANOUT
+        values = np.array(values, dtype=np.float64)
+        nodes = np.zeros(len(values), dtype=np.int64)
+        
+        for level in range(len(self.levels) - 2, -1, -1):
+            cumulative = np.cumsum(self.levels[level].reshape(-1, k)[nodes], axis=1)
+            child = np.minimum((cumulative <= values[:, None]).sum(axis=1), k - 1)
+            offset = np.where(child > 0, cumulative[np.arange(len(nodes)), child - 1], 0)
+            values -= offset
+            nodes = nodes * k + child
+        
+        return nodes
+
+
+class ReplayBuffer:
+    """
+    ذاكرة تجارب دائرية بسعة ثابتة
+    الإضافة O(1) بالكتابة فوق أقدم تجربة، والسحب بعمليات مصفوفات
+    
+    مع prioritized=True يكون السحب متناسباً مع الأولوية (|TD| + eps)^alpha
+    عبر SumTree، والتجارب الجديدة تأخذ أعلى أولوية حتى تُسحب مرة على الأقل
+    """
+    
+    PRIORITY_EPS = 1e-3
+    
+    def __init__(self, capacity: int = 10000, prioritized: bool = False, alpha: float = 0.6):
+        self.capacity = capacity
+        self.data = np.zeros(capacity, dtype=EXPERIENCE_DTYPE)
+        self.size = 0
+        self.position = 0
+        
+        self.alpha = alpha
+        self.priorities: Optional[SumTree] = SumTree(capacity) if prioritized else None
+        self.max_priority = 1.0
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    def clear(self) -> None:
+        self.size = 0
+        self.position = 0
+        if self.priorities is not None:
+            for level in self.priorities.levels:
+                level[:] = 0
+            self.max_priority = 1.0
+    
+    def append(
+        self,
+        state: List[float],
+        action: int,
+        reward: float,
+        next_state: List[float],
+        done: bool
+    ) -> int:
+        """إضافة تجربة وإرجاع موقعها"""
+        index = self.position
+        self.data[index] = (
+            quantize_state(state),
+            quantize_state(next_state),
+            action,
+            reward,
+            done
+        )
+        if self.priorities is not None:
+            self.priorities.set(index, self.max_priority)
+        
+        self.position = (index + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return index
+    
+    def extend(self, batch: np.ndarray) -> np.ndarray:
+        """إضافة دفعة تجارب (مصفوفة EXPERIENCE_DTYPE) وإرجاع مواقعها"""
+        batch = batch[-self.capacity:]
+        indices = (self.position + np.arange(len(batch))) % self.capacity
+        self.data[indices] = batch
+        if self.priorities is not None:
+            self.priorities.update(indices, np.full(len(indices), self.max_priority))
+        
+        self.position = (self.position + len(batch)) % self.capacity
+        self.size = min(self.size + len(batch), self.capacity)
+        return indices
+    
+    def sample_indices(self, batch_size: int, rng: np.random.Generator) -> np.ndarray:
+        """سحب فهارس عشوائية (مع الإرجاع)"""
+        return rng.integers(0, self.size, size=batch_size)
+    
+    def sample(
+        self,
+        batch_size: int,
+        rng: np.random.Generator,
+        beta: float = 0.4
+    ) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """
+        سحب دفعة (متناسب مع الأولوية إن كانت مفعلة)
+        
+        Args:
+            batch_size: حجم الدفعة
+            rng: مولد الأرقام العشوائية
+            beta: أس أوزان importance sampling
+        
+        Returns:
+            Tuple: (الفهارس، أوزان IS أو None للسحب المنتظم)
+        """
+        if self.priorities is None:
+            return self.sample_indices(batch_size, rng), None
+        
+        # سحب طبقي: قيمة واحدة من كل شريحة متساوية من المجموع
+        total = self.priorities.total
+        segments = (np.arange(batch_size) + rng.random(batch_size)) * (total / batch_size)
+        indices = np.minimum(self.priorities.find(segments), self.size - 1)
+        
+        probabilities = self.priorities.get(indices) / total
+        weights = (self.size * probabilities) ** -beta
+        weights /= weights.max()
+        return indices, weights.astype(np.float32)
+    
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray) -> None:
+        """تحديث الأولويات من أخطاء TD"""
+        if self.priorities is None:
+            return
+        priorities = (np.abs(td_errors).astype(np.float64) + self.PRIORITY_EPS) ** self.alpha
+        self.priorities.update(indices, priorities)
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+    
+    def rewards(self) -> np.ndarray:
+        """المكافآت المخزنة حالياً"""
+        return self.data["reward"][:self.size]
+
+
+def pack_experiences(items: List[Tuple]) -> np.ndarray:
+    """
+    تحويل قائمة تجارب (state, action, reward, next_state, done[, user_id])
+    إلى مصفوفة EXPERIENCE_DTYPE
+    """
+    batch = np.zeros(len(items), dtype=EXPERIENCE_DTYPE)
+    if not items:
+        return batch
+    
+    states, actions, rewards, next_states, dones = list(zip(*items))[:5]
+    batch["state"] = quantize_states(states)
+    batch["next_state"] = quantize_states(next_states)
+    batch["action"] = actions
+    batch["reward"] = rewards
+    batch["done"] = dones
+    return batch
+
+
+def scatter_q_updates(
+    values: np.ndarray,
+    visits: np.ndarray,
+    rows: np.ndarray,
+    actions: np.ndarray,
+    errors: np.ndarray,
+    learning_rate: float
+) -> None:
+    """
+    تطبيق تحديثات TD على مصفوفة قيم (صفوف × إجراءات) بتجميع scatter-add
+    الخلية المكررة k مرة تأخذ متوسط أخطائها بمعدل 1 - (1 - lr)^k
+    كما لو طُبقت التحديثات تتابعياً (بدون تجاوز الهدف)
+    """
+    cells, inverse, counts = np.unique(
+        rows * values.shape[1] + actions, return_inverse=True, return_counts=True
+    )
+    mean_errors = np.bincount(inverse, weights=errors, minlength=len(cells)) / counts
+    rates = 1.0 - (1.0 - learning_rate) ** counts
+    values.reshape(-1)[cells] += (rates * mean_errors).astype(np.float32)
+    np.add.at(visits, rows, 1)
+
+
+def apply_q_updates(
+    table: QTable,
+    rows: np.ndarray,
+    actions: np.ndarray,
+    errors: np.ndarray,
+    learning_rate: float
+) -> None:
+    """تطبيق تحديثات TD على جدول Q مع وقت آخر تحديث"""
+    scatter_q_updates(table.values, table.visits, rows, actions, errors, learning_rate)
+    table.last_update[rows] = time.time()
+
+
+# ============================================
+# Running Statistics
+# ============================================
+
+class RunningStats:
+    """
+    إحصائيات المكافآت والإجراءات محدثة تدريجياً بكلفة O(1) لكل تجربة
+    
+    - عدد ومتوسط وتباين المكافآت (Welford، والدفعات تُدمج بصيغة Chan) و EWMA
+    - عدد مرات اختيار كل إجراء ومتوسط مكافأته
+    - نافذة آخر N تجربة: مصفوفة دائرية بمجاميع جارية تُطرح منها التجارب المستبدلة
+    - نافذة آخر ساعة: دلاء بالدقيقة تُصفّر عند إعادة استخدامها
+    """
+    
+    def __init__(
+        self,
+        action_ids: List[str],
+        window: int = 10000,
+        ewma_alpha: float = 0.01,
+        bucket_sec: int = 60,
+        buckets: int = 60
+    ):
+        n_actions = len(action_ids)
+        self.lock = threading.Lock()
+        self.action_ids = action_ids
+        self.ewma_alpha = ewma_alpha
+        self.started = time.time()
+        
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma: Optional[float] = None
+        self.updates = 0
+        self.selections = np.zeros(n_actions, dtype=np.int64)
+        self.action_counts = np.zeros(n_actions, dtype=np.int64)
+        self.action_sums = np.zeros(n_actions, dtype=np.float64)
+        
+        self.window_rewards = np.zeros(window, dtype=np.float64)
+        self.window_actions = np.zeros(window, dtype=np.int64)
+        self.window_size = 0
+        self.window_position = 0
+        self.window_sum = 0.0
+        self.window_sumsq = 0.0
+        self.window_action_counts = np.zeros(n_actions, dtype=np.int64)
+        self.window_action_sums = np.zeros(n_actions, dtype=np.float64)
+        
+        self.bucket_sec = bucket_sec
+        self.bucket_slots = np.full(buckets, -1, dtype=np.int64)
+        self.bucket_counts = np.zeros(buckets, dtype=np.int64)
+        self.bucket_sums = np.zeros(buckets, dtype=np.float64)
+        self.bucket_updates = np.zeros(buckets, dtype=np.int64)
+        self.bucket_action_counts = np.zeros((buckets, n_actions), dtype=np.int64)
+        self.bucket_action_sums = np.zeros((buckets, n_actions), dtype=np.float64)
+    
+    def _bucket(self, now: float) -> int:
+        slot = int(now // self.bucket_sec)
+        index = slot % len(self.bucket_slots)
+        if self.bucket_slots[index] != slot:
+            self.bucket_slots[index] = slot
+            self.bucket_counts[index] = 0
+            self.bucket_sums[index] = 0
+            self.bucket_updates[index] = 0
+            self.bucket_action_counts[index] = 0
+            self.bucket_action_sums[index] = 0
+        return index
+    
+    def record_selections(self, action_indices: Any) -> None:
+        """تسجيل الإجراءات المختارة عند التنبؤ"""
+        counts = np.bincount(np.asarray(action_indices, dtype=np.int64).ravel(), minlength=len(self.selections))
+        with self.lock:
+            self.selections += counts
+    
+    def record_updates(self, count: int, now: Optional[float] = None) -> None:
+        """تسجيل عدد تحديثات النموذج (تجارب جديدة أو من الذاكرة)"""
+        now = time.time() if now is None else now
+        with self.lock:
+            self.updates += count
+            self.bucket_updates[self._bucket(now)] += count
+    
+    def record(
+        self,
+        actions: np.ndarray,
+        rewards: np.ndarray,
+        now: Optional[float] = None,
+        timed: bool = True
+    ) -> None:
+        """
+        تسجيل دفعة تجارب (الإجراء والمكافأة)
+        
+        Args:
+            actions: فهارس الإجراءات
+            rewards: المكافآت
+            now: وقت التسجيل (الافتراضي الآن)
+            timed: False للتجارب القديمة (من لقطة) فلا تدخل نافذة آخر ساعة
+        """
+        actions = np.asarray(actions, dtype=np.int64).ravel()
+        rewards = np.asarray(rewards, dtype=np.float64).ravel()
+        if not len(rewards):
+            return
+        if len(rewards) == 1:
+            self._record_one(int(actions[0]), float(rewards[0]), now, timed)
+            return
+        
+        n_actions = len(self.selections)
+        action_counts = np.bincount(actions, minlength=n_actions)
+        action_sums = np.bincount(actions, weights=rewards, minlength=n_actions)
+        
+        with self.lock:
+            # Welford/Chan: دمج متوسط وتباين الدفعة مع الإجمالي
+            batch_mean = float(rewards.mean())
+            batch_m2 = float(((rewards - batch_mean) ** 2).sum())
+            total = self.count + len(rewards)
+            delta = batch_mean - self.mean
+            self.mean += delta * len(rewards) / total
+            self.m2 += batch_m2 + delta * delta * self.count * len(rewards) / total
+            self.count = total
+            
+            # EWMA متتابع بصيغة مغلقة: الأحدث بوزن alpha والأقدم بأوزان متناقصة
+            alpha = self.ewma_alpha
+            if self.ewma is None:
+                self.ewma = float(rewards[0])
+                rewards_tail = rewards[1:]
+            else:
+                rewards_tail = rewards
+            decay = (1 - alpha) ** np.arange(len(rewards_tail) - 1, -1, -1)
+            self.ewma = (1 - alpha) ** len(rewards_tail) * self.ewma + float(alpha * (decay * rewards_tail).sum())
+            
+            self.action_counts += action_counts
+            self.action_sums += action_sums
+            self._push_window(actions, rewards)
+            
+            if timed:
+                index = self._bucket(time.time() if now is None else now)
+                self.bucket_counts[index] += len(rewards)
+                self.bucket_sums[index] += float(rewards.sum())
+                self.bucket_action_counts[index] += action_counts
+                self.bucket_action_sums[index] += action_sums
+    
+    def _record_one(self, action: int, reward: float, now: Optional[float], timed: bool) -> None:
+        # مسار عددي لتجربة واحدة (عمليات numpy على مصفوفات بطول 1 أبطأ بعشرات المرات)
+        with self.lock:
+            self.count += 1
+            delta = reward - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (reward - self.mean)
+            self.ewma = reward if self.ewma is None else self.ewma + self.ewma_alpha * (reward - self.ewma)
+            self.action_counts[action] += 1
+            self.action_sums[action] += reward
+            
+            capacity = len(self.window_rewards)
+            position = self.window_position
+            if self.window_size == capacity:
+                old_action = int(self.window_actions[position])
+                old_reward = float(self.window_rewards[position])
+                self.window_sum -= old_reward
+                self.window_sumsq -= old_reward * old_reward
+                self.window_action_counts[old_action] -= 1
+                self.window_action_sums[old_action] -= old_reward
+            else:
+                self.window_size += 1
+            self.window_actions[position] = action
+            self.window_rewards[position] = reward
+            self.window_sum += reward
+            self.window_sumsq += reward * reward
+            self.window_action_counts[action] += 1
+            self.window_action_sums[action] += reward
+            self.window_position = (position + 1) % capacity
+            
+            if timed:
+                index = self._bucket(time.time() if now is None else now)
+                self.bucket_counts[index] += 1
+                self.bucket_sums[index] += reward
+                self.bucket_action_counts[index, action] += 1
+                self.bucket_action_sums[index, action] += reward
+    
+    def _push_window(self, actions: np.ndarray, rewards: np.ndarray) -> None:
+        capacity = len(self.window_rewards)
+        actions = actions[-capacity:]
+        rewards = rewards[-capacity:]
+        n_actions = len(self.selections)
+        
+        positions = (self.window_position + np.arange(len(rewards))) % capacity
+        # قبل الامتلاء تكون المواقع الأولى فارغة، وما بعدها يستبدل تجارب قديمة
+        replaced = positions[capacity - self.window_size:]
+        if len(replaced):
+            old_actions = self.window_actions[replaced]
+            old_rewards = self.window_rewards[replaced]
+            self.window_sum -= float(old_rewards.sum())
+            self.window_sumsq -= float((old_rewards ** 2).sum())
+            self.window_action_counts -= np.bincount(old_actions, minlength=n_actions)
+            self.window_action_sums -= np.bincount(old_actions, weights=old_rewards, minlength=n_actions)
+        
+        self.window_actions[positions] = actions
+        self.window_rewards[positions] = rewards
+        self.window_sum += float(rewards.sum())
+        self.window_sumsq += float((rewards ** 2).sum())
+        self.window_action_counts += np.bincount(actions, minlength=n_actions)
+        self.window_action_sums += np.bincount(actions, weights=rewards, minlength=n_actions)
+        
+        self.window_position = (self.window_position + len(rewards)) % capacity
+        self.window_size = min(self.window_size + len(rewards), capacity)
+    
+    def _action_means(self, counts: np.ndarray, sums: np.ndarray) -> Dict[str, Optional[float]]:
+        return {
+            action_id: (float(sums[index] / counts[index]) if counts[index] else None)
+            for index, action_id in enumerate(self.action_ids)
+        }
+    
+    def get_stats(self, now: Optional[float] = None) -> Dict[str, Any]:
+        """
+        الإحصائيات الحالية (كلفة ثابتة لا تعتمد على عدد التجارب)
+        
+        Returns:
+            Dict: rewards, actions, lastN, lastHour, updates
+        """
+        now = time.time() if now is None else now
+        with self.lock:
+            variance = self.m2 / (self.count - 1) if self.count > 1 else 0.0
+            
+            size = self.window_size
+            window_mean = self.window_sum / size if size else 0.0
+            window_variance = max(0.0, self.window_sumsq / size - window_mean ** 2) if size else 0.0
+            
+            slot = int(now // self.bucket_sec)
+            recent = (self.bucket_slots > slot - len(self.bucket_slots)) & (self.bucket_slots <= slot)
+            hour_count = int(self.bucket_counts[recent].sum())
+            hour_updates = int(self.bucket_updates[recent].sum())
+            hour_seconds = min(len(self.bucket_slots) * self.bucket_sec, max(now - self.started, 1.0))
+            
+            return {
+                "rewards": {
+                    "count": self.count,
+                    "mean": self.mean,
+                    "variance": variance,
+                    "std": math.sqrt(variance),
+                    "ewma": self.ewma if self.ewma is not None else 0.0
+                },
+                "actions": {
+                    action_id: {
+                        "selected": int(self.selections[index]),
+                        "feedback": int(self.action_counts[index]),
+                        "meanReward": (
+                            float(self.action_sums[index] / self.action_counts[index])
+                            if self.action_counts[index] else None
+                        )
+                    }
+                    for index, action_id in enumerate(self.action_ids)
+                },
+                "lastN": {
+                    "size": size,
+                    "capacity": len(self.window_rewards),
+                    "meanReward": window_mean,
+                    "std": math.sqrt(window_variance),
+                    "actionMeanReward": self._action_means(self.window_action_counts, self.window_action_sums)
+                },
+                "lastHour": {
+                    "count": hour_count,
+                    "meanReward": float(self.bucket_sums[recent].sum() / hour_count) if hour_count else 0.0,
+                    "updates": hour_updates,
+                    "updatesPerSec": hour_updates / hour_seconds,
+                    "actionMeanReward": self._action_means(
+                        self.bucket_action_counts[recent].sum(axis=0),
+                        self.bucket_action_sums[recent].sum(axis=0)
+                    )
+                },
+                "updates": self.updates,
+                "updatesPerSec": self.updates / max(now - self.started, 1.0)
+            }
+
+
+# ============================================
+# Q-Learning Agent
+# ============================================
+
+class QLearningAgent:
+    """Q-Learning Agent للتعلم المعزز"""
+    
+    AGENT_TYPE = "tabular"
+    
+    def __init__(
+        self,
+        learning_rate: float = 0.1,
+        discount_factor: float = 0.99,
+        epsilon: float = 0.2,
+        min_epsilon: float = 0.05,
+        epsilon_decay: float = 0.995,
+        replay_capacity: int = 10000,
+        prioritized: bool = True,
+        priority_alpha: float = 0.6,
+        priority_beta: float = 0.4,
+        priority_beta_increment: float = 0.0001
+    ):
+        # كل التعديلات (التعلم، ذاكرة التجارب، تبديل النموذج) تمر بهذا القفل؛
+        # التنبؤ يقرأ بدون قفل لأن الجدول ينشر فهرسه ومصفوفاته كمراجع كاملة
+        self.lock = threading.RLock()
+        self._init_model()
+        self.replay = ReplayBuffer(replay_capacity, prioritized, priority_alpha)
+        # نافذة آخر N بسعة الذاكرة حتى يبقى avgReward بمعناه السابق (متوسط الذاكرة)
+        self.running_stats = RunningStats([action["id"] for action in ACTIONS], window=replay_capacity)
+        # تصحيح importance sampling للسحب بالأولوية: β يبدأ 0.4 ويزداد حتى 1
+        # مع كل دفعة (Schaul et al.) فيزول انحياز السحب مع تقارب التعلم
+        self.priority_beta = priority_beta
+        self.priority_beta_increment = priority_beta_increment
+        self.rng = np.random.default_rng()
+        self.learning_rate = learning_rate
+        self.discount_factor = discount_factor
+        self.epsilon = epsilon
+        self.min_epsilon = min_epsilon
+        self.epsilon_decay = epsilon_decay
+    
+    def _init_model(self) -> None:
+        self.q_table = QTable(len(ACTIONS))
+    
+    def _discretize_state(self, state: List[float]) -> int:
+        """تحويل الحالة المستمرة إلى رمز صحيح (4 مستويات لكل ميزة)"""
+        return encode_state(state)
+    
+    def get_q_values(self, state: List[float]) -> List[float]:
+        """الحصول على Q-values للحالة"""
+        table = self.q_table
+        row = table.find(self._discretize_state(state))
+        
+        if row == QTable.EMPTY:
+            # تهيئة بقيم عشوائية صغيرة
+            return [random.random() * 0.1 for _ in ACTIONS]
+        
+        return table.values[row].tolist()
+    
+    def predict_quantized(self, quantized: np.ndarray, noise: bool = True) -> np.ndarray:
+        """
+        Q-values لمصفوفة حالات مضغوطة بعملية بحث واحدة
+        
+        Args:
+            quantized: حالات uint8 بالشكل (n, features)
+            noise: قيم عشوائية صغيرة للحالات غير المرئية (كما في get_q_values)
+        
+        Returns:
+            np.ndarray: (n, actions)
+        """
+        table = self.q_table
+        rows = table.find_many(encode_quantized(quantized))
+        known = rows != QTable.EMPTY
+        
+        if noise:
+            q_values = self.rng.random((len(rows), table.n_actions), dtype=np.float32) * np.float32(0.1)
+        else:
+            q_values = np.zeros((len(rows), table.n_actions), dtype=np.float32)
+        q_values[known] = table.values[rows[known]]
+        return q_values
+    
+    def select_action(
+        self,
+        state: List[float],
+        explore: bool = True,
+        q_values: Optional[List[float]] = None
+    ) -> Dict[str, Any]:
+        """
+        اختيار الإجراء باستخدام epsilon-greedy
+        
+        Args:
+            state: الحالة الحالية
+            explore: هل نستكشف أم نستغل
+            q_values: قيم محسوبة مسبقاً (مثل قيم سياسة المستخدم)
+        
+        Returns:
+            Dict: الإجراء المختار مع الثقة
+        """
+        if q_values is None:
+            q_values = self.get_q_values(state)
+        
+        if explore and random.random() < self.epsilon:
+            # استكشاف: اختيار عشوائي
+            action_index = random.randint(0, len(ACTIONS) - 1)
+        else:
+            # استغلال: أفضل إجراء
+            action_index = q_values.index(max(q_values))
+        self.running_stats.record_selections(action_index)
+        
+        max_q = max(q_values)
+        avg_q = sum(q_values) / len(q_values)
+        confidence = max(0, min(1, max_q - avg_q))
+        
+        return {
+            "actionIndex": action_index,
+            "action": ACTIONS[action_index],
+            "confidence": confidence
+        }
+    
+    def select_actions(self, q_values: np.ndarray, explore: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        نسخة select_action لمصفوفة Q-values (n × actions)
+        
+        Returns:
+            Tuple: (فهارس الإجراءات، الثقة لكل صف)
+        """
+        action_indices = q_values.argmax(axis=1)
+        if explore:
+            exploring = self.rng.random(len(q_values)) < self.epsilon
+            action_indices[exploring] = self.rng.integers(0, len(ACTIONS), int(exploring.sum()))
+        self.running_stats.record_selections(action_indices)
+        
+        confidence = np.clip(q_values.max(axis=1) - q_values.mean(axis=1), 0, 1)
+        return action_indices, confidence
+    
+    def update(
+        self,
+        state: List[float],
+        action_index: int,
+        reward: float,
+        next_state: List[float],
+        done: bool
+    ) -> None:
+        """
+        تحديث Q-values بناءً على التجربة
+        
+        Args:
+            state: الحالة الحالية
+            action_index: فهرس الإجراء
+            reward: المكافأة
+            next_state: الحالة التالية
+            done: هل انتهت الحلقة
+        """
+        with self.lock:
+            table = self.q_table
+            
+            # الحصول على صف الحالة الحالية (يُنشأ بقيم صفرية)
+            row = table.insert(self._discretize_state(state))
+            
+            # الحصول على أقصى Q-value للحالة التالية
+            next_row = table.find(self._discretize_state(next_state))
+            next_max_q = max(table.values[next_row].tolist()) if next_row != QTable.EMPTY else 0
+            
+            # Q-learning update
+            target = reward if done else reward + self.discount_factor * next_max_q
+            current_q = table.values.item(row, action_index)
+            table.values[row, action_index] = current_q + self.learning_rate * (target - current_q)
+            table.visits[row] += 1
+            table.last_update[row] = time.time()
+            self.running_stats.record_updates(1)
+            
+            # تقليل epsilon
+            self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
+    
+    def add_experience(self, experience: Dict[str, Any]) -> None:
+        """إضافة تجربة إلى الذاكرة الدائرية (تُستبدل أقدم تجربة عند الامتلاء)"""
+        with self.lock:
+            self.replay.append(
+                experience["state"],
+                experience["action"],
+                experience["reward"],
+                experience["nextState"],
+                experience["done"]
+            )
+            self.running_stats.record([experience["action"]], [experience["reward"]])
+    
+    def learn(self, batch: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        تحديث Q-values من دفعة تجارب بعمليات مصفوفات
+        
+        Args:
+            batch: مصفوفة EXPERIENCE_DTYPE
+            weights: أوزان importance sampling (اختياري)
+        
+        Returns:
+            np.ndarray: أخطاء TD قبل التحديث
+        """
+        with self.lock:
+            batch_size = len(batch)
+            actions = batch["action"].astype(np.int64)
+            
+            # صفوف الحالات الحالية (تُنشأ بقيم صفرية) والتالية
+            table = self.q_table
+            rows = table.insert_many(encode_quantized(batch["state"]))
+            next_rows = table.find_many(encode_quantized(batch["next_state"]))
+            values = table.values
+            
+            # أهداف TD لكل الدفعة
+            known = next_rows != QTable.EMPTY
+            next_max_q = np.zeros(batch_size, dtype=np.float32)
+            next_max_q[known] = values[next_rows[known]].max(axis=1)
+            next_max_q[batch["done"]] = 0
+            targets = batch["reward"] + np.float32(self.discount_factor) * next_max_q
+            td_errors = targets - values[rows, actions]
+            
+            errors = td_errors if weights is None else td_errors * weights
+            apply_q_updates(table, rows, actions, errors, self.learning_rate)
+            self.running_stats.record_updates(batch_size)
+            
+            # تقليل epsilon مرة واحدة لكل دفعة
+            self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
+            
+            return td_errors
+    
+    def train_batch(self, batch_size: int = 32) -> Dict[str, Any]:
+        """
+        التدريب على دفعة من التجارب
+        
+        Args:
+            batch_size: حجم الدفعة
+        
+        Returns:
+            Dict: عدد التجارب المدربة ومتوسط الخسارة
+        """
+        with self.lock:
+            if len(self.replay) < batch_size:
+                return {"trained": 0, "avgLoss": 0}
+            
+            # اختيار حسب الأولوية (أو عشوائي منتظم)
+            indices, weights = self.replay.sample(batch_size, self.rng, self.priority_beta)
+            td_errors = self.learn(self.replay.data[indices], weights)
+            
+            if weights is not None:
+                self.replay.update_priorities(indices, td_errors)
+                self.priority_beta = min(1.0, self.priority_beta + self.priority_beta_increment)
+            
+            return {
+                "trained": batch_size,
+                "avgLoss": float(np.abs(td_errors).mean())
+            }
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الوكيل (كلفة ثابتة: الإحصائيات محدثة تدريجياً)"""
+        table = self.q_table
+        running = self.running_stats.get_stats()
+        
+        return {
+            "qTableSize": len(table),
+            "qTableBytes": table.nbytes,
+            "occupancy": len(table) / len(table.codes),
+            "totalExperiences": len(self.replay),
+            "epsilon": self.epsilon,
+            "avgReward": running["lastN"]["meanReward"],
+            **running
+        }
+    
+    def get_action_scores(
+        self,
+        state: List[float],
+        q_values: Optional[List[float]] = None
+    ) -> Dict[str, float]:
+        """الحصول على نقاط جميع الإجراءات"""
+        if q_values is None:
+            q_values = self.get_q_values(state)
+        return {
+            action["id"]: q_values[idx]
+            for idx, action in enumerate(ACTIONS)
+        }
+    
+    # --- اللقطات ---
+    
+    def _model_arrays(self) -> Dict[str, np.ndarray]:
+        return {f"q_{name}": array for name, array in self.q_table.to_arrays().items()}
+    
+    def _load_model(self, arrays: Dict[str, np.ndarray]) -> None:
+        # الإسناد ذري: الطلبات الجارية تكمل على الجدول القديم
+        self.q_table = QTable.from_arrays({
+            name[2:]: array for name, array in arrays.items() if name.startswith("q_")
+        })
+    
+    def _merge_model(
+        self,
+        arrays: Dict[str, np.ndarray],
+        strategy: str,
+        baseline: Optional[np.ndarray]
+    ) -> None:
+        published = QTable.from_arrays({
+            name[2:]: array for name, array in arrays.items() if name.startswith("q_")
+        })
+        self.q_table = self.q_table.merge(published, strategy, baseline)
+    
+    def snapshot_baseline(
+        self,
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        """
+        عدادات الزيارات عند نقطة المزامنة (لدمج الزيارات الجديدة فقط لاحقاً)
+        
+        مع arrays: زيارات لقطة منشورة قبل دمجها. الجدول المدموج يبدأ بصفوفها
+        بنفس الترتيب، فتبقى محاذية له.
+        """
+        if arrays is not None:
+            return arrays["q_visits"].copy()
+        return self.q_table.visits[:len(self.q_table)].copy()
+    
+    def export_arrays(self) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+        """مصفوفات النموذج وذاكرة التجارب مع البيانات الوصفية"""
+        with self.lock:
+            arrays = self._model_arrays()
+            
+            replay = self.replay.data[:len(self.replay)]
+            for field in EXPERIENCE_DTYPE.names:
+                arrays[f"replay_{field}"] = replay[field]
+            
+            meta = {
+                "agentType": self.AGENT_TYPE,
+                "epsilon": self.epsilon,
+                "replayPosition": self.replay.position,
+                "actions": [action["id"] for action in ACTIONS],
+                "features": STATE_FEATURES,
+                "savedAt": datetime.utcnow().isoformat()
+            }
+            return arrays, meta
+    
+    def _check_layout(self, meta: Dict[str, Any]) -> None:
+        if meta.get("actions") != [action["id"] for action in ACTIONS] or meta.get("features") != STATE_FEATURES:
+            raise ValueError("Snapshot was written for a different action or feature layout")
+        if meta.get("agentType", "tabular") != self.AGENT_TYPE:
+            raise ValueError(f"Snapshot was written by a {meta.get('agentType')} agent")
+    
+    def _load_replay(self, arrays: Dict[str, np.ndarray], position: int) -> None:
+        count = len(arrays["replay_reward"])
+        # ترتيب الأقدم ثم الأحدث (extend يحتفظ بالأحدث فقط عند تجاوز السعة)
+        order = np.roll(np.arange(count), -position)
+        
+        batch = np.zeros(count, dtype=EXPERIENCE_DTYPE)
+        for field in EXPERIENCE_DTYPE.names:
+            batch[field] = arrays[f"replay_{field}"][order]
+        
+        self.replay.clear()
+        self.replay.extend(batch)
+        # تجارب اللقطة تدخل الإجماليات ونافذة آخر N فقط (ليست من الساعة الأخيرة)
+        self.running_stats.record(batch["action"], batch["reward"], timed=False)
+    
+    def load_arrays(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """استبدال حالة الوكيل بمحتوى لقطة"""
+        with self.lock:
+            self._check_layout(meta)
+            self._load_model(arrays)
+            self._load_replay(arrays, meta.get("replayPosition", 0))
+            self.epsilon = meta.get("epsilon", self.epsilon)
+    
+    def merge_arrays(
+        self,
+        arrays: Dict[str, np.ndarray],
+        meta: Dict[str, Any],
+        strategy: str = "visits",
+        baseline: Optional[np.ndarray] = None
+    ) -> None:
+        """
+        دمج لقطة منشورة مع النموذج المحلي
+        ذاكرة التجارب المحلية تبقى كما هي (كل نسخة تحفظ تجاربها)
+        """
+        with self.lock:
+            self._check_layout(meta)
+            self._merge_model(arrays, strategy, baseline)
+    
+    def load_table(self, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> None:
+        """استبدال النموذج فقط بإصدار منشور (للتنبؤ بدون فقدان التجارب المحلية)"""
+        with self.lock:
+            self._check_layout(meta)
+            self._load_model(arrays)
+            self.epsilon = meta.get("epsilon", self.epsilon)
+
+
+# ============================================
+# Linear Function Approximation
+# ============================================
+
+# ترميز البلاطات: لكل ميزة عدة شبكات (tilings) مزاحة، وكل شبكة تقسم
+# المستويات 0-255 إلى TILES خانة. الحالة تُفعّل خانة واحدة في كل شبكة
+TILINGS = 4
+TILES = 8
+_TILE_WIDTH = QUANT_LEVELS // TILES
+_TILING_OFFSETS = np.arange(TILINGS, dtype=np.int64) * (_TILE_WIDTH // TILINGS)
+# خانة إضافية لكل شبكة لأن الإزاحة تدفع أعلى القيم إلى خانة تاسعة
+_TILING_SIZE = TILES + 1
+_FEATURE_BASES = (
+    np.arange(len(STATE_FEATURES), dtype=np.int64)[:, None] * (TILINGS * _TILING_SIZE)
+    + np.arange(TILINGS, dtype=np.int64)[None, :] * _TILING_SIZE
+)
+TILE_FEATURES = len(STATE_FEATURES) * TILINGS * _TILING_SIZE + 1  # + bias
+BIAS_FEATURE = TILE_FEATURES - 1
+
+
+def tile_indices(quantized: np.ndarray) -> np.ndarray:
+    """
+    فهارس الخصائص النشطة لكل حالة مضغوطة
+    
+    Args:
+        quantized: حالات uint8 بالشكل (n, features)
+    
+    Returns:
+        np.ndarray: (n, features * TILINGS + 1) تشمل خاصية الانحياز
+    """
+    levels = quantized.astype(np.int64)[:, :, None]
+    bins = (levels + _TILING_OFFSETS) // _TILE_WIDTH
+    active = (_FEATURE_BASES + bins).reshape(len(quantized), -1)
+    bias = np.full((len(quantized), 1), BIAS_FEATURE, dtype=np.int64)
+    return np.concatenate((active, bias), axis=1)
+
+
+class LinearQAgent(QLearningAgent):
+    """
+    وكيل Q خطي على خصائص البلاطات
+    Q(s, a) = مجموع أوزان الخصائص النشطة للإجراء a، فالحالات غير المرئية
+    تأخذ قيماً من الحالات القريبة منها، والذاكرة O(الخصائص × الإجراءات)
+    """
+    
+    AGENT_TYPE = "linear"
+    
+    def _init_model(self) -> None:
+        self.weights = np.zeros((TILE_FEATURES, len(ACTIONS)), dtype=np.float32)
+        self.counts = np.zeros((TILE_FEATURES, len(ACTIONS)), dtype=np.uint32)
+        self.active_cells = 0
+    
+    def _q_values(self, active: np.ndarray) -> np.ndarray:
+        return self.weights[active].sum(axis=1)
+    
+    def get_q_values(self, state: List[float]) -> List[float]:
+        """الحصول على Q-values للحالة"""
+        active = tile_indices(np.array([quantize_state(state)], dtype=np.uint8))
+        return self._q_values(active)[0].tolist()
+    
+    def predict_quantized(self, quantized: np.ndarray, noise: bool = True) -> np.ndarray:
+        """Q-values لمصفوفة حالات مضغوطة (النموذج معرّف لكل الحالات فلا حاجة للضجيج)"""
+        return self._q_values(tile_indices(quantized))
+    
+    def update(
+        self,
+        state: List[float],
+        action_index: int,
+        reward: float,
+        next_state: List[float],
+        done: bool
+    ) -> None:
+        """تحديث الأوزان من تجربة واحدة"""
+        with self.lock:
+            self.learn(pack_experiences([(state, action_index, reward, next_state, done)]))
+    
+    def learn(self, batch: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        تحديث الأوزان بالتدرج شبه الخطي (semi-gradient) لدفعة تجارب
+        
+        Args:
+            batch: مصفوفة EXPERIENCE_DTYPE
+            weights: أوزان importance sampling (اختياري)
+        
+        Returns:
+            np.ndarray: أخطاء TD قبل التحديث
+        """
+        with self.lock:
+            actions = batch["action"].astype(np.int64)
+            active = tile_indices(batch["state"])
+            next_active = tile_indices(batch["next_state"])
+            
+            current_q = self._q_values(active)[np.arange(len(batch)), actions]
+            next_max_q = self._q_values(next_active).max(axis=1)
+            next_max_q[batch["done"]] = 0
+            td_errors = batch["reward"] + np.float32(self.discount_factor) * next_max_q - current_q
+            
+            errors = td_errors if weights is None else td_errors * weights
+            
+            # البلاطات الخشنة تتكرر في معظم الدفعة، ومجموع k خطوة يتجاوز الهدف ويتباعد:
+            # كل خلية تأخذ متوسط أخطائها بمعدل 1 - (1 - lr)^k كما في scatter_q_updates،
+            # مقسوماً على عدد الخصائص النشطة حتى لا يتجاوز مجموعها على Q(s, a) الخطأ نفسه
+            cells = (active * len(ACTIONS) + actions[:, None]).ravel()
+            size = self.weights.size
+            hits = np.bincount(cells, minlength=size)
+            touched = np.flatnonzero(hits)
+            sums = np.bincount(cells, weights=np.repeat(errors, active.shape[1]), minlength=size)[touched]
+            rates = (1.0 - (1.0 - self.learning_rate) ** hits[touched]) / active.shape[1]
+            self.active_cells += int((self.counts.reshape(-1)[touched] == 0).sum())
+            self.weights.reshape(-1)[touched] += (rates * sums / hits[touched]).astype(np.float32)
+            self.counts += hits.reshape(self.counts.shape).astype(np.uint32)
+            self.running_stats.record_updates(len(batch))
+            
+            self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
+            return td_errors
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """الحصول على إحصائيات الوكيل (كلفة ثابتة: الإحصائيات محدثة تدريجياً)"""
+        running = self.running_stats.get_stats()
+        
+        return {
+            "agentType": self.AGENT_TYPE,
+            "parameters": int(self.weights.size),
+            "modelBytes": int(self.weights.nbytes + self.counts.nbytes),
+            "occupancy": self.active_cells / self.weights.size,
+            "totalExperiences": len(self.replay),
+            "epsilon": self.epsilon,
+            "avgReward": running["lastN"]["meanReward"],
+            **running
+        }
+    
+    # --- اللقطات ---
+    
+    def _model_arrays(self) -> Dict[str, np.ndarray]:
+        return {"linear_weights": self.weights, "linear_counts": self.counts}
+    
+    def _load_model(self, arrays: Dict[str, np.ndarray]) -> None:
+        if arrays["linear_weights"].shape != (TILE_FEATURES, len(ACTIONS)):
+            raise ValueError("Snapshot was written with a different tile coding")
+        # نسخ لأن الأوزان تُحدَّث في مكانها
+        self.weights = arrays["linear_weights"].copy()
+        self.counts = arrays["linear_counts"].copy()
+        self.active_cells = int(np.count_nonzero(self.counts))
+    
+    def _merge_model(
+        self,
+        arrays: Dict[str, np.ndarray],
+        strategy: str,
+        baseline: Optional[np.ndarray]
+    ) -> None:
+        # last_writer: النسخة التي تنشر الآن هي الكاتب الأخير فتبقى أوزانها
+        if strategy == "last_writer":
+            return
+        
+        own = self.counts.astype(np.int64)
+        if baseline is not None:
+            own = np.maximum(own - baseline.astype(np.int64), 0)
+        other = arrays["linear_counts"].astype(np.int64)
+        total = own + other
+        
+        blended = np.where(
+            total > 0,
+            (own * self.weights + other * arrays["linear_weights"]) / np.maximum(total, 1),
+            self.weights
+        )
+        self.weights = blended.astype(np.float32)
+        self.counts = total.astype(np.uint32)
+        self.active_cells = int(np.count_nonzero(self.counts))
+    
+    def snapshot_baseline(
+        self,
+        arrays: Optional[Dict[str, np.ndarray]] = None,
+        meta: Optional[Dict[str, Any]] = None
+    ) -> np.ndarray:
+        if arrays is not None:
+            return arrays["linear_counts"].copy()
+        return self.counts.copy()
+
+
+AGENT_TYPES = {
+    QLearningAgent.AGENT_TYPE: QLearningAgent,
+    LinearQAgent.AGENT_TYPE: LinearQAgent,
+}
+
+
+def create_agent(agent_type: str = "tabular", **kwargs) -> QLearningAgent:
+    """
+    إنشاء وكيل حسب النوع
+    
+    Args:
+        agent_type: tabular (جدول Q) أو linear (تقريب خطي بالبلاطات)
+        **kwargs: معاملات الوكيل
+    
+    Returns:
+        QLearningAgent: الوكيل
+    """
+    if agent_type not in AGENT_TYPES:
+        raise ValueError(f"Unknown agent type: {agent_type}")
+    return AGENT_TYPES[agent_type](**kwargs)
+
+
 # ============================================
-# Q-Learning Agent
+# Per-User Policies
 # ============================================
 
-class QLearningAgent:
-    """Q-Learning Agent للتعلم المعزز"""
+class UserPolicyPool:
+    """
+    جداول Q صغيرة لكل مستخدم فوق الوكيل العام (prior)
+    
+    التقدير المدموج لكل حالة: (n·Q_user + k·Q_global) / (n + k)
+    حيث n زيارات المستخدم للحالة و k قوة الـ prior
+    
+    الجداول في LRU محدود بالبايتات؛ الأقل استخداماً يُكتب إلى المخزن (إن وُجد)
+    ويُحذف من الذاكرة ثم يُقرأ عند الحاجة
+    
+    القفل يحمي الـ LRU فقط؛ القراءة والكتابة من المخزن تتم خارجه
+    
+    التنبؤ (peek) لا ينتظر المخزن: المستخدم غير المحمّل يأخذ الـ prior والجدول
+    يُحمَّل في الخلفية، والجدول القديم يُخدم حتى تكتمل إعادة قراءته
+    """
+    
+    INITIAL_CAPACITY = 16
+    MAX_MISSES = 10000
+    MAX_BACKGROUND_LOADS = 8
     
     def __init__(
         self,
-        learning_rate: float = 0.1,
-        discount_factor: float = 0.99,
-        epsilon: float = 0.2,
-        min_epsilon: float = 0.05,
-        epsilon_decay: float = 0.995
+        n_actions: int,
+        store: Optional[Any] = None,
+        max_bytes: int = 64 * 1024 * 1024,
+        prior_strength: float = 5.0,
+        refresh_sec: float = 60
     ):
-        self.q_table: Dict[str, Dict[str, Any]] = {}
-        self.experiences: List[Dict[str, Any]] = []
-        self.learning_rate = learning_rate
-        self.discount_factor = discount_factor
-        self.epsilon = epsilon
-        self.min_epsilon = min_epsilon
-        self.epsilon_decay = epsilon_decay
+        self.n_actions = n_actions
+        self.store = store
+        self.max_bytes = max_bytes
+        self.prior_strength = prior_strength
+        self.refresh_sec = refresh_sec
+        
+        # userId -> {"table", "bytes", "loadedAt", "dirty"}
+        self.entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # المستخدمون بلا جدول في المخزن (حتى لا يُقرأ المخزن في كل تنبؤ)
+        self.misses: "OrderedDict[str, float]" = OrderedDict()
+        # جداول أُخرجت وما زالت تُكتب (تُعاد منها بدل قراءة نسخة أقدم)
+        self.spilling: Dict[str, QTable] = {}
+        # مستخدمون يُحمَّلون في الخلفية (حتى لا يُقرأ نفس الجدول مرتين)
+        self._loading: set = set()
+        self.bytes = 0
+        self.evictions = 0
+        self.loads = 0
+        
+        self.lock = threading.RLock()
+        self._learning = threading.Lock()
     
-    def _discretize_state(self, state: List[float]) -> str:
-        """تحويل الحالة المستمرة إلى مفتاح نصي"""
-        # تقسيم كل قيمة إلى 4 مستويات
-        bins = []
-        for value in state:
-            if value < 0.25:
-                bins.append(0)
-            elif value < 0.5:
-                bins.append(1)
-            elif value < 0.75:
-                bins.append(2)
-            else:
-                bins.append(3)
-        return "-".join(str(b) for b in bins)
+    def __len__(self) -> int:
+        return len(self.entries)
     
-    def get_q_values(self, state: List[float]) -> List[float]:
-        """الحصول على Q-values للحالة"""
-        key = self._discretize_state(state)
-        entry = self.q_table.get(key)
+    @staticmethod
+    def _key(user_id: str) -> str:
+        if re.fullmatch(r"[A-Za-z0-9_-]{1,128}", user_id):
+            return f"users/{user_id}"
+        return f"users/{hashlib.sha256(user_id.encode('utf-8')).hexdigest()}"
+    
+    # --- الذاكرة والتخزين ---
+    
+    def _load(self, user_id: str) -> Optional[QTable]:
+        """قراءة جدول من المخزن (تُستدعى بدون القفل)"""
+        if self.store is None:
+            return None
         
-        if not entry:
-            # تهيئة بقيم عشوائية صغيرة
-            return [random.random() * 0.1 for _ in ACTIONS]
+        with self.lock:
+            missed_at = self.misses.get(user_id)
+        if missed_at is not None and time.time() - missed_at < self.refresh_sec:
+            return None
+        
+        data = self.store.read_object(self._key(user_id))
         
-        return entry["values"]
+        with self.lock:
+            if data is None:
+                self.misses[user_id] = time.time()
+                self.misses.move_to_end(user_id)
+                while len(self.misses) > self.MAX_MISSES:
+                    self.misses.popitem(last=False)
+                return None
+            self.misses.pop(user_id, None)
+            self.loads += 1
+        
+        arrays, _ = decode_snapshot(data)
+        return QTable.from_arrays(arrays)
     
-    def select_action(
-        self,
-        state: List[float],
-        explore: bool = True
-    ) -> Dict[str, Any]:
+    def _write(self, user_id: str, table: QTable) -> None:
+        data = encode_snapshot(table.to_arrays(), {"userId": user_id, "savedAt": datetime.utcnow().isoformat()})
+        self.store.write_object(self._key(user_id), data)
+        with self.lock:
+            self.misses.pop(user_id, None)
+    
+    def _put(self, user_id: str, table: QTable, dirty: bool) -> List[Tuple[str, QTable]]:
+        """إضافة جدول إلى الـ LRU (تحت القفل) وإرجاع الجداول المطلوب كتابتها"""
+        previous = self.entries.pop(user_id, None)
+        if previous is not None:
+            self.bytes -= previous["bytes"]
+        
+        self.entries[user_id] = {"table": table, "bytes": table.nbytes, "loadedAt": time.time(), "dirty": dirty}
+        self.bytes += table.nbytes
+        return self._evict(keep=user_id)
+    
+    def _evict(self, keep: Optional[str] = None) -> List[Tuple[str, QTable]]:
+        """إخراج الأقل استخداماً حتى تعود الذاكرة تحت الحد"""
+        spills = []
+        while self.bytes > self.max_bytes and len(self.entries) > 1:
+            user_id, entry = next(iter(self.entries.items()))
+            if user_id == keep:
+                self.entries.move_to_end(user_id)
+                continue
+            
+            self.entries.pop(user_id)
+            self.bytes -= entry["bytes"]
+            self.evictions += 1
+            if entry["dirty"] and self.store is not None:
+                self.spilling[user_id] = entry["table"]
+                spills.append((user_id, entry["table"]))
+        return spills
+    
+    def _spill(self, spills: List[Tuple[str, QTable]]) -> None:
+        """كتابة الجداول المُخرجة (بدون القفل)"""
+        for user_id, table in spills:
+            try:
+                self._write(user_id, table)
+            except Exception as e:
+                logger.error(f"RL user policy spill error: {e}")
+            finally:
+                with self.lock:
+                    if self.spilling.get(user_id) is table:
+                        del self.spilling[user_id]
+    
+    def _stale(self, entry: Dict[str, Any]) -> bool:
+        # نسخ التنبؤ تعيد القراءة دورياً لأن المتعلم يحدّث الجداول في مكان آخر
+        return (
+            not entry["dirty"] and self.store is not None
+            and time.time() - entry["loadedAt"] > self.refresh_sec
+        )
+    
+    def get(self, user_id: str, create: bool = False) -> Optional[QTable]:
         """
-        اختيار الإجراء باستخدام epsilon-greedy
+        جدول المستخدم من الذاكرة أو المخزن
         
         Args:
-            state: الحالة الحالية
-            explore: هل نستكشف أم نستغل
+            user_id: معرف المستخدم
+            create: إنشاء جدول فارغ إن لم يوجد
         
         Returns:
-            Dict: الإجراء المختار مع الثقة
+            Optional[QTable]: الجدول أو None
         """
-        q_values = self.get_q_values(state)
+        spills = []
         
-        if explore and random.random() < self.epsilon:
-            # استكشاف: اختيار عشوائي
-            action_index = random.randint(0, len(ACTIONS) - 1)
-        else:
-            # استغلال: أفضل إجراء
-            action_index = q_values.index(max(q_values))
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and not self._stale(entry):
+                self.entries.move_to_end(user_id)
+                return entry["table"]
+            
+            spilled = self.spilling.get(user_id)
+            if spilled is not None:
+                spills = self._put(user_id, spilled, dirty=True)
         
-        max_q = max(q_values)
-        avg_q = sum(q_values) / len(q_values)
-        confidence = max(0, min(1, max_q - avg_q))
+        if spilled is not None:
+            self._spill(spills)
+            return spilled
         
-        return {
-            "actionIndex": action_index,
-            "action": ACTIONS[action_index],
-            "confidence": confidence
-        }
+        table = self._load(user_id)
+        
+        with self.lock:
+            current = self.entries.get(user_id)
+            if current is not None and (current is not entry or current["dirty"]):
+                # خيط آخر حمّل الجدول أو عدّله أثناء القراءة
+                self.entries.move_to_end(user_id)
+                table = current["table"]
+            elif table is not None:
+                spills = self._put(user_id, table, dirty=False)
+            elif current is not None:
+                self.entries.move_to_end(user_id)
+                table = current["table"]
+            elif create:
+                table = QTable(self.n_actions, capacity=self.INITIAL_CAPACITY)
+                spills = self._put(user_id, table, dirty=True)
+        
+        self._spill(spills)
+        return table
     
-    def update(
-        self,
-        state: List[float],
-        action_index: int,
-        reward: float,
-        next_state: List[float],
-        done: bool
-    ) -> None:
+    def peek(self, user_id: str) -> Optional[QTable]:
         """
-        تحديث Q-values بناءً على التجربة
+        جدول المستخدم للتنبؤ بدون قراءة المخزن في الطلب
         
-        Args:
-            state: الحالة الحالية
-            action_index: فهرس الإجراء
-            reward: المكافأة
-            next_state: الحالة التالية
-            done: هل انتهت الحلقة
+        مثل SnapshotManager.refresh_async للجدول العام: ما في الذاكرة يُعاد فوراً
+        (والقديم منه يُعاد تحميله في خيط خلفي)، والمستخدم غير المحمّل يأخذ None
+        (قيم الـ prior) حتى يكتمل تحميل جدوله
         """
-        key = self._discretize_state(state)
-        next_key = self._discretize_state(next_state)
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None:
+                self.entries.move_to_end(user_id)
+                if self._stale(entry):
+                    self._load_async(user_id)
+                return entry["table"]
+            
+            spilled = self.spilling.get(user_id)
+            if spilled is not None:
+                return spilled
+            
+            missed_at = self.misses.get(user_id)
+            if missed_at is not None and time.time() - missed_at < self.refresh_sec:
+                return None
         
-        # الحصول على Q-values الحالية
-        if key not in self.q_table:
-            self.q_table[key] = {
-                "values": [0.0] * len(ACTIONS),
-                "visits": 0,
-                "lastUpdate": datetime.utcnow().isoformat()
-            }
+        if self.store is not None:
+            self._load_async(user_id)
+        return None
+    
+    def _load_async(self, user_id: str) -> None:
+        with self.lock:
+            if user_id in self._loading or len(self._loading) >= self.MAX_BACKGROUND_LOADS:
+                return
+            self._loading.add(user_id)
         
-        entry = self.q_table[key]
+        def run():
+            try:
+                self.get(user_id)
+            except Exception as e:
+                logger.error(f"RL user policy load error: {e}")
+            finally:
+                with self.lock:
+                    self._loading.discard(user_id)
         
-        # الحصول على أقصى Q-value للحالة التالية
-        next_entry = self.q_table.get(next_key)
-        next_max_q = max(next_entry["values"]) if next_entry else 0
+        threading.Thread(target=run, daemon=True).start()
+    
+    def flush(self) -> int:
+        """كتابة الجداول المعدلة إلى المخزن"""
+        if self.store is None:
+            return 0
         
-        # Q-learning update
-        target = reward if done else reward + self.discount_factor * next_max_q
-        current_q = entry["values"][action_index]
-        entry["values"][action_index] = current_q + self.learning_rate * (target - current_q)
-        entry["visits"] += 1
-        entry["lastUpdate"] = datetime.utcnow().isoformat()
+        with self.lock:
+            dirty = [(user_id, entry) for user_id, entry in self.entries.items() if entry["dirty"]]
+            for _, entry in dirty:
+                entry["dirty"] = False
+                entry["loadedAt"] = time.time()
         
-        # تقليل epsilon
-        self.epsilon = max(self.min_epsilon, self.epsilon * self.epsilon_decay)
+        written = 0
+        for user_id, entry in dirty:
+            try:
+                self._write(user_id, entry["table"])
+                written += 1
+            except Exception as e:
+                entry["dirty"] = True
+                logger.error(f"RL user policy flush error: {e}")
+        return written
     
-    def add_experience(self, experience: Dict[str, Any]) -> None:
-        """إضافة تجربة إلى الذاكرة"""
-        self.experiences.append(experience)
+    # --- التنبؤ والتعلم ---
+    
+    def blend(self, table: Optional[QTable], prior: np.ndarray, quantized: np.ndarray) -> np.ndarray:
+        """دمج قيم المستخدم مع قيم الـ prior لمصفوفة حالات"""
+        if table is None or len(table) == 0:
+            return prior
         
-        # الاحتفاظ بآخر 10000 تجربة فقط
-        if len(self.experiences) > 10000:
-            self.experiences = self.experiences[-10000:]
+        rows = table.find_many(encode_quantized(quantized))
+        known = rows != QTable.EMPTY
+        visits = table.visits[rows[known]].astype(np.float32)[:, None]
+        
+        blended = prior.copy()
+        blended[known] = (
+            visits * table.values[rows[known]] + self.prior_strength * prior[known]
+        ) / (visits + self.prior_strength)
+        return blended
     
-    def train_batch(self, batch_size: int = 32) -> Dict[str, Any]:
-        """
-        التدريب على دفعة من التجارب
+    def q_values(self, prior_agent: QLearningAgent, user_id: Optional[str], state: List[float]) -> List[float]:
+        """Q-values مدموجة لحالة واحدة (قيم الوكيل العام إذا لم يكن للمستخدم جدول)"""
+        table = self.peek(user_id) if user_id else None
+        if table is None:
+            return prior_agent.get_q_values(state)
         
-        Args:
-            batch_size: حجم الدفعة
+        quantized = np.array([quantize_state(state)], dtype=np.uint8)
+        prior = prior_agent.predict_quantized(quantized)
+        return self.blend(table, prior, quantized)[0].tolist()
+    
+    def predict_quantized(
+        self,
+        prior_agent: QLearningAgent,
+        user_id: Optional[str],
+        quantized: np.ndarray
+    ) -> np.ndarray:
+        """Q-values مدموجة لمصفوفة حالات مضغوطة"""
+        prior = prior_agent.predict_quantized(quantized)
+        table = self.peek(user_id) if user_id else None
+        return self.blend(table, prior, quantized)
+    
+    def learn(
+        self,
+        prior_agent: QLearningAgent,
+        user_ids: List[Optional[str]],
+        batch: np.ndarray
+    ) -> int:
+        """
+        تحديث جداول المستخدمين من دفعة تجارب
+        الصفوف الجديدة تبدأ من قيم الـ prior والهدف يستخدم التقدير المدموج للحالة التالية
         
         Returns:
-            Dict: عدد التجارب المدربة ومتوسط الخسارة
+            int: عدد المستخدمين المحدّثين
         """
-        if len(self.experiences) < batch_size:
-            return {"trained": 0, "avgLoss": 0}
+        owners = np.array([user_id or "" for user_id in user_ids], dtype=object)
+        updated = 0
         
-        # اختيار عشوائي
-        indices = random.sample(range(len(self.experiences)), batch_size)
-        total_loss = 0
+        # متعلم واحد في كل مرة؛ التنبؤ يقرأ الجداول بدون انتظار
+        with self._learning:
+            for user_id in set(owners.tolist()) - {""}:
+                updated += self._learn_user(prior_agent, user_id, batch[owners == user_id])
         
-        for idx in indices:
-            exp = self.experiences[idx]
-            
-            # حساب TD error (الخسارة)
-            current_q = self.get_q_values(exp["state"])[exp["action"]]
-            next_max_q = 0 if exp["done"] else max(self.get_q_values(exp["nextState"]))
-            target = exp["reward"] + self.discount_factor * next_max_q
-            loss = abs(target - current_q)
-            total_loss += loss
-            
-            # التحديث
-            self.update(
-                exp["state"],
-                exp["action"],
-                exp["reward"],
-                exp["nextState"],
-                exp["done"]
-            )
+        return updated
+    
+    def _learn_user(self, prior_agent: QLearningAgent, user_id: str, user_batch: np.ndarray) -> int:
+        table = self.get(user_id, create=True)
+        
+        rows = table.insert_many(encode_quantized(user_batch["state"]))
+        fresh = table.visits[rows] == 0
+        if fresh.any():
+            table.values[rows[fresh]] = prior_agent.predict_quantized(user_batch["state"][fresh], noise=False)
         
+        next_prior = prior_agent.predict_quantized(user_batch["next_state"], noise=False)
+        next_max_q = self.blend(table, next_prior, user_batch["next_state"]).max(axis=1)
+        next_max_q[user_batch["done"]] = 0
+        
+        actions = user_batch["action"].astype(np.int64)
+        targets = user_batch["reward"] + np.float32(prior_agent.discount_factor) * next_max_q
+        apply_q_updates(table, rows, actions, targets - table.values[rows, actions], prior_agent.learning_rate)
+        
+        # الجدول قد يكبر فيُعاد حسابه ضمن حد الذاكرة
+        with self.lock:
+            spills = self._put(user_id, table, dirty=True)
+        self._spill(spills)
+        return 1
+    
+    def get_stats(self) -> Dict[str, Any]:
         return {
-            "trained": batch_size,
-            "avgLoss": total_loss / batch_size
+            "users": len(self.entries),
+            "bytes": self.bytes,
+            "maxBytes": self.max_bytes,
+            "evictions": self.evictions,
+            "loads": self.loads
         }
+
+
+# Global agent instance (RL_AGENT_TYPE=linear للتقريب الخطي)
+agent = create_agent(os.environ.get("RL_AGENT_TYPE", "tabular"))
+
+# لقطات مشتركة بين النسخ (تُفعّل بمتغيرات البيئة)
+snapshot_store = snapshot_store_from_env()
+snapshot_manager: Optional[SnapshotManager] = None
+
+if snapshot_store is not None:
+    snapshot_manager = SnapshotManager(
+        agent,
+        snapshot_store,
+        strategy=os.environ.get("RL_SNAPSHOT_MERGE", "visits"),
+        interval_sec=float(os.environ.get("RL_SNAPSHOT_INTERVAL_SEC", "300"))
+    )
+    try:
+        snapshot_manager.warm_load()
+    except Exception as e:
+        logger.error(f"RL snapshot load error: {e}")
+
+
+# ============================================
+# Actor / Learner Pipeline
+# ============================================
+
+class ExperienceQueue:
+    """
+    طابور تجارب بين طلبات التغذية الراجعة والمتعلم
+    الإضافة O(1) (deque آمن بين الخيوط) وتُسقط أقدم تجربة عند الامتلاء
+    """
     
-    def get_stats(self) -> Dict[str, Any]:
-        """الحصول على إحصائيات الوكيل"""
-        total_reward = sum(exp["reward"] for exp in self.experiences)
+    def __init__(self, capacity: int = 100000):
+        self.capacity = capacity
+        self.items: deque = deque(maxlen=capacity)
+        self.received = 0
+        self.dropped = 0
+        # العدادات قراءة-تعديل-كتابة فتحتاج قفلاً مع الطلبات المتزامنة
+        self._counting = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.items)
+    
+    def put(
+        self,
+        state: List[float],
+        action: int,
+        reward: float,
+        next_state: List[float],
+        done: bool,
+        user_id: Optional[str] = None
+    ) -> None:
+        with self._counting:
+            if len(self.items) == self.capacity:
+                self.dropped += 1
+            self.items.append((state, action, reward, next_state, done, user_id))
+            self.received += 1
+    
+    def requeue(self, items: List[Tuple]) -> None:
+        """إعادة تجارب لم تُرسل إلى مقدمة الطابور بترتيبها (عند فشل الإرسال)"""
+        with self._counting:
+            self.dropped += max(0, len(self.items) + len(items) - self.capacity)
+            self.items.extendleft(reversed(items))
+    
+    def drain(self, limit: Optional[int] = None) -> List[Tuple]:
+        """سحب حتى limit تجربة بترتيب وصولها"""
+        items = []
+        count = len(self.items) if limit is None else min(limit, len(self.items))
+        for _ in range(count):
+            try:
+                items.append(self.items.popleft())
+            except IndexError:
+                break
+        return items
+
+
+class Learner:
+    """
+    المتعلم: يسحب التجارب على دفعات صغيرة ويدرب الوكيل وينشر إصدارات جدول Q
+    
+    مع مخزن لقطات: نسخ التغذية الراجعة ترسل دفعات التجارب إلى طابور المخزن
+    والمتعلم المجدول (rlLearner) يسحبها. بدون مخزن: خيط خلفي في نفس النسخة
+    
+    الطلب يضيف للذاكرة فقط (بدون كتابة أو تعلم)، وخيط خلفي يرسل كل
+    ship_interval_sec أو عند اكتمال ship_size، فيقرأ المتعلم عدداً قليلاً من
+    الكائنات الكبيرة بدل كائن لكل تغذية راجعة (claim_batches يسحب 64 كائناً في
+    كل مرة). نافذة الفقد: ما لم يُرسل بعد (حتى ship_interval_sec، أو أكثر إذا
+    خنقت Cloud Functions المعالج بعد الرد) يضيع إذا أُغلقت النسخة، والإرسال
+    الفاشل يُعاد للطابور. بدون مخزن كل شيء (النموذج نفسه) في الذاكرة والخيط
+    الخلفي يتعلم كل ثانية أو عند اكتمال دفعة صغيرة
+    """
+    
+    def __init__(
+        self,
+        agent: QLearningAgent,
+        queue: ExperienceQueue,
+        store: Optional[Any] = None,
+        manager: Optional[SnapshotManager] = None,
+        user_policies: Optional[UserPolicyPool] = None,
+        name: str = "global",
+        micro_batch: int = 256,
+        replay_batches: int = 4,
+        ship_size: int = 256,
+        ship_interval_sec: float = 5
+    ):
+        self.agent = agent
+        self.queue = queue
+        self.store = store
+        self.manager = manager
+        self.user_policies = user_policies
+        self.name = name
+        self.micro_batch = micro_batch
+        self.replay_batches = replay_batches
+        self.ship_size = ship_size
+        self.ship_interval_sec = ship_interval_sec
+        
+        self.ingested = 0
+        self.steps = 0
+        self.shipped = 0
+        self.batches = 0
+        self.failed = 0
+        self._shipping = threading.Lock()
+        # دورة تعلم واحدة في كل مرة (الخيط الخلفي والمجدول قد يتزامنان)
+        self._stepping = threading.Lock()
+        self._starting = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+    
+    # --- جانب التغذية الراجعة (actor) ---
+    
+    def on_enqueue(self) -> None:
+        """يُستدعى بعد كل إضافة للطابور، داخل الطلب (ذاكرة فقط)"""
+        self.start_background()
+        due = self.ship_size if self.store is not None else self.micro_batch
+        if len(self.queue) >= due:
+            self._wake.set()
+    
+    def ship(self) -> int:
+        """إرسال محتوى الطابور المحلي إلى طابور المخزن بدفعات ship_size (الباقي يُعاد للطابور عند الفشل)"""
+        with self._shipping:
+            items = self.queue.drain()
+            position = 0
+            try:
+                while position < len(items):
+                    chunk = items[position:position + self.ship_size]
+                    batch = pack_experiences(chunk)
+                    arrays = {field: batch[field] for field in EXPERIENCE_DTYPE.names}
+                    meta = {"count": len(batch), "users": [item[5] for item in chunk]}
+                    self.store.push_batch(self.name, encode_snapshot(arrays, meta))
+                    position += len(chunk)
+                    self.batches += 1
+            except Exception:
+                self.queue.requeue(items[position:])
+                self.failed += 1
+                raise
+            finally:
+                self.shipped += position
+            return position
+    
+    # --- جانب المتعلم (learner) ---
+    
+    def collect(self, max_batches: int = 64) -> Tuple[np.ndarray, List[Optional[str]]]:
+        """
+        تجميع التجارب الجديدة من الطابور المحلي وطابور المخزن
+        
+        Returns:
+            Tuple: (مصفوفة التجارب، معرف المستخدم لكل تجربة)
+        """
+        items = self.queue.drain()
+        parts = [pack_experiences(items)]
+        users = [item[5] for item in items]
+        
+        if self.store is not None:
+            for data in self.store.claim_batches(self.name, max_batches):
+                try:
+                    arrays, meta = decode_snapshot(data)
+                except ValueError as e:
+                    logger.warning(f"Skipping invalid experience batch: {e}")
+                    continue
+                batch = np.zeros(len(arrays["reward"]), dtype=EXPERIENCE_DTYPE)
+                for field in EXPERIENCE_DTYPE.names:
+                    batch[field] = arrays[field]
+                parts.append(batch)
+                users.extend(meta.get("users") or [None] * len(batch))
+        
+        return np.concatenate(parts), users
+    
+    def step(self) -> Dict[str, Any]:
+        """
+        دورة تعلم واحدة: إضافة التجارب الجديدة والتعلم منها ثم دفعات من الذاكرة
+        
+        Returns:
+            Dict: عدد التجارب الجديدة والمدربة ومتوسط الخسارة
+        """
+        with self._stepping:
+            batch, users = self.collect()
+            losses = []
+            
+            if len(batch):
+                with self.agent.lock:
+                    self.agent.replay.extend(batch)
+                self.agent.running_stats.record(batch["action"], batch["reward"])
+                # القفل يُحرر بين الدفعات الصغيرة فلا ينتظر تبديل النموذج طويلاً
+                for start in range(0, len(batch), self.micro_batch):
+                    losses.append(np.abs(self.agent.learn(batch[start:start + self.micro_batch])))
+                
+                if self.user_policies is not None:
+                    self.user_policies.learn(self.agent, users, batch)
+                
+                for _ in range(self.replay_batches):
+                    result = self.agent.train_batch(self.micro_batch)
+                    if result["trained"]:
+                        losses.append(np.array([result["avgLoss"]]))
+            
+            self.ingested += len(batch)
+            self.steps += 1
+        
+        version = None
+        if self.manager is not None and len(batch):
+            version = self.manager.maybe_save()
         
         return {
-            "qTableSize": len(self.q_table),
-            "totalExperiences": len(self.experiences),
-            "epsilon": self.epsilon,
-            "avgReward": total_reward / len(self.experiences) if self.experiences else 0
+            "ingested": int(len(batch)),
+            "avgLoss": float(np.concatenate(losses).mean()) if losses else 0,
+            "version": version
         }
     
-    def get_action_scores(self, state: List[float]) -> Dict[str, float]:
-        """الحصول على نقاط جميع الإجراءات"""
-        q_values = self.get_q_values(state)
+    def start_background(self, interval_sec: float = 1.0) -> None:
+        """
+        تشغيل الخيط الخلفي: الإرسال كل ship_interval_sec مع مخزن مشترك،
+        أو التعلم كل interval_sec بدونه
+        """
+        if self._thread is not None and self._thread.is_alive():
+            return
+        
+        with self._starting:
+            # طلبان متزامنان قد يصلان هنا معاً؛ الثاني يجد الخيط قائماً
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._start_thread(self.ship_interval_sec if self.store is not None else interval_sec)
+    
+    def _start_thread(self, interval_sec: float) -> None:
+        def run():
+            while True:
+                self._wake.wait(interval_sec)
+                self._wake.clear()
+                try:
+                    if not len(self.queue):
+                        continue
+                    if self.store is not None:
+                        self.ship()
+                    else:
+                        self.step()
+                except Exception as e:
+                    logger.error(f"RL background learner error: {e}")
+        
+        self._thread = threading.Thread(target=run, name="rl-learner", daemon=True)
+        self._thread.start()
+    
+    def get_stats(self) -> Dict[str, Any]:
         return {
-            action["id"]: q_values[idx]
-            for idx, action in enumerate(ACTIONS)
+            "queued": len(self.queue),
+            "received": self.queue.received,
+            "dropped": self.queue.dropped,
+            "ingested": self.ingested,
+            "steps": self.steps,
+            "shipped": self.shipped,
+            "batches": self.batches,
+            "failed": self.failed,
+            "mode": "shared" if self.store is not None else "background"
         }
 
 
-# Global agent instance
-agent = QLearningAgent()
+# سياسات المستخدمين فوق الوكيل العام (RL_USER_POLICY_MAX_MB لحد الذاكرة)
+user_policies = UserPolicyPool(
+    len(ACTIONS),
+    snapshot_store,
+    max_bytes=int(float(os.environ.get("RL_USER_POLICY_MAX_MB", "64")) * 1024 * 1024)
+)
+
+experience_queue = ExperienceQueue()
+# RL_SHIP_SIZE و RL_SHIP_INTERVAL_SEC: حجم دفعات التجارب المرسلة وأقصى انتظار قبل الإرسال
+learner = Learner(
+    agent,
+    experience_queue,
+    snapshot_store,
+    snapshot_manager,
+    user_policies,
+    ship_size=int(os.environ.get("RL_SHIP_SIZE", "256")),
+    ship_interval_sec=float(os.environ.get("RL_SHIP_INTERVAL_SEC", "5"))
+)
+
+# الحد الأقصى للحالات في طلب rlPredictBatch
+MAX_PREDICT_BATCH = 200
 
 
 # ============================================
@@ -291,6 +2186,44 @@ def normalize_state(raw_state: Dict[str, float]) -> List[float]:
     return state
 
 
+# (القيمة الافتراضية، المقسوم، هل تُقص عند 1) لكل ميزة في normalize_state
+STATE_NORMALIZATION = {
+    "hour_of_day": (0, 23, False),
+    "day_of_week": (0, 6, False),
+    "user_energy_level": (0.5, 1, False),
+    "pending_tasks_count": (0, 20, True),
+    "completed_today_count": (0, 10, True),
+    "task_difficulty": (0.5, 1, False),
+    "task_duration_minutes": (30, 180, True),
+    "deadline_hours": (24, 168, True),
+    "streak_days": (0, 30, True),
+    "avg_completion_rate": (0.5, 1, False),
+}
+
+_FEATURE_DEFAULTS = [(key, STATE_NORMALIZATION[key][0]) for key in STATE_FEATURES]
+_FEATURE_SCALES = np.array([STATE_NORMALIZATION[key][1] for key in STATE_FEATURES], dtype=np.float64)
+_FEATURE_CAPPED = np.array([STATE_NORMALIZATION[key][2] for key in STATE_FEATURES])
+
+
+def normalize_states(raw_states: List[Dict[str, float]]) -> np.ndarray:
+    """
+    تطبيع مجموعة حالات خام دفعة واحدة (نفس نتائج normalize_state)
+    
+    Args:
+        raw_states: الحالات الخام
+    
+    Returns:
+        np.ndarray: مصفوفة (n × features) بقيم 0-1
+    """
+    matrix = np.array(
+        [[raw.get(key, default) for key, default in _FEATURE_DEFAULTS] for raw in raw_states],
+        dtype=np.float64
+    ).reshape(len(raw_states), len(STATE_FEATURES))
+    matrix /= _FEATURE_SCALES
+    matrix[:, _FEATURE_CAPPED] = np.minimum(matrix[:, _FEATURE_CAPPED], 1)
+    return matrix
+
+
 def calculate_reward(feedback: Dict[str, Any]) -> float:
     """
     حساب المكافأة من التغذية الراجعة
@@ -362,10 +2295,16 @@ def rlPredict(req: https_fn.CallableRequest) -> dict:
             message="الحالة مطلوبة"
         )
     
+    # تبديل جدول Q بأحدث إصدار نشره المتعلم (في الخلفية)
+    if snapshot_manager is not None:
+        snapshot_manager.refresh_async()
+    
     try:
         state = normalize_state(raw_state)
-        result = agent.select_action(state, explore)
-        action_scores = agent.get_action_scores(state)
+        # سياسة المستخدم مدموجة مع الوكيل العام (أو الوكيل العام وحده)
+        q_values = user_policies.q_values(agent, req.auth.uid, state)
+        result = agent.select_action(state, explore, q_values)
+        action_scores = agent.get_action_scores(state, q_values)
         
         logger.info(f"RL Prediction for user {req.auth.uid}: {result['action']['id']}")
         
@@ -386,6 +2325,82 @@ def rlPredict(req: https_fn.CallableRequest) -> dict:
         )
 
 
+@https_fn.on_call(
+    cors=options.CorsOptions(
+        cors_origins=["*"],
+        cors_methods=["POST", "OPTIONS"],
+    ),
+    memory=options.MemoryOption.MB_256,
+    timeout_sec=15
+)
+def rlPredictBatch(req: https_fn.CallableRequest) -> dict:
+    """
+    التنبؤ لمجموعة حالات في طلب واحد (مثل قائمة مهام)
+    
+    المعاملات:
+        states (list): الحالات (حتى MAX_PREDICT_BATCH)
+        explore (bool): هل نستكشف (اختياري، افتراضي True)
+    """
+    if not req.auth:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.UNAUTHENTICATED,
+            message="يجب تسجيل الدخول"
+        )
+    
+    data = req.data
+    raw_states = data.get("states") or []
+    explore = data.get("explore", True)
+    
+    if not isinstance(raw_states, list) or not raw_states:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            message="قائمة الحالات مطلوبة"
+        )
+    
+    if len(raw_states) > MAX_PREDICT_BATCH:
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INVALID_ARGUMENT,
+            message=f"الحد الأقصى {MAX_PREDICT_BATCH} حالة في الطلب"
+        )
+    
+    if snapshot_manager is not None:
+        snapshot_manager.refresh_async()
+    
+    try:
+        # تطبيع وضغط كمصفوفة ثم بحث واحد في الجدول لكل الحالات
+        quantized = quantize_states(normalize_states(raw_states))
+        q_values = user_policies.predict_quantized(agent, req.auth.uid, quantized)
+        action_indices, confidence = agent.select_actions(q_values, explore)
+        
+        action_ids = [action["id"] for action in ACTIONS]
+        predictions = [
+            {
+                "action": ACTIONS[action_index],
+                "actionIndex": action_index,
+                "confidence": row_confidence,
+                "actionScores": dict(zip(action_ids, row_scores))
+            }
+            for action_index, row_confidence, row_scores in zip(
+                action_indices.tolist(), confidence.tolist(), q_values.tolist()
+            )
+        ]
+        
+        logger.info(f"RL Batch prediction for user {req.auth.uid}: {len(predictions)} states")
+        
+        return {
+            "success": True,
+            "predictions": predictions,
+            "timestamp": datetime.utcnow().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"RL Batch prediction error: {e}")
+        raise https_fn.HttpsError(
+            code=https_fn.FunctionsErrorCode.INTERNAL,
+            message=f"خطأ في التنبؤ: {str(e)}"
+        )
+
+
 @https_fn.on_call(
     cors=options.CorsOptions(
         cors_origins=["*"],
@@ -446,28 +2461,16 @@ def rlFeedback(req: https_fn.CallableRequest) -> dict:
         # حساب المكافأة
         reward = calculate_reward(feedback)
         
-        # إضافة التجربة
-        experience = {
-            "state": state,
-            "action": action_index,
-            "reward": reward,
-            "nextState": next_state,
-            "done": done,
-            "timestamp": datetime.utcnow().isoformat(),
-            "userId": req.auth.uid
-        }
-        
-        agent.add_experience(experience)
-        
-        # تحديث الوكيل
-        agent.update(state, action_index, reward, next_state, done)
+        # إضافة التجربة للطابور (التدريب يتم في المتعلم)
+        experience_queue.put(state, action_index, reward, next_state, done, req.auth.uid)
+        learner.on_enqueue()
         
         logger.info(f"RL Feedback from user {req.auth.uid}: action={ACTIONS[action_index]['id']}, reward={reward}")
         
         return {
             "success": True,
             "reward": reward,
-            "stats": agent.get_stats(),
+            "queued": True,
             "timestamp": datetime.utcnow().isoformat()
         }
         
@@ -518,6 +2521,11 @@ def rlTrain(req: https_fn.CallableRequest) -> dict:
         
         avg_loss = total_loss / epochs if epochs > 0 else 0
         
+        # نشر نتيجة التدريب مباشرة للنسخ الأخرى
+        snapshot_version = None
+        if snapshot_manager is not None and total_trained:
+            snapshot_version = snapshot_manager.save()
+        
         logger.info(f"RL Training by user {req.auth.uid}: epochs={epochs}, trained={total_trained}")
         
         return {
@@ -526,6 +2534,7 @@ def rlTrain(req: https_fn.CallableRequest) -> dict:
             "batchSize": batch_size,
             "totalTrained": total_trained,
             "avgLoss": avg_loss,
+            "snapshotVersion": snapshot_version,
             "stats": agent.get_stats(),
             "timestamp": datetime.utcnow().isoformat()
         }
@@ -538,6 +2547,39 @@ def rlTrain(req: https_fn.CallableRequest) -> dict:
         )
 
 
+@scheduler_fn.on_schedule(
+    schedule="every 1 minutes",
+    memory=options.MemoryOption.MB_512,
+    timeout_sec=120
+)
+def rlLearner(event: scheduler_fn.ScheduledEvent) -> None:
+    """
+    المتعلم المجدول: سحب دفعات التجارب من طابور المخزن والتدريب ونشر إصدار جديد
+    (بدون مخزن مشترك يعمل المتعلم كخيط خلفي داخل نسخة التغذية الراجعة)
+    """
+    if snapshot_store is None:
+        logger.info("RL learner skipped: no snapshot store configured")
+        return
+    
+    started = time.perf_counter()
+    total = 0
+    
+    try:
+        # السحب حتى يفرغ الطابور أو ينتهي الوقت المخصص
+        while time.perf_counter() - started < 90:
+            result = learner.step()
+            total += result["ingested"]
+            if not result["ingested"]:
+                break
+        
+        version = snapshot_manager.save() if total else snapshot_manager.version
+        written = user_policies.flush()
+        logger.info(f"RL Learner: ingested={total}, version={version}, userPolicies={written}")
+        
+    except Exception as e:
+        logger.error(f"RL Learner error: {e}")
+
+
 @https_fn.on_call(
     cors=options.CorsOptions(
         cors_origins=["*"],
@@ -554,9 +2596,15 @@ def rlStats(req: https_fn.CallableRequest) -> dict:
             message="يجب تسجيل الدخول"
         )
     
+    stats = agent.get_stats()
+    stats["learner"] = learner.get_stats()
+    stats["userPolicies"] = user_policies.get_stats()
+    if snapshot_manager is not None:
+        stats["snapshot"] = snapshot_manager.get_stats()
+    
     return {
         "success": True,
-        "stats": agent.get_stats(),
+        "stats": stats,
         "actions": ACTIONS,
         "features": STATE_FEATURES,
         "timestamp": datetime.utcnow().isoformat()
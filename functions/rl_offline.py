@@ -0,0 +1,390 @@
+"""
+Offline RL Training
+تدريب دفعي لجدول Q من سجلات التجارب المصدّرة بعدة عمليات (Hogwild)
+
+الجدول كثيف (كل رموز الحالات 4^10 × الإجراءات) في ذاكرة مشتركة، وكل عملية
+تحدّث شريحتها من التجارب بدون أقفال؛ التحديثات متناثرة فالتعارض نادر.
+الناتج لقطة بنفس صيغة الوكيل (tabular) تُحمّل أو تُنشر كإصدار جديد.
+
+التشغيل من مجلد functions:
+    python -m rl_offline exports/*.snap --workers 4 --epochs 5 --output trained.snap
+    python -m rl_offline exports/*.snap --workers 1,2,4 --epochs 3   # قياس التوسع
+"""
+
+import argparse
+import glob
+import multiprocessing as mp
+import queue
+import sys
+import time
+from multiprocessing import shared_memory
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from rl_agent import (
+    ACTIONS, EXPERIENCE_DTYPE, STATE_SPACE_SIZE, QLearningAgent, QTable,
+    encode_quantized, scatter_q_updates
+)
+from snapshots import decode_snapshot, encode_snapshot, map_file, snapshot_store_from_env
+
+
+# ============================================
+# Experience Logs
+# ============================================
+
+# التجارب بعد ضغط الحالات إلى رموز الجدول (تُحسب مرة واحدة في العملية الرئيسية)
+TRAINING_DTYPE = np.dtype([
+    ("code", np.int32),
+    ("next_code", np.int32),
+    ("action", np.int8),
+    ("reward", np.float32),
+    ("done", np.bool_),
+])
+
+
+def load_experiences(paths: List[str]) -> np.ndarray:
+    """
+    قراءة تجارب من ملفات لقطات (ذاكرة التجارب replay_*) أو دفعات طابور
+
+    Args:
+        paths: مسارات الملفات
+
+    Returns:
+        np.ndarray: مصفوفة EXPERIENCE_DTYPE بترتيب الملفات
+    """
+    parts = []
+    for path in paths:
+        arrays, _ = decode_snapshot(map_file(path))
+        prefix = "replay_" if "replay_reward" in arrays else ""
+        if f"{prefix}reward" not in arrays:
+            raise ValueError(f"{path} does not contain experiences")
+
+        batch = np.zeros(len(arrays[f"{prefix}reward"]), dtype=EXPERIENCE_DTYPE)
+        for field in EXPERIENCE_DTYPE.names:
+            batch[field] = arrays[f"{prefix}{field}"]
+        parts.append(batch)
+
+    return np.concatenate(parts) if parts else np.zeros(0, dtype=EXPERIENCE_DTYPE)
+
+
+def to_training(experiences: np.ndarray) -> np.ndarray:
+    """تحويل التجارب إلى رموز جدول جاهزة للتحديث"""
+    training = np.zeros(len(experiences), dtype=TRAINING_DTYPE)
+    training["code"] = encode_quantized(experiences["state"])
+    training["next_code"] = encode_quantized(experiences["next_state"])
+    training["action"] = experiences["action"]
+    training["reward"] = experiences["reward"]
+    training["done"] = experiences["done"]
+    return training
+
+
+# ============================================
+# Shared Memory
+# ============================================
+
+def _create_shared(shape: Tuple[int, ...], dtype: Any) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    dtype = np.dtype(dtype)
+    size = max(1, int(np.prod(shape)) * dtype.itemsize)
+    block = shared_memory.SharedMemory(create=True, size=size)
+    array = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+    array.fill(0)
+    return block, array
+
+
+def _attach_shared(spec: Dict[str, Any]) -> Tuple[shared_memory.SharedMemory, np.ndarray]:
+    block = shared_memory.SharedMemory(name=spec["name"])
+    return block, np.ndarray(tuple(spec["shape"]), dtype=np.dtype(spec["dtype"]), buffer=block.buf)
+
+
+# ============================================
+# Hogwild Worker
+# ============================================
+
+def _worker(
+    worker_id: int,
+    workers: int,
+    specs: Dict[str, Dict[str, Any]],
+    settings: Dict[str, Any],
+    start: Any,
+    progress: Any
+) -> None:
+    """عملية تدريب: تمر على شريحتها من التجارب وتحدّث الجدول المشترك بدون أقفال"""
+    blocks = []
+    arrays = {}
+    for name, spec in specs.items():
+        block, array = _attach_shared(spec)
+        blocks.append(block)
+        arrays[name] = array
+
+    values, visits, data = arrays["values"], arrays["visits"], arrays["experiences"]
+    shard = np.arange(worker_id, len(data), workers)
+    rng = np.random.default_rng(settings["seed"] + worker_id)
+    batch_size = settings["batch_size"]
+    discount = np.float32(settings["discount"])
+
+    start.wait()
+    try:
+        for epoch in range(settings["epochs"]):
+            started = time.perf_counter()
+            loss = 0.0
+            rng.shuffle(shard)
+            for offset in range(0, len(shard), batch_size):
+                batch = data[shard[offset:offset + batch_size]]
+                actions = batch["action"].astype(np.int64)
+                rows = batch["code"].astype(np.int64)
+
+                next_max_q = values[batch["next_code"]].max(axis=1)
+                next_max_q[batch["done"]] = 0
+                td_errors = batch["reward"] + discount * next_max_q - values[rows, actions]
+
+                scatter_q_updates(values, visits, rows, actions, td_errors, settings["learning_rate"])
+                loss += float(np.abs(td_errors).sum())
+
+            progress.put((worker_id, epoch, len(shard), loss, time.perf_counter() - started))
+    finally:
+        del values, visits, data, arrays
+        for block in blocks:
+            block.close()
+
+
+# ============================================
+# Training
+# ============================================
+
+# فترة انتظار تقدم العمليات قبل فحص حالتها (عملية ماتت لا ترسل تقدماً أبداً)
+PROGRESS_POLL_SEC = 1.0
+
+
+def _check_workers(processes: List[Any]) -> None:
+    """رفع خطأ إذا فشلت عملية أو انتهت كلها قبل إرسال كل التقدم"""
+    failed = [process.exitcode for process in processes if process.exitcode]
+    if failed:
+        raise RuntimeError(f"Training worker failed with exit code {failed[0]}")
+    if all(process.exitcode is not None for process in processes):
+        raise RuntimeError("Training workers exited before reporting every epoch")
+
+
+def train(
+    experiences: np.ndarray,
+    workers: int = 4,
+    epochs: int = 5,
+    batch_size: int = 1024,
+    learning_rate: float = 0.1,
+    discount: float = 0.99,
+    initial: Optional[QTable] = None,
+    seed: int = 0,
+    verbose: bool = False
+) -> Tuple[np.ndarray, np.ndarray, Dict[str, Any]]:
+    """
+    تدريب جدول Q كثيف من التجارب بعدة عمليات
+
+    Args:
+        experiences: مصفوفة EXPERIENCE_DTYPE
+        workers: عدد العمليات
+        epochs: عدد المرات على كامل التجارب
+        batch_size: حجم الدفعة في كل تحديث
+        learning_rate: معدل التعلم
+        discount: معامل الخصم
+        initial: جدول بداية (اختياري، مثل جدول الإنتاج الحالي)
+        seed: بذرة خلط التجارب
+        verbose: طباعة الخسارة بعد كل دورة
+
+    Returns:
+        Tuple: (القيم الكثيفة، الزيارات، تقرير السرعة ومنحنى الخسارة)
+    """
+    n_actions = len(ACTIONS)
+    training = to_training(experiences)
+
+    values_block, values = _create_shared((STATE_SPACE_SIZE, n_actions), np.float32)
+    visits_block, visits = _create_shared((STATE_SPACE_SIZE,), np.uint32)
+    data_block, data = _create_shared((len(training),), TRAINING_DTYPE)
+    data[:] = training
+    blocks = [values_block, visits_block, data_block]
+
+    if initial is not None and len(initial):
+        codes = initial.codes[:len(initial)]
+        values[codes] = initial.values[:len(initial)]
+        visits[codes] = initial.visits[:len(initial)]
+
+    specs = {
+        name: {"name": block.name, "shape": list(array.shape), "dtype": array.dtype.descr if array.dtype.names else array.dtype.str}
+        for name, block, array in (
+            ("values", values_block, values),
+            ("visits", visits_block, visits),
+            ("experiences", data_block, data),
+        )
+    }
+    settings = {
+        "epochs": epochs,
+        "batch_size": batch_size,
+        "learning_rate": learning_rate,
+        "discount": discount,
+        "seed": seed,
+    }
+
+    # fork أسرع على Linux (لا يعيد استيراد الوحدات)؛ spawn في غيره
+    context = mp.get_context("fork" if "fork" in mp.get_all_start_methods() else "spawn")
+    start = context.Event()
+    progress = context.Queue()
+    processes = [
+        context.Process(target=_worker, args=(index, workers, specs, settings, start, progress))
+        for index in range(workers)
+    ]
+
+    try:
+        for process in processes:
+            process.start()
+
+        started = time.perf_counter()
+        start.set()
+
+        # تجميع تقدم العمليات: خسارة كل دورة = مجموع |TD| / عدد التجارب
+        epoch_loss = np.zeros(epochs)
+        epoch_count = np.zeros(epochs)
+        epoch_done = np.zeros(epochs)
+        worker_seconds = np.zeros(workers)
+        received = 0
+        while received < workers * epochs:
+            try:
+                worker_id, epoch, count, loss, seconds = progress.get(timeout=PROGRESS_POLL_SEC)
+            except queue.Empty:
+                # الخطأ يمر عبر finally فتُنهى العمليات الباقية وتُحرر الذاكرة المشتركة
+                _check_workers(processes)
+                continue
+            received += 1
+            epoch_loss[epoch] += loss
+            epoch_count[epoch] += count
+            epoch_done[epoch] = time.perf_counter() - started
+            worker_seconds[worker_id] += seconds
+            if verbose and epoch_count[epoch] == len(training):
+                print(f"  epoch {epoch + 1}/{epochs}: loss={epoch_loss[epoch] / len(training):.4f}"
+                      f" at {epoch_done[epoch]:.2f}s")
+
+        for process in processes:
+            process.join()
+        elapsed = time.perf_counter() - started
+
+        failed = [process.exitcode for process in processes if process.exitcode]
+        if failed:
+            raise RuntimeError(f"Training worker failed with exit code {failed[0]}")
+
+        total = len(training) * epochs
+        report = {
+            "workers": workers,
+            "experiences": len(training),
+            "epochs": epochs,
+            "seconds": elapsed,
+            "updatesPerSec": total / elapsed if elapsed else 0,
+            "workerUpdatesPerSec": [
+                float(len(range(index, len(training), workers)) * epochs / seconds) if seconds else 0.0
+                for index, seconds in enumerate(worker_seconds)
+            ],
+            "lossCurve": (epoch_loss / np.maximum(epoch_count, 1)).tolist(),
+            "visitedStates": int(np.count_nonzero(visits)),
+        }
+        return values.copy(), visits.copy(), report
+
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+        del values, visits, data
+        for block in blocks:
+            block.close()
+            block.unlink()
+
+
+def to_agent(values: np.ndarray, visits: np.ndarray, experiences: np.ndarray) -> QLearningAgent:
+    """
+    بناء وكيل من الجدول الكثيف (الحالات المزارة فقط) مع أحدث التجارب في ذاكرته
+    """
+    agent = QLearningAgent()
+    codes = np.flatnonzero(visits)
+
+    table = QTable(len(ACTIONS), capacity=max(1024, len(codes)))
+    rows = table.insert_many(codes)
+    table.values[rows] = values[codes]
+    table.visits[rows] = visits[codes]
+    agent.q_table = table
+
+    agent.replay.extend(experiences[-agent.replay.capacity:])
+    return agent
+
+
+def publish(agent: QLearningAgent, store: Any, name: str = "global") -> int:
+    """نشر الجدول المدرب كإصدار جديد (يستبدل المنشور ولا يُدمج معه)"""
+    arrays, meta = agent.export_arrays()
+    data = encode_snapshot(arrays, {**meta, "source": "offline"})
+
+    for _ in range(3):
+        version = store.latest_version(name) + 1
+        if store.save(name, version, data):
+            return version
+    raise RuntimeError("Could not publish offline snapshot (concurrent writers)")
+
+
+# ============================================
+# Main
+# ============================================
+
+def main(argv: List[str]) -> int:
+    parser = argparse.ArgumentParser(description="Offline Hogwild Q-table training")
+    parser.add_argument("inputs", nargs="+", help="ملفات التجارب (تدعم أنماط glob)")
+    parser.add_argument("--workers", default=str(mp.cpu_count()), help="عدد العمليات أو قائمة لقياس التوسع (1,2,4)")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--learning-rate", type=float, default=0.1)
+    parser.add_argument("--discount", type=float, default=0.99)
+    parser.add_argument("--init", help="لقطة وكيل للبدء منها بدلاً من جدول صفري")
+    parser.add_argument("--output", help="مسار لقطة الوكيل الناتجة")
+    parser.add_argument("--publish", action="store_true", help="نشر الناتج في مخزن اللقطات المحدد بالبيئة")
+    args = parser.parse_args(argv)
+
+    paths = sorted({path for pattern in args.inputs for path in glob.glob(pattern)})
+    experiences = load_experiences(paths)
+    print(f"Loaded {len(experiences):,} experiences from {len(paths)} files")
+    if not len(experiences):
+        return 1
+
+    initial = None
+    if args.init:
+        arrays, _ = decode_snapshot(map_file(args.init))
+        initial = QTable.from_arrays({name[2:]: array for name, array in arrays.items() if name.startswith("q_")})
+
+    values = visits = None
+    for workers in [int(value) for value in args.workers.split(",")]:
+        print(f"Training with {workers} worker(s)")
+        values, visits, report = train(
+            experiences,
+            workers=workers,
+            epochs=args.epochs,
+            batch_size=args.batch_size,
+            learning_rate=args.learning_rate,
+            discount=args.discount,
+            initial=initial,
+            verbose=True
+        )
+        print(f"  {report['updatesPerSec']:,.0f} updates/s in {report['seconds']:.2f}s"
+              f" ({report['visitedStates']:,} states)")
+
+    agent = to_agent(values, visits, experiences)
+
+    if args.output:
+        arrays, meta = agent.export_arrays()
+        with open(args.output, "wb") as f:
+            f.write(encode_snapshot(arrays, {**meta, "source": "offline"}))
+        print(f"Wrote {args.output}")
+
+    if args.publish:
+        store = snapshot_store_from_env()
+        if store is None:
+            print("RL_SNAPSHOT_BUCKET or RL_SNAPSHOT_DIR must be set to publish")
+            return 1
+        print(f"Published version {publish(agent, store)}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,245 @@
+"""
+RL User Simulator
+محاكاة مستخدمي التقويم لقياس سرعة تعلم الوكيل وأدائه بدون مستخدمين حقيقيين
+
+كل مستخدم له منحنى طاقة حسب الساعة، وفترة مفضلة، واحتمالات إكمال لكل إجراء
+من ACTIONS تعتمد على الطاقة والصعوبة والمدة والموعد النهائي. الحالات بنفس
+مفاتيح rlClient.buildState (تمر عبر normalize_state) والتغذية الراجعة بنفس
+مفاتيح calculate_reward، فالمكافأة المتوقعة لكل إجراء تُحسب بدقة لقياس الندم.
+"""
+
+import math
+import random
+from dataclasses import dataclass
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from rl_agent import ACTIONS, calculate_reward
+
+
+# ============================================
+# Profiles
+# ============================================
+
+ACTION_IDS = [action["id"] for action in ACTIONS]
+
+# الفترات التي تستهدفها إجراءات الجدولة (ساعة البداية، ساعة النهاية)
+PERIODS = {
+    "schedule_morning": (8, 12),
+    "schedule_afternoon": (12, 17),
+    "schedule_evening": (17, 21),
+}
+
+# JavaScript getDay: الأحد = 0
+WEEKEND_DAYS = (5, 6)
+
+
+@dataclass
+class UserProfile:
+    """خصائص مستخدم محاكى"""
+    peak_hour: float            # ساعة ذروة الطاقة
+    base_energy: float          # متوسط الطاقة (0-1)
+    energy_amplitude: float     # تذبذب الطاقة خلال اليوم
+    reliability: float          # ميل الإكمال الأساسي (logit)
+    preferred_period: str       # إجراء الفترة المفضلة من PERIODS
+    likes_pomodoro: bool
+    weekend_worker: bool
+    tasks_per_day: float
+
+
+def random_profile(rng: random.Random) -> UserProfile:
+    """مستخدم عشوائي: صباحي أو مسائي، منضبط أو متأخر"""
+    preferred_period = rng.choice(list(PERIODS))
+    start, end = PERIODS[preferred_period]
+    return UserProfile(
+        peak_hour=rng.uniform(start, end),
+        base_energy=rng.uniform(0.4, 0.65),
+        energy_amplitude=rng.uniform(0.15, 0.35),
+        reliability=rng.gauss(0.2, 0.5),
+        preferred_period=preferred_period,
+        likes_pomodoro=rng.random() < 0.5,
+        weekend_worker=rng.random() < 0.3,
+        tasks_per_day=rng.uniform(3, 10),
+    )
+
+
+def _sigmoid(value: float) -> float:
+    return 1.0 / (1.0 + math.exp(-value))
+
+
+# ============================================
+# Simulated User
+# ============================================
+
+class SimulatedUser:
+    """مستخدم واحد: ساعة ويوم ومهام معلقة ومهمة حالية"""
+
+    def __init__(self, profile: UserProfile, rng: random.Random):
+        self.profile = profile
+        self.rng = rng
+        self.hour = rng.uniform(7, 22)
+        self.day = rng.randrange(7)
+        self.pending = rng.randint(1, 10)
+        self.completed_today = 0
+        self.streak = rng.randint(0, 10)
+        self.completion_rate = 0.5
+        self._new_task()
+
+    def _new_task(self) -> None:
+        self.difficulty = self.rng.betavariate(2, 2)
+        self.duration = self.rng.choice([15, 30, 45, 60, 90, 120, 180])
+        self.deadline = self.rng.choice([2, 6, 12, 24, 48, 96, 168])
+
+    def energy_at(self, hour: float) -> float:
+        profile = self.profile
+        phase = 2 * math.pi * (hour - profile.peak_hour) / 24
+        return min(1.0, max(0.0, profile.base_energy + profile.energy_amplitude * math.cos(phase)))
+
+    def observe(self) -> Dict[str, Any]:
+        """الحالة الخام بنفس مفاتيح rlClient.buildState"""
+        return {
+            "hour_of_day": int(self.hour) % 24,
+            "day_of_week": self.day,
+            "user_energy_level": round(self.energy_at(self.hour), 3),
+            "pending_tasks_count": self.pending,
+            "completed_today_count": self.completed_today,
+            "task_difficulty": round(self.difficulty, 3),
+            "task_duration_minutes": self.duration,
+            "deadline_hours": self.deadline,
+            "streak_days": self.streak,
+            "avg_completion_rate": round(self.completion_rate, 3),
+        }
+
+    # --- نموذج الاستجابة ---
+
+    def _delay_hours(self, action_id: str) -> float:
+        """الساعات حتى تنفيذ المهمة حسب الإجراء"""
+        if action_id in PERIODS:
+            start, _ = PERIODS[action_id]
+            return (start - self.hour) % 24
+        if action_id == "schedule_weekend":
+            days = min((weekend - self.day) % 7 for weekend in WEEKEND_DAYS)
+            return days * 24 + 10
+        return 0.0
+
+    def outcome_probabilities(self, action_id: str) -> Tuple[float, float, float]:
+        """
+        احتمالات النتيجة لإجراء
+
+        Returns:
+            Tuple: (إكمال، في الوقت بشرط الإكمال، إعادة جدولة بشرط عدم الإكمال)
+        """
+        profile = self.profile
+        delay = self._delay_hours(action_id)
+        energy = self.energy_at(self.hour + delay)
+
+        logit = profile.reliability + 1.5 * (energy - 0.5) - 1.2 * (self.difficulty - 0.5)
+
+        if action_id == "schedule_now":
+            logit += 0.4 if self.deadline <= 12 else 0.0
+        elif action_id in PERIODS:
+            logit += 0.6 if action_id == profile.preferred_period else -0.3
+        elif action_id == "schedule_weekend":
+            logit += 0.5 if profile.weekend_worker else -0.6
+        elif action_id == "break_into_subtasks":
+            logit += 1.4 * (self.difficulty - 0.5) + (0.4 if self.duration >= 90 else -0.2)
+        elif action_id == "apply_pomodoro":
+            logit += (0.5 if profile.likes_pomodoro else -0.3) + (0.2 if self.duration >= 45 else -0.2)
+        elif action_id == "batch_with_similar":
+            logit += 0.08 * (self.pending - 6)
+
+        completion = _sigmoid(logit)
+        on_time = _sigmoid((self.deadline - delay - self.duration / 60) / 6)
+        rescheduled = 0.7 if delay > 0 else 0.4
+        return completion, on_time, rescheduled
+
+    def _outcomes(self, action_id: str) -> List[Tuple[float, Dict[str, Any]]]:
+        """كل النتائج الممكنة مع احتمالها والتغذية الراجعة الخاصة بها"""
+        completion, on_time, rescheduled = self.outcome_probabilities(action_id)
+        preferred = action_id == self.profile.preferred_period
+        satisfaction = 0.7 + (0.2 if preferred else 0.0)
+        return [
+            (completion * on_time,
+             {"task_completed": True, "on_time": True, "satisfaction": satisfaction}),
+            (completion * (1 - on_time),
+             {"task_completed": True, "on_time": False, "satisfaction": satisfaction - 0.3}),
+            ((1 - completion) * rescheduled,
+             {"rescheduled": True, "satisfaction": 0.3}),
+            ((1 - completion) * (1 - rescheduled),
+             {"task_failed": True, "satisfaction": 0.0}),
+        ]
+
+    def expected_rewards(self) -> np.ndarray:
+        """المكافأة المتوقعة (calculate_reward) لكل إجراء في الحالة الحالية"""
+        return np.array([
+            sum(probability * calculate_reward(feedback) for probability, feedback in self._outcomes(action_id))
+            for action_id in ACTION_IDS
+        ])
+
+    def respond(self, action_index: int) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+        """
+        تنفيذ إجراء وتقدم الزمن
+
+        Returns:
+            Tuple: (التغذية الراجعة، الحالة الخام التالية، انتهاء المهمة)
+        """
+        action_id = ACTION_IDS[action_index]
+        draw = self.rng.random()
+        feedback = {}
+        for probability, feedback in self._outcomes(action_id):
+            if draw < probability:
+                break
+            draw -= probability
+
+        completed = bool(feedback.get("task_completed"))
+        done = completed or bool(feedback.get("task_failed"))
+        self.completion_rate = 0.9 * self.completion_rate + 0.1 * completed
+
+        if completed:
+            self.completed_today += 1
+            self.pending = max(0, self.pending - 1)
+        elif done:
+            self.pending = max(0, self.pending - 1)
+
+        self._advance(self.duration / 60 if completed else 1.0)
+        if done:
+            self._new_task()
+        else:
+            # المهمة المؤجلة تقترب من موعدها
+            self.deadline = max(1, self.deadline - 1)
+
+        return feedback, self.observe(), done
+
+    def _advance(self, hours: float) -> None:
+        self.hour += hours
+        # الليل: القفز إلى صباح اليوم التالي
+        if self.hour >= 23:
+            self.hour = 7 + self.rng.random() * 2
+            self.day = (self.day + 1) % 7
+            self.streak = self.streak + 1 if self.completed_today else 0
+            self.completed_today = 0
+            self.pending += int(self.rng.expovariate(1 / self.profile.tasks_per_day))
+
+
+# ============================================
+# Population
+# ============================================
+
+class UserSimulator:
+    """مجموعة مستخدمين محاكين؛ كل خطوة تختار مستخدماً عشوائياً"""
+
+    def __init__(self, users: int = 100, seed: Optional[int] = 0):
+        self.rng = random.Random(seed)
+        self.users = [SimulatedUser(random_profile(self.rng), self.rng) for _ in range(users)]
+
+    def sample(self) -> Tuple[int, Dict[str, Any]]:
+        """اختيار مستخدم وإرجاع (فهرسه، حالته الخام)"""
+        user_index = self.rng.randrange(len(self.users))
+        return user_index, self.users[user_index].observe()
+
+    def expected_rewards(self, user_index: int) -> np.ndarray:
+        return self.users[user_index].expected_rewards()
+
+    def respond(self, user_index: int, action_index: int) -> Tuple[Dict[str, Any], Dict[str, Any], bool]:
+        return self.users[user_index].respond(action_index)
@@ -0,0 +1,689 @@
+"""
+Daily Rollups
+تجميعات يومية لسلوك المستخدم مع استعلامات النطاقات الزمنية
+"""
+
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+import itertools
+import logging
+import os
+import threading
+import time
+import uuid
+
+import numpy as np
+
+from sketches import KLLSketch, HyperLogLog
+from snapshots import encode_snapshot, decode_snapshot, snapshot_store_from_env
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# Rollup Layout
+# ============================================
+
+WEEKDAYS = ["monday", "tuesday", "wednesday", "thursday", "friday", "saturday", "sunday"]
+
+COL_CREATED = 0
+COL_COMPLETED = 1
+COL_FAILED = 2
+COL_RESCHEDULED = 3
+COL_DURATION_SUM = 4
+COL_DURATION_COUNT = 5
+COL_COMPLETED_BY_HOUR = 6       # 24 عموداً
+COL_FAILED_BY_HOUR = 30         # 24 عموداً
+COL_COMPLETED_BY_DAY = 54       # 7 أعمدة
+ROLLUP_WIDTH = 61
+
+RANGE_PERIODS = ["today", "last_7_days", "last_30_days", "this_week", "this_month"]
+
+# رقم يوم 1970-01-01 لتحويل التواريخ إلى أيام منذ epoch
+EPOCH_ORDINAL = 719163
+
+# حفظ التجميعات في مخزن اللقطات المشترك
+ROLLUP_FLUSH_SEC = float(os.environ.get("ANALYTICS_ROLLUP_FLUSH_SEC", "10"))
+ROLLUP_REFRESH_SEC = float(os.environ.get("ANALYTICS_ROLLUP_REFRESH_SEC", "2"))
+ROLLUP_SAVE_ATTEMPTS = 5
+
+# الملخصات اليومية لآخر ROLLUP_SKETCH_DAYS يوماً (تغطي كل الفترات المحددة مسبقاً)،
+# والأقدم تُدمج في ملخصات أسبوعية لآخر ROLLUP_SKETCH_WEEKS أسبوعاً
+ROLLUP_SKETCH_DAYS = 35
+ROLLUP_SKETCH_WEEKS = 52
+
+# معرف هذه النسخة: إصدارات التجميعات في الذاكرة (بدون مخزن) لا تتكرر بين النسخ
+INSTANCE_ID = uuid.uuid4().hex[:12]
+
+
+# ============================================
+# Fenwick Tree
+# ============================================
+
+class FenwickTree:
+    """
+    شجرة Fenwick لصفوف رقمية
+    كل عقدة تحمل صفاً كاملاً من أعمدة التجميع
+    """
+
+    def __init__(self, capacity: int, width: int):
+        self.capacity = capacity
+        self.width = width
+        self.tree = np.zeros((capacity + 1, width), dtype=np.float64)
+
+    @classmethod
+    def from_rows(cls, rows: np.ndarray) -> "FenwickTree":
+        """بناء الشجرة من صفوف يومية في O(n)"""
+        capacity, width = rows.shape
+        fenwick = cls(capacity, width)
+        fenwick.tree[1:] = rows
+
+        for i in range(1, capacity + 1):
+            parent = i + (i & -i)
+            if parent <= capacity:
+                fenwick.tree[parent] += fenwick.tree[i]
+
+        return fenwick
+
+    def add(self, index: int, columns: List[int], values: List[float]) -> None:
+        """إضافة قيم إلى أعمدة محددة في الصف index"""
+        i = index + 1
+        while i <= self.capacity:
+            self.tree[i, columns] += values
+            i += i & -i
+
+    def prefix(self, index: int) -> np.ndarray:
+        """مجموع الصفوف من 0 حتى index (شاملاً)"""
+        total = np.zeros(self.width, dtype=np.float64)
+        i = min(index, self.capacity - 1) + 1
+        while i > 0:
+            total += self.tree[i]
+            i -= i & -i
+        return total
+
+    def range_sum(self, start: int, end: int) -> np.ndarray:
+        """مجموع الصفوف من start حتى end (شاملاً)"""
+        if end < start or end < 0:
+            return np.zeros(self.width, dtype=np.float64)
+        total = self.prefix(end)
+        if start > 0:
+            total -= self.prefix(start - 1)
+        return total
+
+
+# ============================================
+# Per-User Rollup
+# ============================================
+
+class UserRollup:
+    """التجميعات اليومية لمستخدم واحد"""
+
+    def __init__(self, origin: int, capacity: int = 64):
+        self.origin = origin  # رقم اليوم (toordinal) للصف الأول
+        self.daily = np.zeros((capacity, ROLLUP_WIDTH), dtype=np.float64)
+        self.fenwick = FenwickTree(capacity, ROLLUP_WIDTH)
+        # ملخصات قابلة للدمج عبر النطاق: رقم اليوم ← {"durations": KLL, "tasks": HLL}
+        self.day_sketches: Dict[int, Dict[str, Any]] = {}
+        # الأيام الأقدم من ROLLUP_SKETCH_DAYS مدمجة أسبوعياً: رقم يوم الاثنين ← نفس الشكل
+        self.week_sketches: Dict[int, Dict[str, Any]] = {}
+
+    @property
+    def capacity(self) -> int:
+        return self.daily.shape[0]
+
+    def _ensure_day(self, day: int) -> int:
+        """التأكد من وجود صف لليوم وإرجاع فهرسه"""
+        index = day - self.origin
+
+        if 0 <= index < self.capacity:
+            return index
+
+        # توسيع النطاق للأمام أو للخلف ثم إعادة البناء
+        shift = max(0, -index)
+        needed = max(self.capacity + shift, index + 1)
+        capacity = self.capacity
+        while capacity < needed:
+            capacity *= 2
+
+        daily = np.zeros((capacity, ROLLUP_WIDTH), dtype=np.float64)
+        daily[shift:shift + self.capacity] = self.daily
+        self.daily = daily
+        self.origin -= shift
+        self.fenwick = FenwickTree.from_rows(daily)
+
+        return day - self.origin
+
+    def record(
+        self,
+        event_type: str,
+        when: datetime,
+        duration: Optional[float] = None,
+        task_id: Optional[str] = None
+    ) -> None:
+        """
+        تسجيل حدث في صف يومه
+
+        Args:
+            event_type: نوع الحدث
+            when: وقت الحدث
+            duration: مدة المهمة (للمهام المكتملة)
+            task_id: معرف المهمة (لعداد المهام المميزة)
+        """
+        if event_type == "task_created":
+            columns = [COL_CREATED]
+        elif event_type == "task_completed":
+            columns = [
+                COL_COMPLETED,
+                COL_COMPLETED_BY_HOUR + when.hour,
+                COL_COMPLETED_BY_DAY + when.weekday()
+            ]
+            if isinstance(duration, (int, float)) and duration:
+                columns += [COL_DURATION_SUM, COL_DURATION_COUNT]
+        elif event_type == "task_failed":
+            columns = [COL_FAILED, COL_FAILED_BY_HOUR + when.hour]
+        elif event_type == "task_rescheduled":
+            columns = [COL_RESCHEDULED]
+        else:
+            return
+
+        values = [1.0] * len(columns)
+        if COL_DURATION_SUM in columns:
+            values[columns.index(COL_DURATION_SUM)] = float(duration)
+
+        day = when.date().toordinal()
+        index = self._ensure_day(day)
+        self.daily[index, columns] += values
+        self.fenwick.add(index, columns, values)
+
+        if task_id or COL_DURATION_SUM in columns:
+            new_day = day not in self.day_sketches
+            sketches = self.day_sketches.setdefault(day, {})
+            if task_id:
+                sketches.setdefault("tasks", HyperLogLog()).add(str(task_id))
+            if COL_DURATION_SUM in columns:
+                sketches.setdefault("durations", KLLSketch()).update(duration)
+            if new_day:
+                self._compact()
+
+    def _compact(self) -> None:
+        """دمج ملخصات الأيام القديمة في أسابيعها وحذف الأسابيع الزائدة"""
+        if len(self.day_sketches) <= ROLLUP_SKETCH_DAYS:
+            return
+
+        horizon = max(self.day_sketches) - ROLLUP_SKETCH_DAYS
+        for day in [day for day in self.day_sketches if day <= horizon]:
+            week = day - date.fromordinal(day).weekday()
+            _merge_sketches(self.week_sketches.setdefault(week, {}), self.day_sketches.pop(day))
+
+        for week in sorted(self.week_sketches)[:-ROLLUP_SKETCH_WEEKS]:
+            del self.week_sketches[week]
+
+    def query(self, start: date, end: date) -> np.ndarray:
+        """مجموع التجميعات بين تاريخين (شاملاً) في O(log n)"""
+        first = start.toordinal() - self.origin
+        last = end.toordinal() - self.origin
+        return self.fenwick.range_sum(max(first, 0), min(last, self.capacity - 1))
+
+    def sketches(self, start: date, end: date) -> Tuple[KLLSketch, HyperLogLog, HyperLogLog]:
+        """
+        دمج الملخصات اليومية للنطاق (شاملاً)
+
+        الأيام الأقدم من ROLLUP_SKETCH_DAYS بدقة أسبوع: يدخل كل أسبوع يتقاطع مع
+        النطاق كاملاً، والأسابيع الأقدم من ROLLUP_SKETCH_WEEKS لا تدخل. الأيام
+        النشطة دقيقة دائماً لأنها من الصفوف اليومية
+
+        Returns:
+            Tuple: (مدد المهام، المهام المميزة، الأيام النشطة)
+        """
+        durations = KLLSketch()
+        tasks = HyperLogLog()
+        days = HyperLogLog()
+        first, last = start.toordinal(), end.toordinal()
+
+        # المرور على أيام النطاق أو على الأيام المسجلة، أيهما أقل
+        if last - first < len(self.day_sketches):
+            entries = (self.day_sketches.get(day) for day in range(first, last + 1))
+        else:
+            entries = (sketches for day, sketches in self.day_sketches.items() if first <= day <= last)
+        weeks = (sketches for week, sketches in self.week_sketches.items() if week <= last and week + 6 >= first)
+        for sketches in itertools.chain(entries, weeks):
+            if not sketches:
+                continue
+            if "durations" in sketches:
+                durations.merge(sketches["durations"])
+            if "tasks" in sketches:
+                tasks.merge(sketches["tasks"])
+
+        # الأيام النشطة معروفة من الصفوف اليومية: أي حدث مهمة في اليوم
+        low = max(first - self.origin, 0)
+        high = min(last - self.origin, self.capacity - 1)
+        if low <= high:
+            active = self.daily[low:high + 1, COL_CREATED:COL_RESCHEDULED + 1].any(axis=1)
+            days.add_keys(np.flatnonzero(active) + (self.origin + low - EPOCH_ORDINAL))
+
+        return durations, tasks, days
+
+    def streak(self, start: date, end: date) -> Dict[str, int]:
+        """
+        حساب أيام الالتزام المتتالية داخل النطاق
+
+        Returns:
+            Dict: current (ينتهي في end أو اليوم الذي قبله) و best
+        """
+        first = max(start.toordinal() - self.origin, 0)
+        last = min(end.toordinal() - self.origin, self.capacity - 1)
+
+        if last < first:
+            return {"current": 0, "best": 0}
+
+        active = self.daily[first:last + 1, COL_COMPLETED] > 0
+        if not active.any():
+            return {"current": 0, "best": 0}
+
+        # أطوال السلاسل المتتالية من الأيام النشطة
+        padded = np.concatenate(([False], active, [False])).astype(np.int8)
+        edges = np.flatnonzero(np.diff(padded))
+        starts, ends = edges[0::2], edges[1::2]
+        runs = ends - starts
+        best = int(runs.max())
+
+        # السلسلة الحالية يجب أن تنتهي اليوم أو أمس
+        last_end = int(ends[-1])
+        current = int(runs[-1]) if last_end >= len(active) - 1 else 0
+
+        return {"current": current, "best": best}
+
+    def merge(self, other: "UserRollup") -> "UserRollup":
+        """
+        إضافة تجميعات أخرى (الصفوف بالجمع والملخصات بالدمج)
+
+        Returns:
+            UserRollup: self بعد الدمج
+        """
+        active = np.flatnonzero(other.daily.any(axis=1))
+        if len(active):
+            first = other.origin + int(active[0])
+            last = other.origin + int(active[-1])
+            self._ensure_day(first)
+            self._ensure_day(last)
+            offset = first - self.origin
+            self.daily[offset:offset + last - first + 1] += other.daily[active[0]:active[-1] + 1]
+            self.fenwick = FenwickTree.from_rows(self.daily)
+
+        for day, sketches in other.day_sketches.items():
+            _merge_sketches(self.day_sketches.setdefault(day, {}), sketches)
+        for week, sketches in other.week_sketches.items():
+            _merge_sketches(self.week_sketches.setdefault(week, {}), sketches)
+        self._compact()
+
+        return self
+
+
+def _merge_sketches(target: Dict[str, Any], sketches: Dict[str, Any]) -> None:
+    """دمج ملخصات يوم أو أسبوع في أخرى (يأخذ الملخص نفسه إذا لم يوجد مقابل)"""
+    for key, sketch in sketches.items():
+        if key in target:
+            target[key].merge(sketch)
+        else:
+            target[key] = sketch
+
+
+# ============================================
+# Rollup Persistence
+# ============================================
+
+def _encode_buckets(
+    buckets: Dict[int, Dict[str, Any]],
+    prefix: str,
+    arrays: Dict[str, np.ndarray],
+    meta: Dict[str, Any]
+) -> None:
+    """ترميز ملخصات أيام أو أسابيع: سجلات HLL كمصفوفة و KLL في البيانات الوصفية"""
+    keys = sorted(key for key, sketches in buckets.items() if "tasks" in sketches)
+    registers = []
+    for key in keys:
+        tasks = buckets[key]["tasks"]
+        tasks._flush()
+        registers.append(tasks.registers)
+
+    arrays[f"{prefix}_hll_keys"] = np.asarray(keys, dtype=np.int64)
+    arrays[f"{prefix}_hll_registers"] = (
+        np.stack(registers) if registers else np.zeros((0, HyperLogLog().m), dtype=np.uint8)
+    )
+    if keys:
+        meta["hllP"] = buckets[keys[0]]["tasks"].p
+    meta[f"{prefix}Durations"] = {
+        str(key): sketches["durations"].to_dict()
+        for key, sketches in buckets.items() if "durations" in sketches
+    }
+
+
+def _decode_buckets(prefix: str, arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+    """عكس _encode_buckets"""
+    buckets: Dict[int, Dict[str, Any]] = {}
+    for key, registers in zip(arrays[f"{prefix}_hll_keys"].tolist(), arrays[f"{prefix}_hll_registers"]):
+        tasks = HyperLogLog(p=int(meta.get("hllP", 10)))
+        tasks.registers = np.array(registers, dtype=np.uint8)
+        buckets.setdefault(int(key), {})["tasks"] = tasks
+    for key, data in meta.get(f"{prefix}Durations", {}).items():
+        buckets.setdefault(int(key), {})["durations"] = KLLSketch.from_dict(data)
+    return buckets
+
+
+def encode_rollup(rollup: UserRollup) -> bytes:
+    """
+    ترميز تجميعات مستخدم في لقطة (الصفوف النشطة فقط)
+
+    Args:
+        rollup: تجميعات المستخدم
+
+    Returns:
+        bytes: اللقطة المرمّزة
+    """
+    active = np.flatnonzero(rollup.daily.any(axis=1))
+    first, last = (int(active[0]), int(active[-1])) if len(active) else (0, -1)
+
+    arrays = {"daily": rollup.daily[first:last + 1]}
+    meta = {"kind": "userRollup", "origin": rollup.origin + first}
+    _encode_buckets(rollup.day_sketches, "day", arrays, meta)
+    _encode_buckets(rollup.week_sketches, "week", arrays, meta)
+    return encode_snapshot(arrays, meta)
+
+
+def decode_rollup(buffer: Any) -> UserRollup:
+    """قراءة تجميعات مستخدم من لقطة (نسخ المصفوفات لأنها تُعدّل لاحقاً)"""
+    arrays, meta = decode_snapshot(buffer)
+    if meta.get("kind") != "userRollup":
+        raise ValueError(f"Not a rollup snapshot: {meta.get('kind')}")
+
+    daily = arrays["daily"]
+    rollup = UserRollup(origin=int(meta["origin"]), capacity=max(64, len(daily)))
+    rollup.daily[:len(daily)] = daily
+    rollup.fenwick = FenwickTree.from_rows(rollup.daily)
+    rollup.day_sketches = _decode_buckets("day", arrays, meta)
+    rollup.week_sketches = _decode_buckets("week", arrays, meta)
+
+    return rollup
+
+
+# ============================================
+# Rollup Store
+# ============================================
+
+class DailyRollupStore:
+    """
+    مخزن التجميعات اليومية لكل المستخدمين
+
+    مع مخزن لقطات (RL_SNAPSHOT_BUCKET أو RL_SNAPSHOT_DIR) تُحفظ تجميعات كل
+    مستخدم في rollups/{uid}: trackBehavior يسجل في فرق محلي بالذاكرة، وخيط
+    خلفي يدمجه كل flush_interval_sec مع أحدث إصدار ويحفظ الإصدار التالي
+    (save يفشل إذا سبقنا كاتب آخر فنعيد التحميل والدمج). الاستعلام يقرأ
+    الإصدار المحفوظ فقط، فكل النسخ ترى نفس النتيجة لنفس الإصدار، وأحداث هذه
+    النسخة تظهر بعد الحفظ التالي. نافذة الفقد: فرق لم يُحفظ بعد إذا أُغلقت
+    النسخة. بدون مخزن تبقى التجميعات في ذاكرة هذه النسخة فقط (للتطوير المحلي)
+    """
+
+    def __init__(
+        self,
+        store: Optional[Any] = None,
+        flush_interval_sec: float = ROLLUP_FLUSH_SEC,
+        refresh_sec: float = ROLLUP_REFRESH_SEC
+    ):
+        self.store = store
+        self.flush_interval_sec = flush_interval_sec
+        self.refresh_sec = refresh_sec
+        self.lock = threading.Lock()
+        # التجميعات المحفوظة (أو كل التجميعات بدون مخزن) وإصدار كل منها
+        self.users: Dict[str, UserRollup] = {}
+        self.versions: Dict[str, int] = {}
+        self.checked: Dict[str, float] = {}
+        # أحداث لم تُحفظ بعد
+        self.deltas: Dict[str, UserRollup] = {}
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+        self.saved = 0
+        self.conflicts = 0
+        self.failed = 0
+
+    @staticmethod
+    def _name(user_id: str) -> str:
+        return f"rollups/{user_id}"
+
+    def record_event(self, user_id: str, event: Dict[str, Any]) -> None:
+        """
+        تسجيل حدث سلوك للمستخدم (داخل الطلب: ذاكرة فقط)
+
+        Args:
+            user_id: معرف المستخدم
+            event: الحدث (type, timestamp, metadata)
+        """
+        try:
+            when = datetime.fromisoformat(event.get("timestamp", "").replace("Z", "+00:00"))
+        except ValueError as e:
+            logger.warning(f"Invalid rollup timestamp: {e}")
+            return
+
+        metadata = event.get("metadata") or {}
+
+        with self.lock:
+            target = self.deltas if self.store is not None else self.users
+            rollup = target.get(user_id)
+            if rollup is None:
+                rollup = UserRollup(origin=when.date().toordinal())
+                target[user_id] = rollup
+
+            rollup.record(event.get("type", ""), when, metadata.get("duration"), metadata.get("taskId"))
+
+            if self.store is None:
+                self.versions[user_id] = self.versions.get(user_id, 0) + 1
+            elif self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            self._wake.wait(self.flush_interval_sec)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self) -> int:
+        """
+        حفظ الفروق المحلية في المخزن (الخيط الخلفي، وعند الإيقاف والاختبارات)
+
+        Returns:
+            int: عدد المستخدمين الذين حُفظت تجميعاتهم
+        """
+        if self.store is None:
+            return 0
+
+        with self.lock:
+            deltas, self.deltas = self.deltas, {}
+
+        saved = 0
+        for user_id, delta in deltas.items():
+            try:
+                published = self._publish(user_id, delta)
+            except Exception as e:
+                logger.error(f"Rollup save error for {user_id}: {e}")
+                published = False
+                self.failed += 1
+
+            if published:
+                saved += 1
+                continue
+
+            # إعادة الفرق ليُحفظ في الجولة التالية مع ما وصل بعده
+            with self.lock:
+                pending = self.deltas.get(user_id)
+                self.deltas[user_id] = delta.merge(pending) if pending is not None else delta
+
+        self.saved += saved
+        return saved
+
+    def _publish(self, user_id: str, delta: UserRollup) -> bool:
+        """دمج فرق مع أحدث إصدار محفوظ وحفظ الإصدار التالي"""
+        name = self._name(user_id)
+        for _ in range(ROLLUP_SAVE_ATTEMPTS):
+            loaded = self.store.load(name)
+            version, rollup = (loaded[0], decode_rollup(loaded[1])) if loaded else (0, UserRollup(delta.origin))
+            # الدمج في نسخة جديدة حتى لا يتغير الفرق إذا فشل الحفظ
+            rollup.merge(decode_rollup(encode_rollup(delta)))
+
+            if self.store.save(name, version + 1, encode_rollup(rollup)):
+                with self.lock:
+                    if version + 1 > self.versions.get(user_id, 0):
+                        self.users[user_id] = rollup
+                        self.versions[user_id] = version + 1
+                return True
+            self.conflicts += 1
+
+        return False
+
+    def _current(self, user_id: str) -> Optional[UserRollup]:
+        """أحدث تجميعات محفوظة للمستخدم (إعادة التحميل عند وجود إصدار أحدث)"""
+        if self.store is None:
+            return self.users.get(user_id)
+
+        now = time.time()
+        if now - self.checked.get(user_id, 0.0) >= self.refresh_sec:
+            name = self._name(user_id)
+            if self.store.latest_version(name) > self.versions.get(user_id, 0):
+                loaded = self.store.load(name)
+                if loaded:
+                    rollup = decode_rollup(loaded[1])
+                    with self.lock:
+                        if loaded[0] > self.versions.get(user_id, 0):
+                            self.users[user_id] = rollup
+                            self.versions[user_id] = loaded[0]
+            self.checked[user_id] = now
+
+        return self.users.get(user_id)
+
+    def has_user(self, user_id: str) -> bool:
+        return self._current(user_id) is not None
+
+    def snapshot(self, user_id: str) -> Tuple[str, UserRollup]:
+        """
+        التجميعات الحالية للمستخدم مع إصدار عام يصلح للبصمة
+
+        الإصدار المحفوظ واحد في كل النسخ ومحتواه لا يتغير بعد الحفظ، فنفس
+        الإصدار يعني نفس النتيجة أينما حُسبت. بدون مخزن يُضاف معرف النسخة
+        للعداد المحلي حتى لا تتطابق بصمتا نسختين ببيانات مختلفة
+
+        Returns:
+            Tuple: (الإصدار، التجميعات أو تجميعات فارغة لمستخدم بلا أحداث)
+        """
+        self._current(user_id)
+        with self.lock:
+            rollup = self.users.get(user_id)
+            version = self.versions.get(user_id, 0)
+
+        token = f"v{version}" if self.store is not None else f"{INSTANCE_ID}:{version}"
+        return token, rollup if rollup is not None else UserRollup(origin=0, capacity=1)
+
+    def query(self, user_id: str, start: date, end: date) -> Tuple[Dict[str, Any], Dict[str, int]]:
+        """
+        تحليلات نطاق زمني بنفس شكل process_events
+
+        Args:
+            user_id: معرف المستخدم
+            start: تاريخ البداية
+            end: تاريخ النهاية
+
+        Returns:
+            Tuple: (التحليلات الأساسية، أيام الالتزام)
+        """
+        _, rollup = self.snapshot(user_id)
+        return rollup_to_analytics(rollup.query(start, end)), rollup.streak(start, end)
+
+    def sketches(self, user_id: str, start: date, end: date) -> Tuple[KLLSketch, HyperLogLog, HyperLogLog]:
+        """الملخصات المدمجة لنطاق زمني (فارغة لمستخدم بلا أحداث)"""
+        _, rollup = self.snapshot(user_id)
+        return rollup.sketches(start, end)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "persistent": self.store is not None,
+            "cachedUsers": len(self.users),
+            "pendingUsers": len(self.deltas),
+            "saved": self.saved,
+            "conflicts": self.conflicts,
+            "failed": self.failed
+        }
+
+
+# ============================================
+# Helper Functions
+# ============================================
+
+def rollup_to_analytics(row: np.ndarray) -> Dict[str, Any]:
+    """تحويل صف تجميع إلى شكل مخرجات process_events"""
+    total = int(row[COL_CREATED])
+    completed = int(row[COL_COMPLETED])
+    duration_count = row[COL_DURATION_COUNT]
+
+    completed_by_hour = row[COL_COMPLETED_BY_HOUR:COL_COMPLETED_BY_HOUR + 24]
+    failed_by_hour = row[COL_FAILED_BY_HOUR:COL_FAILED_BY_HOUR + 24]
+    completed_by_day = row[COL_COMPLETED_BY_DAY:COL_COMPLETED_BY_DAY + 7]
+
+    return {
+        "totalTasks": total,
+        "completedTasks": completed,
+        "failedTasks": int(row[COL_FAILED]),
+        "rescheduledTasks": int(row[COL_RESCHEDULED]),
+        "completionRate": completed / total if total > 0 else 0,
+        "avgTaskDuration": float(row[COL_DURATION_SUM] / duration_count) if duration_count else 0,
+        "taskPatterns": {
+            "completedByHour": {h: int(c) for h, c in enumerate(completed_by_hour) if c},
+            "failedByHour": {h: int(c) for h, c in enumerate(failed_by_hour) if c},
+            "completedByDay": {WEEKDAYS[d]: int(c) for d, c in enumerate(completed_by_day) if c}
+        },
+        "lastAnalyzed": datetime.utcnow().isoformat()
+    }
+
+
+def resolve_date_range(
+    period: Optional[str] = None,
+    start_date: Optional[str] = None,
+    end_date: Optional[str] = None,
+    today: Optional[date] = None
+) -> Tuple[date, date]:
+    """
+    تحويل فترة محددة مسبقاً أو تاريخين إلى نطاق
+
+    Args:
+        period: today, last_7_days, last_30_days, this_week, this_month
+        start_date: تاريخ البداية (YYYY-MM-DD)
+        end_date: تاريخ النهاية (YYYY-MM-DD)
+        today: تاريخ اليوم (افتراضياً UTC)
+
+    Returns:
+        Tuple[date, date]: البداية والنهاية (شاملاً)
+    """
+    today = today or datetime.utcnow().date()
+
+    if period:
+        if period == "today":
+            return today, today
+        if period == "last_7_days":
+            return today - timedelta(days=6), today
+        if period == "last_30_days":
+            return today - timedelta(days=29), today
+        if period == "this_week":
+            return today - timedelta(days=today.weekday()), today
+        if period == "this_month":
+            return today.replace(day=1), today
+        raise ValueError(f"Unknown period: {period}")
+
+    end = date.fromisoformat(end_date[:10]) if end_date else today
+    start = date.fromisoformat(start_date[:10]) if start_date else end
+
+    if start > end:
+        raise ValueError("startDate must not be after endDate")
+
+    return start, end
+
+
+# Singleton instance
+rollup_store = DailyRollupStore(snapshot_store_from_env())
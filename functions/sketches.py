@@ -0,0 +1,245 @@
+"""
+Streaming Sketches
+ملخصات تدفقية بذاكرة محدودة وقابلة للدمج (KLL للمئينات، HyperLogLog للعدّ المميز)
+"""
+
+import math
+import random
+from typing import Dict, List, Any, Iterable, Optional
+
+import numpy as np
+
+
+# ============================================
+# Hashing
+# ============================================
+
+_MASK64 = (1 << 64) - 1
+
+
+def fnv1a32(text: str) -> int:
+    """تجزئة FNV-1a 32-bit لبايتات UTF-8 (مطابقة لترميز الواجهة)"""
+    h = 0x811C9DC5
+    for byte in text.encode("utf-8"):
+        h = ((h ^ byte) * 0x01000193) & 0xFFFFFFFF
+    return h
+
+
+def splitmix64(values: np.ndarray) -> np.ndarray:
+    """تجزئة SplitMix64 لمصفوفة أعداد صحيحة"""
+    with np.errstate(over="ignore"):
+        z = values.astype(np.uint64) + np.uint64(0x9E3779B97F4A7C15)
+        z = (z ^ (z >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+        z = (z ^ (z >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+        return z ^ (z >> np.uint64(31))
+
+
+# ============================================
+# KLL Quantile Sketch
+# ============================================
+
+class KLLSketch:
+    """
+    ملخص KLL للمئينات
+    الذاكرة O(k log(n/k)) والدمج بتجميع المستويات ثم الضغط
+    """
+
+    def __init__(self, k: int = 200, seed: Optional[int] = None):
+        self.k = k
+        self.count = 0
+        self.min: Optional[float] = None
+        self.max: Optional[float] = None
+        self.levels: List[List[float]] = [[]]
+        # مولد خاص فقط عند تحديد seed حتى يبقى الملخص خفيفاً عند النقل بين العمليات
+        self._random = random.Random(seed) if seed is not None else None
+
+    def _capacity(self, level: int) -> int:
+        depth = len(self.levels) - level - 1
+        return max(2, int(math.ceil(self.k * (2 / 3) ** depth)))
+
+    def update(self, value: float) -> None:
+        """إضافة قيمة"""
+        value = float(value)
+        self.count += 1
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.levels[0].append(value)
+
+        if len(self.levels[0]) >= self._capacity(0):
+            self._compress()
+
+    def update_many(self, values: Iterable[float]) -> None:
+        """إضافة مجموعة قيم (مصفوفة NumPy أو قائمة)"""
+        values = np.asarray(values, dtype=np.float64)
+        if values.size == 0:
+            return
+
+        self.count += int(values.size)
+        low, high = float(values.min()), float(values.max())
+        self.min = low if self.min is None else min(self.min, low)
+        self.max = high if self.max is None else max(self.max, high)
+        self.levels[0].extend(values.tolist())
+        self._compress()
+
+    def _compress(self) -> None:
+        """ضغط المستويات الممتلئة بترقية نصف العناصر للمستوى الأعلى"""
+        level = 0
+        while level < len(self.levels):
+            items = self.levels[level]
+            if len(items) >= self._capacity(level):
+                if level + 1 == len(self.levels):
+                    self.levels.append([])
+
+                items.sort()
+                # الاحتفاظ بعنصر فردي إن وُجد
+                leftover = [items.pop()] if len(items) % 2 else []
+                offset = (self._random or random).randint(0, 1)
+                self.levels[level + 1].extend(items[offset::2])
+                self.levels[level] = leftover
+            level += 1
+
+    def merge(self, other: "KLLSketch") -> "KLLSketch":
+        """دمج ملخص آخر في هذا الملخص"""
+        if other.count == 0:
+            return self
+
+        while len(self.levels) < len(other.levels):
+            self.levels.append([])
+        for level, items in enumerate(other.levels):
+            self.levels[level].extend(items)
+
+        self.count += other.count
+        self.min = other.min if self.min is None else min(self.min, other.min)
+        self.max = other.max if self.max is None else max(self.max, other.max)
+        self._compress()
+        return self
+
+    def quantiles(self, qs: List[float]) -> List[float]:
+        """
+        تقدير المئينات
+
+        Args:
+            qs: النسب المطلوبة (0-1)
+
+        Returns:
+            List[float]: القيم المقدرة
+        """
+        if self.count == 0:
+            return [0.0 for _ in qs]
+
+        values = []
+        weights = []
+        for level, items in enumerate(self.levels):
+            values.extend(items)
+            weights.extend([1 << level] * len(items))
+
+        order = np.argsort(values, kind="stable")
+        sorted_values = np.asarray(values)[order]
+        cumulative = np.cumsum(np.asarray(weights, dtype=np.float64)[order])
+        total = cumulative[-1]
+
+        result = []
+        for q in qs:
+            if q <= 0:
+                result.append(float(self.min))
+            elif q >= 1:
+                result.append(float(self.max))
+            else:
+                index = int(np.searchsorted(cumulative, q * total))
+                result.append(float(sorted_values[min(index, len(sorted_values) - 1)]))
+        return result
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"k": self.k, "count": self.count, "min": self.min, "max": self.max, "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "KLLSketch":
+        sketch = cls(k=data.get("k", 200))
+        sketch.count = data.get("count", 0)
+        sketch.min = data.get("min")
+        sketch.max = data.get("max")
+        sketch.levels = [list(items) for items in data.get("levels", [[]])] or [[]]
+        return sketch
+
+
+# ============================================
+# HyperLogLog
+# ============================================
+
+class HyperLogLog:
+    """
+    عداد العناصر المميزة HyperLogLog
+    الذاكرة 2^p بايت والدمج بأخذ الحد الأقصى للسجلات
+    """
+
+    BUFFER_SIZE = 1024
+
+    def __init__(self, p: int = 10):
+        self.p = p
+        self.m = 1 << p
+        self.registers = np.zeros(self.m, dtype=np.uint8)
+        self._pending: List[int] = []
+
+    def add(self, value: Any) -> None:
+        """إضافة عنصر (تُجمع المفاتيح في مخزن صغير وتُضاف دفعة واحدة)"""
+        key = value if isinstance(value, int) else fnv1a32(str(value))
+        self._pending.append(key & _MASK64)
+        if len(self._pending) >= self.BUFFER_SIZE:
+            self._flush()
+
+    def _flush(self) -> None:
+        if self._pending:
+            keys = np.array(self._pending, dtype=np.uint64)
+            self._pending = []
+            self.add_keys(keys)
+
+    def add_keys(self, keys: np.ndarray) -> None:
+        """إضافة مصفوفة مفاتيح صحيحة (مثل أرقام الأيام أو fnv1a32 للمعرفات)"""
+        self.add_hashes(splitmix64(np.asarray(keys, dtype=np.uint64)))
+
+    def add_hashes(self, hashes: np.ndarray) -> None:
+        """إضافة مصفوفة تجزئات 64-bit دفعة واحدة"""
+        if hashes.size == 0:
+            return
+
+        hashes = hashes.astype(np.uint64)
+        index = (hashes >> np.uint64(64 - self.p)).astype(np.int64)
+        remainder = (hashes << np.uint64(self.p)) | np.uint64(1 << (self.p - 1))
+
+        # ترتيب أول بت 1 في الجزء المتبقي
+        bit_length = np.floor(np.log2(remainder.astype(np.float64))).astype(np.int64) + 1
+        rank = (64 - bit_length + 1).astype(np.uint8)
+
+        np.maximum.at(self.registers, index, rank)
+
+    def merge(self, other: "HyperLogLog") -> "HyperLogLog":
+        """دمج عداد آخر بنفس الدقة"""
+        if other.p != self.p:
+            raise ValueError("Cannot merge HyperLogLog sketches with different precision")
+        self._flush()
+        other._flush()
+        np.maximum(self.registers, other.registers, out=self.registers)
+        return self
+
+    def count(self) -> int:
+        """تقدير عدد العناصر المميزة"""
+        self._flush()
+        alpha = 0.7213 / (1 + 1.079 / self.m)
+        estimate = alpha * self.m * self.m / float(np.sum(np.ldexp(1.0, -self.registers.astype(np.int64))))
+
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * self.m and zeros:
+            # تصحيح النطاق الصغير (linear counting)
+            estimate = self.m * math.log(self.m / zeros)
+
+        return int(round(estimate))
+
+    def to_dict(self) -> Dict[str, Any]:
+        self._flush()
+        return {"p": self.p, "registers": self.registers.tobytes().hex()}
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "HyperLogLog":
+        sketch = cls(p=data.get("p", 10))
+        sketch.registers = np.frombuffer(bytes.fromhex(data["registers"]), dtype=np.uint8).copy()
+        return sketch
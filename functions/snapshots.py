@@ -0,0 +1,715 @@
+"""
+Agent Snapshots
+لقطات ثنائية مرقّمة لجدول Q وذاكرة التجارب مشتركة بين نسخ الدوال
+
+الصيغة:
+    magic (8 بايت) | format_version (uint32) | header_length (uint32)
+    header: JSON (الإصدار، البيانات الوصفية، وصف المصفوفات)
+    data: المصفوفات متتالية، كل واحدة تبدأ عند حد 64 بايت
+
+تُحمّل اللقطة بـ mmap (copy-on-write) وتُقرأ المصفوفات مباشرة بـ
+np.frombuffer بدون نسخ أو فك ترميز
+
+المخزن يُختار من متغيرات البيئة:
+    RL_SNAPSHOT_BUCKET: حاوية Cloud Storage
+    RL_SNAPSHOT_DIR: مجلد محلي (بديل للتطوير والاختبار)
+
+نفس المخزن يحمل طابور دفعات التجارب بين نسخ التغذية الراجعة والمتعلم، ولقطات
+حالة personalizer (اسم personalizer) وشرائح سجل قراراته
+"""
+
+import json
+import logging
+import mmap
+import os
+import re
+import struct
+import tempfile
+import threading
+import time
+import uuid
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+# ============================================
+# Binary Format
+# ============================================
+
+SNAPSHOT_MAGIC = b"RLSNAP\x00\x01"
+SNAPSHOT_FORMAT_VERSION = 1
+SNAPSHOT_ALIGNMENT = 64
+
+_PREAMBLE = struct.Struct("<8sII")
+
+
+def _align(offset: int) -> int:
+    return (offset + SNAPSHOT_ALIGNMENT - 1) // SNAPSHOT_ALIGNMENT * SNAPSHOT_ALIGNMENT
+
+
+def encode_snapshot(arrays: Dict[str, np.ndarray], meta: Dict[str, Any]) -> bytes:
+    """
+    ترميز مصفوفات وبيانات وصفية في لقطة ثنائية
+
+    Args:
+        arrays: المصفوفات بالاسم (أنواع بسيطة فقط)
+        meta: بيانات وصفية قابلة للتحويل إلى JSON
+
+    Returns:
+        bytes: محتوى اللقطة
+    """
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        array = np.ascontiguousarray(array)
+        layout[name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+        offset = _align(offset + array.nbytes)
+
+    header = json.dumps({"meta": meta, "arrays": layout}, separators=(",", ":")).encode("utf-8")
+    data_start = _align(_PREAMBLE.size + len(header))
+
+    buffer = bytearray(data_start + offset)
+    _PREAMBLE.pack_into(buffer, 0, SNAPSHOT_MAGIC, SNAPSHOT_FORMAT_VERSION, len(header))
+    buffer[_PREAMBLE.size:_PREAMBLE.size + len(header)] = header
+
+    for name, array in arrays.items():
+        start = data_start + layout[name]["offset"]
+        raw = np.ascontiguousarray(array).tobytes()
+        buffer[start:start + len(raw)] = raw
+
+    return bytes(buffer)
+
+
+def decode_snapshot(buffer: Any) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """
+    قراءة لقطة من bytes أو mmap بدون نسخ المصفوفات
+
+    Args:
+        buffer: محتوى اللقطة
+
+    Returns:
+        Tuple: (المصفوفات، البيانات الوصفية)
+
+    Raises:
+        ValueError: عند عدم صلاحية اللقطة
+    """
+    if len(buffer) < _PREAMBLE.size:
+        raise ValueError("Snapshot is truncated")
+
+    magic, format_version, header_length = _PREAMBLE.unpack_from(buffer, 0)
+    if magic != SNAPSHOT_MAGIC:
+        raise ValueError("Not an RL snapshot")
+    if format_version != SNAPSHOT_FORMAT_VERSION:
+        raise ValueError(f"Unsupported snapshot format version: {format_version}")
+
+    header_end = _PREAMBLE.size + header_length
+    header = json.loads(bytes(buffer[_PREAMBLE.size:header_end]).decode("utf-8"))
+    data_start = _align(header_end)
+
+    arrays = {}
+    for name, spec in header["arrays"].items():
+        dtype = np.dtype(spec["dtype"])
+        shape = tuple(spec["shape"])
+        count = int(np.prod(shape)) if shape else 1
+        start = data_start + spec["offset"]
+        if start + count * dtype.itemsize > len(buffer):
+            raise ValueError(f"Snapshot array {name} is truncated")
+        arrays[name] = np.frombuffer(buffer, dtype=dtype, count=count, offset=start).reshape(shape)
+
+    return arrays, header["meta"]
+
+
+def map_file(path: str) -> mmap.mmap:
+    """ربط ملف بالذاكرة (copy-on-write: الكتابة لا تصل للملف)"""
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+
+# ============================================
+# Snapshot Stores
+# ============================================
+
+class LocalSnapshotStore:
+    """مخزن لقطات في مجلد محلي: {name}/{version}.snap"""
+
+    KEEP_VERSIONS = 3
+
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def _path(self, name: str, version: int) -> str:
+        return os.path.join(self.directory, name, f"{version:010d}.snap")
+
+    def _versions(self, name: str) -> List[int]:
+        folder = os.path.join(self.directory, name)
+        if not os.path.isdir(folder):
+            return []
+        return sorted(
+            int(match.group(1))
+            for match in (re.fullmatch(r"(\d+)\.snap", entry) for entry in os.listdir(folder))
+            if match
+        )
+
+    def latest_version(self, name: str) -> int:
+        versions = self._versions(name)
+        return versions[-1] if versions else 0
+
+    def load(self, name: str) -> Optional[Tuple[int, Any]]:
+        """إرجاع (الإصدار، محتوى مربوط بالذاكرة) لأحدث لقطة"""
+        version = self.latest_version(name)
+        if not version:
+            return None
+        return version, map_file(self._path(name, version))
+
+    def save(self, name: str, version: int, data: bytes) -> bool:
+        """
+        كتابة إصدار جديد بشكل ذري
+
+        Returns:
+            bool: False إذا سبقنا كاتب آخر لنفس الإصدار
+        """
+        path = self._path(name, version)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            # link يفشل إذا كان الإصدار موجوداً (لا يستبدل لقطة كاتب آخر)
+            os.link(temp_path, path)
+        except FileExistsError:
+            return False
+        finally:
+            os.unlink(temp_path)
+
+        for old in self._versions(name)[:-self.KEEP_VERSIONS]:
+            try:
+                os.unlink(self._path(name, old))
+            except OSError:
+                pass
+
+        return True
+
+    # --- طابور دفعات التجارب ---
+
+    def push_batch(self, name: str, data: bytes) -> str:
+        """إضافة دفعة تجارب إلى الطابور المشترك"""
+        folder = os.path.join(self.directory, name, "queue")
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, f"{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.batch")
+
+        fd, temp_path = tempfile.mkstemp(dir=folder, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return path
+
+    def claim_batches(self, name: str, limit: int = 64) -> List[bytes]:
+        """سحب أقدم الدفعات (rename ذري حتى لا يأخذ متعلمان نفس الدفعة)"""
+        folder = os.path.join(self.directory, name, "queue")
+        if not os.path.isdir(folder):
+            return []
+
+        batches = []
+        for entry in sorted(e for e in os.listdir(folder) if e.endswith(".batch"))[:limit]:
+            path = os.path.join(folder, entry)
+            claimed = f"{path}.{uuid.uuid4().hex[:8]}.claimed"
+            try:
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            with open(claimed, "rb") as f:
+                batches.append(f.read())
+            os.unlink(claimed)
+
+        return batches
+
+    # --- كائنات مفردة (مثل سياسات المستخدمين) ---
+
+    def write_object(self, key: str, data: bytes) -> None:
+        path = os.path.join(self.directory, "objects", f"{key}.snap")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+
+    def read_object(self, key: str) -> Optional[bytearray]:
+        """قراءة كائن (قابل للكتابة حتى تُستخدم مصفوفاته مباشرة) أو None"""
+        path = os.path.join(self.directory, "objects", f"{key}.snap")
+        try:
+            with open(path, "rb") as f:
+                return bytearray(f.read())
+        except FileNotFoundError:
+            return None
+
+    # --- عقد إيجار (متعلم واحد في كل مرة) ---
+
+    def _lease_path(self, name: str) -> str:
+        return os.path.join(self.directory, name, "lease")
+
+    def acquire_lease(self, name: str, ttl_sec: float) -> Optional[str]:
+        """
+        أخذ عقد الإيجار إن لم يكن مأخوذاً أو انتهت مدته
+
+        Returns:
+            Optional[str]: رمز العقد (لـ release_lease) أو None إذا كان مأخوذاً
+        """
+        path = self._lease_path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        token = uuid.uuid4().hex
+
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(f"{token} {time.time() + ttl_sec}")
+            for _ in range(2):
+                try:
+                    # link يفشل إذا كان العقد موجوداً (إنشاء ذري بالمحتوى كاملاً)
+                    os.link(temp_path, path)
+                    return token
+                except FileExistsError:
+                    pass
+                try:
+                    with open(path) as f:
+                        holder, expires = f.read().split()
+                except (FileNotFoundError, ValueError):
+                    continue
+                if float(expires) > time.time():
+                    return None
+                # عقد منتهٍ: rename ذري فتأخذه نسخة واحدة فقط
+                stale = f"{path}.{token}.expired"
+                try:
+                    os.rename(path, stale)
+                except FileNotFoundError:
+                    continue
+                with open(stale) as f:
+                    taken = f.read().split()[0]
+                if taken != holder:
+                    # سبقتنا نسخة أخرى وأخذت عقداً جديداً: إعادته كما كان
+                    try:
+                        os.link(stale, path)
+                    except FileExistsError:
+                        pass
+                    os.unlink(stale)
+                    return None
+                os.unlink(stale)
+            return None
+        finally:
+            os.unlink(temp_path)
+
+    def release_lease(self, name: str, token: str) -> None:
+        """تحرير العقد إذا كان ما زال لنفس الرمز"""
+        path = self._lease_path(name)
+        try:
+            with open(path) as f:
+                holder = f.read().split()[0]
+            if holder == token:
+                os.unlink(path)
+        except (FileNotFoundError, IndexError):
+            pass
+
+
+class CloudStorageSnapshotStore:
+    """
+    مخزن لقطات في Cloud Storage: rl-snapshots/{name}/{version}.snap
+
+    rl-snapshots/{name}/latest يحمل رقم أحدث إصدار فلا تحتاج latest_version
+    (المستدعاة من مسار التنبؤ) إلى سرد الكائنات، وتُحذف الإصدارات القديمة بعد
+    كل حفظ ناجح (يبقى آخر KEEP_VERSIONS)
+    """
+
+    PREFIX = "rl-snapshots"
+    KEEP_VERSIONS = 3
+    POINTER_ATTEMPTS = 3
+
+    def __init__(self, bucket_name: str):
+        self.bucket_name = bucket_name
+        self._bucket = None
+
+    @property
+    def bucket(self):
+        if self._bucket is None:
+            from firebase_admin import storage
+            self._bucket = storage.bucket(self.bucket_name)
+        return self._bucket
+
+    def _blob_name(self, name: str, version: int) -> str:
+        return f"{self.PREFIX}/{name}/{version:010d}.snap"
+
+    def _pointer_name(self, name: str) -> str:
+        return f"{self.PREFIX}/{name}/latest"
+
+    def _listed_versions(self, name: str) -> List[Tuple[int, Any]]:
+        """(الإصدار، الكائن) لكل لقطة مرتبة تصاعدياً"""
+        versions = []
+        for blob in self.bucket.list_blobs(prefix=f"{self.PREFIX}/{name}/"):
+            match = re.search(r"/(\d+)\.snap$", blob.name)
+            if match:
+                versions.append((int(match.group(1)), blob))
+        return sorted(versions, key=lambda entry: entry[0])
+
+    def latest_version(self, name: str) -> int:
+        """المؤشر ثم فحص الإصدارات التالية (كاتب نشر ولم يحدّث المؤشر بعد)"""
+        from google.api_core.exceptions import NotFound
+
+        try:
+            latest = int(self.bucket.blob(self._pointer_name(name)).download_as_text())
+        except NotFound:
+            # لقطات كُتبت قبل وجود المؤشر
+            versions = self._listed_versions(name)
+            latest = versions[-1][0] if versions else 0
+
+        while self.bucket.blob(self._blob_name(name, latest + 1)).exists():
+            latest += 1
+        return latest
+
+    def load(self, name: str) -> Optional[Tuple[int, Any]]:
+        """تنزيل أحدث لقطة إلى /tmp ثم ربطها بالذاكرة"""
+        version = self.latest_version(name)
+        if not version:
+            return None
+
+        fd, path = tempfile.mkstemp(suffix=".snap")
+        os.close(fd)
+        try:
+            self.bucket.blob(self._blob_name(name, version)).download_to_filename(path)
+            return version, map_file(path)
+        finally:
+            # الربط يبقى صالحاً بعد حذف الملف
+            os.unlink(path)
+
+    def save(self, name: str, version: int, data: bytes) -> bool:
+        """رفع إصدار جديد فقط إذا لم يكن موجوداً (if_generation_match=0)"""
+        from google.api_core.exceptions import PreconditionFailed
+
+        blob = self.bucket.blob(self._blob_name(name, version))
+        try:
+            blob.upload_from_string(data, content_type="application/octet-stream", if_generation_match=0)
+        except PreconditionFailed:
+            return False
+
+        try:
+            self._advance_pointer(name, version)
+            self._prune(name, version)
+        except Exception as e:
+            # الإصدار منشور؛ latest_version يجده بالفحص والحفظ التالي يحذف القديم
+            logger.warning(f"Snapshot {name} v{version} pointer/prune error: {e}")
+        return True
+
+    def _advance_pointer(self, name: str, version: int) -> None:
+        """تحديث المؤشر مشروطاً بالجيل ودون الرجوع لإصدار أقدم"""
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.blob(self._pointer_name(name))
+        for _ in range(self.POINTER_ATTEMPTS):
+            try:
+                blob.reload()
+                generation = blob.generation
+                current = int(blob.download_as_text(if_generation_match=generation))
+            except NotFound:
+                generation, current = 0, 0
+            except PreconditionFailed:
+                continue
+
+            if current >= version:
+                return
+            try:
+                blob.upload_from_string(str(version), content_type="text/plain", if_generation_match=generation)
+                return
+            except PreconditionFailed:
+                continue
+
+    def _prune(self, name: str, version: int) -> None:
+        """حذف الإصدارات الأقدم من آخر KEEP_VERSIONS"""
+        from google.api_core.exceptions import NotFound
+
+        for old, blob in self._listed_versions(name):
+            if old > version - self.KEEP_VERSIONS:
+                break
+            try:
+                blob.delete()
+            except NotFound:
+                pass
+
+    # --- طابور دفعات التجارب ---
+
+    def push_batch(self, name: str, data: bytes) -> str:
+        """إضافة دفعة تجارب: rl-queue/{name}/{time}-{id}.batch"""
+        blob_name = f"rl-queue/{name}/{time.time_ns():020d}-{uuid.uuid4().hex[:8]}.batch"
+        self.bucket.blob(blob_name).upload_from_string(data, content_type="application/octet-stream")
+        return blob_name
+
+    def claim_batches(self, name: str, limit: int = 64) -> List[bytes]:
+        """سحب أقدم الدفعات (الحذف المشروط بالجيل يضمن أن متعلماً واحداً فقط يستخدمها)"""
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        batches = []
+        for blob in self.bucket.list_blobs(prefix=f"rl-queue/{name}/", max_results=limit):
+            try:
+                data = blob.download_as_bytes()
+                blob.delete(if_generation_match=blob.generation)
+            except (NotFound, PreconditionFailed):
+                continue
+            batches.append(data)
+
+        return batches
+
+    # --- كائنات مفردة (مثل سياسات المستخدمين) ---
+
+    def write_object(self, key: str, data: bytes) -> None:
+        blob = self.bucket.blob(f"rl-objects/{key}.snap")
+        blob.upload_from_string(data, content_type="application/octet-stream")
+
+    def read_object(self, key: str) -> Optional[bytearray]:
+        from google.api_core.exceptions import NotFound
+
+        try:
+            return bytearray(self.bucket.blob(f"rl-objects/{key}.snap").download_as_bytes())
+        except NotFound:
+            return None
+
+    # --- عقد إيجار (متعلم واحد في كل مرة) ---
+
+    def acquire_lease(self, name: str, ttl_sec: float) -> Optional[str]:
+        """
+        أخذ عقد الإيجار rl-leases/{name} بكتابة مشروطة بالجيل
+
+        Returns:
+            Optional[str]: رمز العقد (لـ release_lease) أو None إذا كان مأخوذاً
+        """
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.blob(f"rl-leases/{name}")
+        token = uuid.uuid4().hex
+        try:
+            blob.reload()
+            generation = blob.generation
+            expires = float(blob.download_as_text(if_generation_match=generation).split()[1])
+        except NotFound:
+            generation, expires = 0, 0.0
+        except PreconditionFailed:
+            return None
+
+        if expires > time.time():
+            return None
+        try:
+            blob.upload_from_string(
+                f"{token} {time.time() + ttl_sec}", content_type="text/plain", if_generation_match=generation
+            )
+        except PreconditionFailed:
+            return None
+        return token
+
+    def release_lease(self, name: str, token: str) -> None:
+        """تحرير العقد إذا كان ما زال لنفس الرمز"""
+        from google.api_core.exceptions import NotFound, PreconditionFailed
+
+        blob = self.bucket.blob(f"rl-leases/{name}")
+        try:
+            blob.reload()
+            generation = blob.generation
+            if blob.download_as_text(if_generation_match=generation).split()[0] == token:
+                blob.delete(if_generation_match=generation)
+        except (NotFound, PreconditionFailed):
+            pass
+
+
+def snapshot_store_from_env() -> Optional[Any]:
+    """اختيار مخزن اللقطات من متغيرات البيئة (None لتعطيل اللقطات)"""
+    bucket = os.environ.get("RL_SNAPSHOT_BUCKET")
+    if bucket:
+        return CloudStorageSnapshotStore(bucket)
+
+    directory = os.environ.get("RL_SNAPSHOT_DIR")
+    if directory:
+        return LocalSnapshotStore(directory)
+
+    return None
+
+
+# ============================================
+# Snapshot Manager
+# ============================================
+
+MERGE_STRATEGIES = ["visits", "last_writer"]
+
+
+class SnapshotManager:
+    """
+    مزامنة وكيل (أو PersonalizerClient) مع مخزن اللقطات
+
+    الوكيل يوفر export_arrays و load_arrays و merge_arrays و snapshot_baseline
+    عند الحفظ: إذا نشر كاتب آخر إصداراً أحدث يُدمج أولاً ثم يُكتب الإصدار التالي
+
+    الأساس (baseline) هو إحصاءات آخر إصدار دُمج في الحالة المحلية، فالدمج التالي
+    يضيف ما بعده فقط. بعد كل دمج يصبح الأساس إحصاءات الإصدار المدموج نفسه، فإذا
+    خسر الحفظ السباق لا يُحسب فرق ذلك الإصدار مرتين عند دمج إصدار أحدث.
+    """
+
+    MAX_SAVE_ATTEMPTS = 3
+
+    def __init__(
+        self,
+        agent: Any,
+        store: Any,
+        name: str = "global",
+        strategy: str = "visits",
+        interval_sec: float = 300
+    ):
+        if strategy not in MERGE_STRATEGIES:
+            raise ValueError(f"Unknown merge strategy: {strategy}")
+
+        self.agent = agent
+        self.store = store
+        self.name = name
+        self.strategy = strategy
+        self.interval_sec = interval_sec
+
+        self.version = 0
+        self.baseline: Optional[np.ndarray] = None
+        self.last_saved = time.time()
+        self.last_checked = 0.0
+        self._refreshing = threading.Lock()
+        self._saving = threading.Lock()
+        self.load_seconds = 0.0
+        self.save_seconds = 0.0
+        self.snapshot_bytes = 0
+
+    def _sync_point(self, version: int) -> None:
+        self.version = version
+        self.baseline = self.agent.snapshot_baseline()
+
+    def warm_load(self) -> bool:
+        """تحميل أحدث لقطة عند بدء التشغيل"""
+        started = time.perf_counter()
+        loaded = self.store.load(self.name)
+        if loaded is None:
+            return False
+
+        version, buffer = loaded
+        arrays, meta = decode_snapshot(buffer)
+        self.agent.load_arrays(arrays, meta)
+        self._sync_point(version)
+
+        self.load_seconds = time.perf_counter() - started
+        self.snapshot_bytes = len(buffer)
+        logger.info(
+            f"Loaded snapshot {self.name} v{version} "
+            f"({self.snapshot_bytes} bytes) in {self.load_seconds * 1000:.1f}ms"
+        )
+        return True
+
+    def save(self) -> int:
+        """
+        نشر لقطة جديدة
+
+        Returns:
+            int: رقم الإصدار المنشور
+        """
+        started = time.perf_counter()
+
+        for _ in range(self.MAX_SAVE_ATTEMPTS):
+            latest = self.store.latest_version(self.name)
+
+            if latest > self.version:
+                loaded = self.store.load(self.name)
+                if loaded is not None:
+                    latest, buffer = loaded
+                    arrays, meta = decode_snapshot(buffer)
+                    # قبل الدمج: دمج الجدول قد يعدّل مصفوفات اللقطة في مكانها
+                    published = self.agent.snapshot_baseline(arrays, meta)
+                    self.agent.merge_arrays(arrays, meta, self.strategy, self.baseline)
+                    # None: اللقطة لم تُدمج (تخطيط مختلف) فيبقى الأساس السابق
+                    if published is not None:
+                        self.version = latest
+                        self.baseline = published
+
+            data = encode_snapshot(*self.agent.export_arrays())
+            if self.store.save(self.name, latest + 1, data):
+                self._sync_point(latest + 1)
+                self.last_saved = time.time()
+                self.save_seconds = time.perf_counter() - started
+                self.snapshot_bytes = len(data)
+                return self.version
+
+        raise RuntimeError(f"Could not publish snapshot {self.name} after {self.MAX_SAVE_ATTEMPTS} attempts")
+
+    def maybe_save(self) -> Optional[int]:
+        """حفظ دوري إذا مرت الفترة المحددة"""
+        if time.time() - self.last_saved < self.interval_sec:
+            return None
+        try:
+            return self.save()
+        except Exception as e:
+            logger.error(f"Snapshot {self.name} save error: {e}")
+            self.last_saved = time.time()
+            return None
+
+    def maybe_save_async(self) -> None:
+        """حفظ دوري في خيط خلفي (write-behind): الطلب الذي يستدعيه لا ينتظر الكتابة"""
+        if time.time() - self.last_saved < self.interval_sec:
+            return
+        if not self._saving.acquire(blocking=False):
+            return
+
+        def run():
+            try:
+                self.maybe_save()
+            finally:
+                self._saving.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def refresh(self) -> bool:
+        """
+        تبديل جدول Q بأحدث إصدار منشور إن وُجد (للنسخ التي تتنبأ فقط)
+
+        Returns:
+            bool: True إذا تم التبديل
+        """
+        self.last_checked = time.time()
+        if self.store.latest_version(self.name) <= self.version:
+            return False
+
+        loaded = self.store.load(self.name)
+        if loaded is None:
+            return False
+
+        version, buffer = loaded
+        arrays, meta = decode_snapshot(buffer)
+        self.agent.load_table(arrays, meta)
+        self._sync_point(version)
+        self.snapshot_bytes = len(buffer)
+        logger.info(f"Hot-swapped RL snapshot {self.name} to v{version}")
+        return True
+
+    def refresh_async(self, min_interval_sec: float = 30) -> None:
+        """فحص الإصدارات في خيط خلفي حتى لا يتأخر الطلب الحالي"""
+        if time.time() - self.last_checked < min_interval_sec:
+            return
+        if not self._refreshing.acquire(blocking=False):
+            return
+        self.last_checked = time.time()
+
+        def run():
+            try:
+                self.refresh()
+            except Exception as e:
+                logger.error(f"RL snapshot refresh error: {e}")
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=run, daemon=True).start()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "strategy": self.strategy,
+            "snapshotBytes": self.snapshot_bytes,
+            "loadSeconds": round(self.load_seconds, 4),
+            "saveSeconds": round(self.save_seconds, 4)
+        }
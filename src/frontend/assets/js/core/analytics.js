@@ -6,6 +6,39 @@
 import { getFunctions, httpsCallable } from './firebase/firebase-exports.js';
 import { app } from './firebase/index.js';
 
+// Must match VALID_EVENT_TYPES order in functions/analytics.py
+const EVENT_TYPE_CODES = [
+  'task_created',
+  'task_completed',
+  'task_failed',
+  'task_rescheduled',
+  'session_start',
+  'session_end',
+];
+
+/**
+ * Base64-encode the bytes of a typed array / DataView
+ */
+function toBase64(view) {
+  const bytes = new Uint8Array(view.buffer, view.byteOffset, view.byteLength);
+  let binary = '';
+  for (let i = 0; i < bytes.length; i += 0x8000) {
+    binary += String.fromCharCode.apply(null, bytes.subarray(i, i + 0x8000));
+  }
+  return btoa(binary);
+}
+
+/**
+ * FNV-1a 32-bit hash of a string's UTF-8 bytes (matches sketches.fnv1a32)
+ */
+function fnv1a32(text) {
+  let hash = 0x811c9dc5;
+  for (const byte of new TextEncoder().encode(text)) {
+    hash = Math.imul(hash ^ byte, 0x01000193) >>> 0;
+  }
+  return hash;
+}
+
 class BehaviorAnalytics {
   constructor() {
     this.functions = getFunctions(app);
@@ -13,6 +46,8 @@ class BehaviorAnalytics {
     this.getAnalyticsFn = httpsCallable(this.functions, 'getAnalytics');
     
     this.events = [];
+    // Last getAnalytics response and its digest, for conditional requests
+    this.lastAnalytics = null;
     this.sessionStartTime = Date.now();
     this.isTracking = true;
     
@@ -207,14 +242,54 @@ class BehaviorAnalytics {
     this.saveEvents();
   }
 
+  /**
+   * Encode events into the compact columnar wire format (columnar-v1):
+   * uint8 type codes, uint32 epoch seconds, float32 durations (NaN if missing)
+   * and uint32 FNV-1a task id hashes (0 if missing)
+   */
+  encodeColumnar(events) {
+    const known = events.filter(e => EVENT_TYPE_CODES.includes(e.type));
+    const count = known.length;
+    const types = new Uint8Array(count);
+    const timestamps = new DataView(new ArrayBuffer(count * 4));
+    const durations = new DataView(new ArrayBuffer(count * 4));
+    const taskIds = new DataView(new ArrayBuffer(count * 4));
+
+    known.forEach((event, i) => {
+      const duration = event.metadata?.duration;
+      const taskId = event.metadata?.taskId;
+      types[i] = EVENT_TYPE_CODES.indexOf(event.type);
+      timestamps.setUint32(i * 4, Math.floor(Date.parse(event.timestamp) / 1000), true);
+      durations.setFloat32(i * 4, typeof duration === 'number' ? duration : NaN, true);
+      taskIds.setUint32(i * 4, taskId ? fnv1a32(String(taskId)) : 0, true);
+    });
+
+    return {
+      format: 'columnar-v1',
+      count,
+      types: toBase64(types),
+      timestamps: toBase64(timestamps),
+      durations: toBase64(durations),
+      taskIds: toBase64(taskIds),
+    };
+  }
+
   /**
    * Get analytics for current user
    */
   async getAnalytics() {
     try {
       const result = await this.getAnalyticsFn({
-        events: this.events,
+        columnar: this.encodeColumnar(this.events),
+        ifNoneMatch: this.lastAnalytics?.digest,
       });
+
+      // Server replies notModified (no body) when the digest still matches
+      if (result.data.notModified && this.lastAnalytics) {
+        return this.lastAnalytics;
+      }
+
+      this.lastAnalytics = result.data;
       return result.data;
     } catch (error) {
       console.error('[Analytics] Failed to get analytics:', error);
@@ -222,6 +297,23 @@ class BehaviorAnalytics {
     }
   }
 
+  /**
+   * Get analytics for a date range from server-side daily rollups
+   * @param {string|{startDate: string, endDate: string}} range -
+   *   'today' | 'last_7_days' | 'last_30_days' | 'this_week' | 'this_month'
+   *   or explicit YYYY-MM-DD bounds
+   */
+  async getAnalyticsForRange(range = 'last_7_days') {
+    try {
+      const params = typeof range === 'string' ? { period: range } : range;
+      const result = await this.getAnalyticsFn(params);
+      return result.data;
+    } catch (error) {
+      console.error('[Analytics] Failed to get range analytics:', error);
+      return null;
+    }
+  }
+
   /**
    * Get user behavior summary
    */
@@ -10,6 +10,7 @@ class RLClient {
   constructor() {
     this.functions = getFunctions(app);
     this.rlPredict = httpsCallable(this.functions, 'rlPredict');
+    this.rlPredictBatch = httpsCallable(this.functions, 'rlPredictBatch');
     this.rlFeedback = httpsCallable(this.functions, 'rlFeedback');
     this.rlTrain = httpsCallable(this.functions, 'rlTrain');
     this.rlStats = httpsCallable(this.functions, 'rlStats');
@@ -69,6 +70,41 @@ class RLClient {
     }
   }
 
+  /**
+   * Get recommended actions for many tasks in one call
+   * (e.g. when rendering a task list)
+   */
+  async predictBatch(userContexts = [], explore = true) {
+    try {
+      const states = userContexts.map((userContext) => this.buildState(userContext));
+      
+      const result = await this.rlPredictBatch({
+        states,
+        explore,
+      });
+
+      return {
+        success: true,
+        predictions: result.data.predictions.map((prediction) => ({
+          action: prediction.action,
+          confidence: prediction.confidence,
+          actionScores: prediction.actionScores,
+        })),
+      };
+    } catch (error) {
+      console.error('[RLClient] Batch prediction error:', error);
+      return {
+        success: false,
+        error: error.message,
+        // Fallback action for every task
+        predictions: userContexts.map(() => ({
+          action: { id: 'schedule_now', name: 'جدولة فورية' },
+          confidence: 0,
+        })),
+      };
+    }
+  }
+
   /**
    * Send feedback after action is taken
    */
@@ -87,7 +123,7 @@ class RLClient {
       return {
         success: true,
         reward: result.data.reward,
-        stats: result.data.stats,
+        queued: result.data.queued,
       };
     } catch (error) {
       console.error('[RLClient] Feedback error:', error);